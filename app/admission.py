@@ -0,0 +1,235 @@
+# file: app/admission.py
+# Admission control for the inference routes: per-user token buckets and a global in-flight cap
+
+import time
+from typing import Dict, NamedTuple, Optional
+
+from . import config
+from .metrics import registry
+
+
+rate_limited_total = registry.counter('admission_rate_limited_total', 'Requests rejected by a token bucket (429)')
+shed_total = registry.counter('admission_shed_total', 'Requests shed by the in-flight cap or latency budget (503)')
+in_flight_gauge = registry.gauge('inference_in_flight', 'Requests admitted to inference and not finished')
+estimated_wait_gauge = registry.gauge('inference_estimated_wait_seconds', 'Queue wait estimated at the last admission')
+
+
+class RateLimit(NamedTuple):
+    rate: float  # tokens (requests) per second; 0 or less is unlimited
+    burst: float  # bucket size
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limit exceeded, retry in {retry_after:.1f} s")
+        self.retry_after = retry_after
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Inference is overloaded, retry in {retry_after:.1f} s")
+        self.retry_after = retry_after
+
+
+def parse_rate_limits(spec: str) -> Dict[str, RateLimit]:
+    """'user=10/20,admin=0/1' -> {'user': RateLimit(10, 20), 'admin': RateLimit(0, 1)}"""
+    limits = {}
+    for item in spec.split(','):
+        if item.strip():
+            role, _, limit = item.partition('=')
+            rate, _, burst = limit.partition('/')
+            limits[role.strip()] = RateLimit(float(rate), float(burst or 1))
+    return limits
+
+
+############### BACKENDS ###############
+# A backend holds the token buckets and the per-user / per-role overrides set through
+# /admin/limits. Override keys are 'user:<id>' and 'role:<name>'.
+class InProcessLimiterBackend:
+    """Buckets and overrides in this process only: with several workers, each enforces the
+    limits on its own share of the traffic"""
+
+    def __init__(self):
+        self._buckets: Dict[int, tuple] = {}  # user id -> (tokens, updated)
+        self._rules: Dict[str, RateLimit] = {}
+
+    async def take(self, user_id: int, role: str, default: RateLimit) -> float:
+        limit = self._rules.get(f'user:{user_id}') or self._rules.get(f'role:{role}') or default
+        if limit.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(user_id, (limit.burst, now))
+        tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+        if tokens >= 1:
+            self._buckets[user_id] = (tokens - 1, now)
+            return 0.0
+        self._buckets[user_id] = (tokens, now)
+        return (1 - tokens) / limit.rate
+
+    async def rules(self) -> Dict[str, RateLimit]:
+        return dict(self._rules)
+
+    async def set_rule(self, key: str, limit: RateLimit) -> None:
+        self._rules[key] = limit
+
+    async def delete_rule(self, key: str) -> bool:
+        return self._rules.pop(key, None) is not None
+
+    async def close(self) -> None:
+        self._buckets.clear()
+
+
+# KEYS: bucket, overrides hash. ARGV: user override key, role override key, default rate, default burst, now.
+# Returns the seconds to wait as a string (Lua numbers become integers in replies).
+_TAKE_SCRIPT = """
+local rule = redis.call('HGET', KEYS[2], ARGV[1]) or redis.call('HGET', KEYS[2], ARGV[2])
+local rate, burst = tonumber(ARGV[3]), tonumber(ARGV[4])
+if rule then
+    local slash = string.find(rule, '/', 1, true)
+    rate, burst = tonumber(string.sub(rule, 1, slash - 1)), tonumber(string.sub(rule, slash + 1))
+end
+if rate <= 0 then
+    return '0'
+end
+local now = tonumber(ARGV[5])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = math.min(burst, (tonumber(state[1]) or burst) + math.max(0, now - (tonumber(state[2]) or now)) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', ARGV[5])
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RedisLimiterBackend:
+    """Any server speaking the Redis protocol (Redis, Valkey, KeyDB, a local stand-in). Buckets
+    and overrides are shared by every worker; each check is one atomic script call."""
+
+    def __init__(self, url: str, prefix: str = 'ratelimit'):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package") from e
+        self._client = redis.from_url(url)
+        self._take = self._client.register_script(_TAKE_SCRIPT)
+        self.prefix = prefix
+        self.rules_key = f'{prefix}:rules'
+
+    async def take(self, user_id: int, role: str, default: RateLimit) -> float:
+        wait = await self._take(
+            keys=[f'{self.prefix}:bucket:{user_id}', self.rules_key],
+            args=[f'user:{user_id}', f'role:{role}', default.rate, default.burst, time.time()],
+        )
+        return float(wait)
+
+    async def rules(self) -> Dict[str, RateLimit]:
+        rules = {}
+        for key, value in (await self._client.hgetall(self.rules_key)).items():
+            rate, _, burst = value.decode().partition('/')
+            rules[key.decode()] = RateLimit(float(rate), float(burst))
+        return rules
+
+    async def set_rule(self, key: str, limit: RateLimit) -> None:
+        await self._client.hset(self.rules_key, key, f'{limit.rate}/{limit.burst}')
+
+    async def delete_rule(self, key: str) -> bool:
+        return await self._client.hdel(self.rules_key, key) > 0
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+############### ADMISSION ###############
+class RateLimiter:
+    """Token bucket per user id. Each user's bucket uses their own override if there is one,
+    otherwise their role's override, otherwise their role's default from RATE_LIMITS."""
+
+    def __init__(self, backend, defaults: Dict[str, RateLimit]):
+        self.backend = backend
+        self.defaults = defaults
+
+    async def check(self, user: dict) -> None:
+        role = user.get('role') or 'user'
+        default = self.defaults.get(role) or self.defaults.get('user') or RateLimit(0, 1)
+        wait = await self.backend.take(user['id'], role, default)
+        if wait > 0:
+            rate_limited_total.inc()
+            raise RateLimited(wait)
+
+    async def describe(self) -> dict:
+        rules = await self.backend.rules()
+        return {
+            'defaults': {role: limit._asdict() for role, limit in self.defaults.items()},
+            'roles': {key[5:]: limit._asdict() for key, limit in rules.items() if key.startswith('role:')},
+            'users': {key[5:]: limit._asdict() for key, limit in rules.items() if key.startswith('user:')},
+        }
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+
+class InferenceAdmission:
+    """Global cap on requests in inference. Beyond `max_in_flight`, or once the estimated queue
+    wait exceeds `latency_budget` seconds, requests are shed instead of queueing without bound.
+
+    The wait estimate is the requests ahead times the EWMA of the interval between completions
+    while busy (idle gaps are not counted), i.e. how long the current backlog takes to drain.
+    Always per process: it protects this process's inference workers."""
+
+    def __init__(self, max_in_flight: int, latency_budget: float, smoothing: float = 0.1):
+        self.max_in_flight = max(1, max_in_flight)
+        self.latency_budget = latency_budget
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self._drain_interval: Optional[float] = None
+        self._mark = 0.0  # last completion, or the start of the current busy period
+
+    def estimated_wait(self) -> float:
+        return self.in_flight * (self._drain_interval or 0.0)
+
+    def acquire(self) -> None:
+        wait = self.estimated_wait()
+        estimated_wait_gauge.set(wait)
+        if self.in_flight >= self.max_in_flight or wait > self.latency_budget:
+            shed_total.inc()
+            raise Overloaded(max(wait - self.latency_budget, self._drain_interval or 0.0, 1.0))
+        if self.in_flight == 0:
+            self._mark = time.monotonic()
+        self.in_flight += 1
+        in_flight_gauge.set(self.in_flight)
+
+    def release(self) -> None:
+        now = time.monotonic()
+        interval = now - self._mark
+        self._mark = now
+        if self._drain_interval is None:
+            self._drain_interval = interval
+        else:
+            self._drain_interval += self.smoothing * (interval - self._drain_interval)
+        self.in_flight -= 1
+        in_flight_gauge.set(self.in_flight)
+
+    def describe(self) -> dict:
+        return {
+            'max_in_flight': self.max_in_flight,
+            'latency_budget_seconds': self.latency_budget,
+            'in_flight': self.in_flight,
+            'estimated_wait_seconds': self.estimated_wait(),
+        }
+
+
+def create_rate_limiter() -> RateLimiter:
+    if config.RATE_LIMIT_BACKEND == 'redis':
+        backend = RedisLimiterBackend(config.REDIS_URL)
+    else:
+        backend = InProcessLimiterBackend()
+    return RateLimiter(backend, parse_rate_limits(config.RATE_LIMITS))
+
+
+rate_limiter = create_rate_limiter()
+inference_admission = InferenceAdmission(config.INFERENCE_MAX_IN_FLIGHT, config.INFERENCE_LATENCY_BUDGET_SECONDS)
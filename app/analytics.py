@@ -0,0 +1,251 @@
+# file: app/analytics.py
+# Hourly ServiceCall rollups, maintained on every usage flush, and the admin usage queries they serve
+
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import ServiceCall, ServiceCallDurationRollup, ServiceCallRollup
+from .schemas import ServiceCallCreate
+
+
+# Upper bounds (seconds) of the stored duration histogram. Rows refer to buckets by index:
+# append new bounds at the end only, or rebuild the rollups after changing them.
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.35, 0.5, 0.75,
+    1.0, 1.5, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0,
+)
+
+REBUILD_CHUNK_ROWS = 10000
+# Multi-row upserts are split so a statement stays under the drivers' bind-parameter limits
+# (asyncpg: 32,767; SQLite >= 3.32: 32,766)
+MAX_ROWS_PER_STATEMENT = 5000
+MAX_BIND_PARAMS = 30000
+
+
+def hour_of(timestamp: datetime) -> datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+############### MAINTENANCE ###############
+def aggregate(service_calls: Iterable[ServiceCallCreate]) -> Tuple[dict, dict]:
+    """Groups records by (hour, owner_id, service_version).
+    Returns ({key: [calls, errors, cached_calls, duration_sum, duration_max]}, {key + (bucket_index,): count})"""
+    totals: Dict[tuple, list] = {}
+    histogram: Dict[tuple, int] = defaultdict(int)
+    for call in service_calls:
+        key = (hour_of(call.request_time), call.owner_id, call.service_version)
+        row = totals.setdefault(key, [0, 0, 0, 0.0, 0.0])
+        row[0] += 1
+        row[1] += not call.success
+        row[2] += bool(call.cached)
+        row[3] += call.duration
+        row[4] = max(row[4], call.duration)
+        histogram[key + (bisect_left(DURATION_BUCKETS, call.duration),)] += 1
+    return totals, histogram
+
+
+def _dialect_insert(db: AsyncSession):
+    dialect = db.bind.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Usage rollups need INSERT ... ON CONFLICT, not available for '{dialect}'")
+    return insert
+
+
+def _chunks(rows: List[dict]) -> Iterable[List[dict]]:
+    """Splits multi-row VALUES lists so no statement exceeds MAX_BIND_PARAMS (asyncpg's limit is 32,767)"""
+    size = max(1, min(MAX_ROWS_PER_STATEMENT, MAX_BIND_PARAMS // len(rows[0])))
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+async def apply_rollups(db: AsyncSession, service_calls: List[ServiceCallCreate]) -> None:
+    """Adds a batch of records to the hourly rollups with INSERT ... ON CONFLICT DO UPDATE.
+    Runs in the caller's transaction, so rollups and raw rows are committed together.
+    Rows are written in key order so concurrent flushes from several workers cannot deadlock."""
+    totals, histogram = aggregate(service_calls)
+    if not totals:
+        return
+    insert = _dialect_insert(db)
+
+    rollups = ServiceCallRollup.__table__.c
+    rows = [
+        {
+            'bucket_start': bucket_start, 'owner_id': owner_id, 'service_version': service_version,
+            'calls': calls, 'errors': errors, 'cached_calls': cached_calls,
+            'duration_sum': duration_sum, 'duration_max': duration_max,
+        }
+        for (bucket_start, owner_id, service_version), (calls, errors, cached_calls, duration_sum, duration_max)
+        in sorted(totals.items())
+    ]
+    for chunk in _chunks(rows):
+        statement = insert(ServiceCallRollup).values(chunk)
+        excluded = statement.excluded
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=[rollups.bucket_start, rollups.owner_id, rollups.service_version],
+            set_={
+                'calls': rollups.calls + excluded.calls,
+                'errors': rollups.errors + excluded.errors,
+                'cached_calls': rollups.cached_calls + excluded.cached_calls,
+                'duration_sum': rollups.duration_sum + excluded.duration_sum,
+                'duration_max': case(
+                    (excluded.duration_max > rollups.duration_max, excluded.duration_max), else_=rollups.duration_max,
+                ),
+            },
+        ))
+
+    durations = ServiceCallDurationRollup.__table__.c
+    rows = [
+        {
+            'bucket_start': bucket_start, 'owner_id': owner_id, 'service_version': service_version,
+            'bucket_index': bucket_index, 'count': count,
+        }
+        for (bucket_start, owner_id, service_version, bucket_index), count in sorted(histogram.items())
+    ]
+    for chunk in _chunks(rows):
+        statement = insert(ServiceCallDurationRollup).values(chunk)
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=[durations.bucket_start, durations.owner_id, durations.service_version, durations.bucket_index],
+            set_={'count': durations.count + statement.excluded.count},
+        ))
+
+
+async def rebuild_rollups(db: AsyncSession, start: datetime, end: datetime) -> int:
+    """Recomputes the rollups of the whole hours in [start, end) from service_calls, e.g. for rows
+    written before rollups existed. Streams the raw rows through the request_time index.
+    Returns the number of service calls read."""
+    start, end = hour_of(start), hour_of(end)
+    await db.execute(delete(ServiceCallRollup).where(
+        ServiceCallRollup.bucket_start >= start, ServiceCallRollup.bucket_start < end,
+    ))
+    await db.execute(delete(ServiceCallDurationRollup).where(
+        ServiceCallDurationRollup.bucket_start >= start, ServiceCallDurationRollup.bucket_start < end,
+    ))
+
+    query = (
+        select(ServiceCall)
+        .where(ServiceCall.request_time >= start, ServiceCall.request_time < end)
+        .execution_options(yield_per=REBUILD_CHUNK_ROWS)
+    )
+    read = 0
+    result = await db.stream_scalars(query)
+    async for rows in result.partitions():
+        await apply_rollups(db, [ServiceCallCreate.model_validate(row) for row in rows])
+        read += len(rows)
+    await db.commit()
+    return read
+
+
+############### QUERIES ###############
+def percentile(counts: List[int], q: float, max_value: float) -> Optional[float]:
+    """Estimates the q-quantile of a DURATION_BUCKETS histogram by linear interpolation inside
+    the bucket holding it; the +Inf bucket is bounded by the largest observed value"""
+    total = sum(counts)
+    if total == 0:
+        return None
+    rank = q * total
+    cumulative = 0
+    for index, count in enumerate(counts):
+        if count and cumulative + count >= rank:
+            lower = DURATION_BUCKETS[index - 1] if index > 0 else 0.0
+            upper = DURATION_BUCKETS[index] if index < len(DURATION_BUCKETS) else max_value
+            estimate = lower + (upper - lower) * (rank - cumulative) / count
+            return min(estimate, max_value)
+        cumulative += count
+    return max_value
+
+
+def _in_range(model, start: datetime, end: datetime, owner_id: Optional[int]) -> list:
+    conditions = [model.bucket_start >= hour_of(start), model.bucket_start < end]
+    if owner_id is not None:
+        conditions.append(model.owner_id == owner_id)
+    return conditions
+
+
+async def calls_per_user(
+    db: AsyncSession, start: datetime, end: datetime, granularity: str = 'hour', owner_id: Optional[int] = None
+) -> List[dict]:
+    query = (
+        select(
+            ServiceCallRollup.bucket_start,
+            ServiceCallRollup.owner_id,
+            func.sum(ServiceCallRollup.calls),
+            func.sum(ServiceCallRollup.errors),
+            func.sum(ServiceCallRollup.cached_calls),
+        )
+        .where(*_in_range(ServiceCallRollup, start, end, owner_id))
+        .group_by(ServiceCallRollup.bucket_start, ServiceCallRollup.owner_id)
+        .order_by(ServiceCallRollup.bucket_start, ServiceCallRollup.owner_id)
+    )
+    buckets: Dict[tuple, list] = {}
+    for bucket_start, owner, calls, errors, cached_calls in (await db.execute(query)).all():
+        if granularity == 'day':
+            bucket_start = bucket_start.replace(hour=0)
+        row = buckets.setdefault((bucket_start, owner), [0, 0, 0])
+        row[0] += calls
+        row[1] += errors
+        row[2] += cached_calls
+    return [
+        {'bucket_start': bucket_start, 'owner_id': owner, 'calls': calls, 'errors': errors, 'cached_calls': cached_calls}
+        for (bucket_start, owner), (calls, errors, cached_calls) in buckets.items()
+    ]
+
+
+async def latency_summary(
+    db: AsyncSession, start: datetime, end: datetime, owner_id: Optional[int] = None
+) -> dict:
+    calls, duration_sum, duration_max = (await db.execute(
+        select(
+            func.sum(ServiceCallRollup.calls),
+            func.sum(ServiceCallRollup.duration_sum),
+            func.max(ServiceCallRollup.duration_max),
+        ).where(*_in_range(ServiceCallRollup, start, end, owner_id))
+    )).one()
+
+    counts = [0] * (len(DURATION_BUCKETS) + 1)
+    histogram = await db.execute(
+        select(ServiceCallDurationRollup.bucket_index, func.sum(ServiceCallDurationRollup.count))
+        .where(*_in_range(ServiceCallDurationRollup, start, end, owner_id))
+        .group_by(ServiceCallDurationRollup.bucket_index)
+    )
+    for bucket_index, count in histogram.all():
+        if bucket_index < len(counts):
+            counts[bucket_index] = count
+
+    duration_max = duration_max or 0.0
+    return {
+        'start': hour_of(start),
+        'end': end,
+        'calls': calls or 0,
+        'mean': duration_sum / calls if calls else None,
+        'p50': percentile(counts, 0.50, duration_max),
+        'p95': percentile(counts, 0.95, duration_max),
+        'p99': percentile(counts, 0.99, duration_max),
+        'max': duration_max if calls else None,
+    }
+
+
+async def error_rates(db: AsyncSession, start: datetime, end: datetime) -> List[dict]:
+    query = (
+        select(ServiceCallRollup.owner_id, func.sum(ServiceCallRollup.calls), func.sum(ServiceCallRollup.errors))
+        .where(*_in_range(ServiceCallRollup, start, end, None))
+        .group_by(ServiceCallRollup.owner_id)
+        .order_by(ServiceCallRollup.owner_id)
+    )
+    return [
+        {'owner_id': owner, 'calls': calls, 'errors': errors, 'error_rate': errors / calls if calls else 0.0}
+        for owner, calls, errors in (await db.execute(query)).all()
+    ]
+
+
+def default_range(start: Optional[datetime], end: Optional[datetime]) -> Tuple[datetime, datetime]:
+    end = end or datetime.now()
+    return start or end - timedelta(days=1), end
@@ -0,0 +1,164 @@
+# file: app/cache.py
+# Content-addressed prediction cache with pluggable backends
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import BinaryIO, List, Optional
+
+from pydantic import TypeAdapter
+
+from . import config
+from .metrics import registry
+from .schemas import PredictionOutput
+
+
+cache_hits = registry.counter('prediction_cache_hits_total', 'Predictions served from the cache')
+cache_misses = registry.counter('prediction_cache_misses_total', 'Cache lookups that ran the model')
+cache_errors = registry.counter(
+    'prediction_cache_errors_total', 'Cache reads and writes that failed and fell through to the model',
+    labelnames=('operation',),
+)
+for _operation in ('get', 'set'):
+    cache_errors.labels(operation=_operation)  # exported at 0, so a dashboard sees the series before the first failure
+cache_entries = registry.gauge('prediction_cache_entries', 'Entries held by the in-process cache')
+
+_outputs_adapter = TypeAdapter(List[PredictionOutput])
+
+
+############### BACKENDS ###############
+class InProcessCacheBackend:
+    """LRU dict bounded to `max_entries`; entries also expire `ttl` seconds after being set"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()  # key -> (expires_at, value)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            cache_entries.set(len(self._entries))
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        cache_entries.set(len(self._entries))
+
+    async def close(self) -> None:
+        self._entries.clear()
+
+
+class RedisCacheBackend:
+    """Any server speaking the Redis protocol (Redis, Valkey, KeyDB, a local stand-in).
+    TTL is set per key; LRU eviction is the server's maxmemory-policy (allkeys-lru)."""
+
+    def __init__(self, url: str, timeout: float):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("PREDICTION_CACHE_BACKEND=redis requires the 'redis' package") from e
+        self._client = redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self._client.set(key, value, px=int(ttl * 1000))
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+############### CACHE ###############
+def hash_file(audio_file: BinaryIO, chunk_bytes: int = 1024 * 1024) -> str:
+    """sha256 of a file object's full contents, read in chunks; rewinds the file afterwards"""
+    digest = hashlib.sha256()
+    audio_file.seek(0)
+    while chunk := audio_file.read(chunk_bytes):
+        digest.update(chunk)
+    audio_file.seek(0)
+    return digest.hexdigest()
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class PredictionCache:
+    def __init__(self, backend, ttl: float, key_mode: str = 'upload'):
+        self.backend = backend
+        self.ttl = ttl
+        self.key_mode = key_mode
+        self._failing = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    @staticmethod
+    def key(content_digest: str, model_version: str, top_k: int) -> str:
+        return f'prediction:v1:{model_version}:{top_k}:{content_digest}'
+
+    # The cache fails open: a backend that is down or returns garbage counts as a miss,
+    # and a failed write is dropped, so predictions never depend on the cache being up.
+    # Every failure is counted in prediction_cache_errors_total; only the switch between
+    # healthy and failing is printed, so a dead Redis does not log a line per request
+    def _record_error(self, operation: str, e: Exception) -> None:
+        cache_errors.labels(operation=operation).inc()
+        if not self._failing:
+            self._failing = True
+            print(f"Prediction cache {operation} failed, running without the cache until it recovers: {e!r}")
+
+    def _record_ok(self) -> None:
+        if self._failing:
+            self._failing = False
+            print("Prediction cache recovered")
+
+    async def get(self, key: str) -> Optional[List[PredictionOutput]]:
+        try:
+            value = await self.backend.get(key)
+            outputs = _outputs_adapter.validate_json(value) if value is not None else None
+        except Exception as e:
+            self._record_error('get', e)
+            outputs = None
+        else:
+            self._record_ok()
+        if outputs is None:
+            cache_misses.inc()
+            return None
+        cache_hits.inc()
+        return outputs
+
+    async def set(self, key: str, outputs: List[PredictionOutput]) -> None:
+        try:
+            await self.backend.set(key, _outputs_adapter.dump_json(outputs), self.ttl)
+        except Exception as e:
+            self._record_error('set', e)
+        else:
+            self._record_ok()
+
+    async def close(self) -> None:
+        if self.backend is not None:
+            await self.backend.close()
+
+
+def create_prediction_cache() -> PredictionCache:
+    if config.PREDICTION_CACHE_BACKEND == 'redis':
+        backend = RedisCacheBackend(config.REDIS_URL, config.PREDICTION_CACHE_TIMEOUT_SECONDS)
+    elif config.PREDICTION_CACHE_BACKEND == 'memory':
+        backend = InProcessCacheBackend(config.PREDICTION_CACHE_MAX_ENTRIES)
+    else:
+        backend = None
+    return PredictionCache(backend, config.PREDICTION_CACHE_TTL_SECONDS, config.PREDICTION_CACHE_KEY)
+
+
+prediction_cache = create_prediction_cache()
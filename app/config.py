@@ -0,0 +1,194 @@
+# file: app/config.py
+# Runtime settings, read once from the environment (see .env)
+
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+############### MICRO-BATCHING ###############
+# Requests arriving within BATCH_MAX_WAIT_MS of each other share one forward pass
+BATCH_MAX_SIZE = _env_int('BATCH_MAX_SIZE', 32)
+BATCH_MAX_WAIT_MS = _env_float('BATCH_MAX_WAIT_MS', 10.0)
+
+
+############### INFERENCE EXECUTOR ###############
+# Decoding, resampling and forward passes run on this pool, never on the event loop.
+# Each worker runs torch ops with TORCH_NUM_THREADS intra-op threads.
+INFERENCE_WORKERS = _env_int('INFERENCE_WORKERS', 2)
+TORCH_NUM_THREADS = _env_int('TORCH_NUM_THREADS', max(1, (os.cpu_count() or 1) // INFERENCE_WORKERS))
+
+
+############### PREPROCESSING ###############
+# Resampling kernels are cached per (source rate, dtype); these rates are built at startup
+RESAMPLER_CACHE_SIZE = _env_int('RESAMPLER_CACHE_SIZE', 8)
+RESAMPLER_PREWARM_RATES = [
+    int(rate) for rate in os.getenv('RESAMPLER_PREWARM_RATES', '8000,22050,44100,48000').split(',') if rate.strip()
+]
+
+
+############### LONG AUDIO ###############
+# Recordings longer than one 5 s window are classified window by window. Clients may choose a hop
+# between LONG_AUDIO_MIN_HOP_SECONDS and 5 s: the minimum bounds the windows (forward passes) per upload.
+LONG_AUDIO_HOP_SECONDS = _env_float('LONG_AUDIO_HOP_SECONDS', 2.5)
+LONG_AUDIO_MIN_HOP_SECONDS = _env_float('LONG_AUDIO_MIN_HOP_SECONDS', 0.25)
+LONG_AUDIO_BATCH_SIZE = _env_int('LONG_AUDIO_BATCH_SIZE', 16)
+
+
+############### UPLOADS ###############
+# /predict reads uploads this many bytes at a time and stops once 5 s of audio is decoded
+UPLOAD_CHUNK_BYTES = _env_int('UPLOAD_CHUNK_BYTES', 64 * 1024)
+
+
+############### PREDICTION CACHE ###############
+# PREDICTION_CACHE_BACKEND: 'memory', 'redis' (any Redis-protocol server) or 'none'
+# PREDICTION_CACHE_KEY: 'upload' hashes the uploaded bytes before decoding,
+# 'waveform' hashes the decoded 5 s waveform (also matches re-encoded copies of a clip)
+# PREDICTION_CACHE_TIMEOUT_SECONDS: socket timeout of the redis backend; a slower or unreachable
+# server counts as a cache miss (see prediction_cache_errors_total)
+MODEL_VERSION = os.getenv('MODEL_VERSION', '1')
+PREDICTION_CACHE_BACKEND = os.getenv('PREDICTION_CACHE_BACKEND', 'memory').lower()
+PREDICTION_CACHE_KEY = os.getenv('PREDICTION_CACHE_KEY', 'upload').lower()
+PREDICTION_CACHE_MAX_ENTRIES = _env_int('PREDICTION_CACHE_MAX_ENTRIES', 10000)
+PREDICTION_CACHE_TTL_SECONDS = _env_float('PREDICTION_CACHE_TTL_SECONDS', 3600)
+PREDICTION_CACHE_TIMEOUT_SECONDS = _env_float('PREDICTION_CACHE_TIMEOUT_SECONDS', 0.1)
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+
+############### BATCH PREDICTIONS ###############
+# Upper bound on files per /predict/batch request, archive members included, and on the total
+# uncompressed size of the archive members extracted for one request or job
+BATCH_PREDICT_MAX_FILES = _env_int('BATCH_PREDICT_MAX_FILES', 256)
+ARCHIVE_MAX_BYTES = _env_int('ARCHIVE_MAX_BYTES', 512 * 1024 * 1024)
+
+
+############### JOBS ###############
+# Background jobs for long recordings and large batches; uploads are kept in JOBS_DIR until done
+# JOB_LEASE_SECONDS: a running job's worker refreshes its heartbeat every third of this; a job
+# whose heartbeat is older (its process died) is put back in the queue by any live process
+JOB_WORKERS = _env_int('JOB_WORKERS', 2)
+JOB_LEASE_SECONDS = _env_float('JOB_LEASE_SECONDS', 60)
+JOBS_DIR = os.getenv('JOBS_DIR', '/tmp/sound_classification_jobs')
+JOB_RESULT_PAGE_SIZE = _env_int('JOB_RESULT_PAGE_SIZE', 100)
+
+
+############### DATABASE ###############
+# Connection pool of the async engine (ignored for SQLite)
+DB_POOL_SIZE = _env_int('DB_POOL_SIZE', 10)
+DB_MAX_OVERFLOW = _env_int('DB_MAX_OVERFLOW', 20)
+DB_POOL_TIMEOUT = _env_float('DB_POOL_TIMEOUT', 30)
+DB_POOL_RECYCLE = _env_int('DB_POOL_RECYCLE', 1800)
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+
+
+############### USAGE RECORDING ###############
+# ServiceCall rows are buffered and written in bulk every USAGE_FLUSH_INTERVAL_SECONDS or
+# USAGE_FLUSH_SIZE records. USAGE_FLUSH_METHOD: 'insert' (multi-row INSERT) or 'copy' (PostgreSQL COPY)
+USAGE_FLUSH_SIZE = _env_int('USAGE_FLUSH_SIZE', 500)
+USAGE_FLUSH_INTERVAL_SECONDS = _env_float('USAGE_FLUSH_INTERVAL_SECONDS', 1.0)
+USAGE_FLUSH_METHOD = os.getenv('USAGE_FLUSH_METHOD', 'insert').lower()
+USAGE_SPILL_PATH = os.getenv('USAGE_SPILL_PATH', '/tmp/sound_classification_usage_spill.jsonl')
+
+
+############### PASSWORDS ###############
+# bcrypt runs on its own small pool so logins never compete with the inference workers.
+# BCRYPT_ROUNDS only applies to new hashes; existing hashes keep the cost they were made with.
+PASSWORD_HASH_WORKERS = _env_int('PASSWORD_HASH_WORKERS', 2)
+PASSWORD_HASH_MAX_PENDING = _env_int('PASSWORD_HASH_MAX_PENDING', 64)
+BCRYPT_ROUNDS = _env_int('BCRYPT_ROUNDS', 12)
+
+
+############### AUTH TOKENS ###############
+# Verified JWTs are cached (by sha256 of the token) until their exp; 0 disables the cache.
+# JWT_BACKEND: 'jose' (python-jose, default) or 'hmac' (stdlib HS256/384/512, cheaper to verify)
+TOKEN_CACHE_MAX_ENTRIES = _env_int('TOKEN_CACHE_MAX_ENTRIES', 10000)
+JWT_BACKEND = os.getenv('JWT_BACKEND', 'jose').lower()
+
+
+############### MODEL BACKENDS AND VARIANTS ###############
+# MODEL_VARIANT: eager | fused | dynamic_int8 | static_int8 | torchscript | compiled (see ml_models/optimization.py).
+# MODEL_ARTIFACT_PATH, if set, is a TorchScript file from the optimization CLI served instead of building a variant.
+# A variant is only served if it keeps every parity clip's top-1 category and no probability drifts more than
+# MODEL_PARITY_MAX_DRIFT from the eager model; otherwise the eager model is served.
+MODEL_PATH = os.getenv('MODEL_PATH', 'app/ml_models/trained_model.pth')
+# Checkpoints loaded at runtime through /admin/models must be inside MODEL_DIR
+MODEL_DIR = os.getenv('MODEL_DIR', 'app/ml_models')
+# MODEL_BACKEND: 'torch' (MODEL_VARIANT below) or 'onnxruntime' (ONNX_MODEL_PATH, from ml_models/export_onnx.py)
+MODEL_BACKEND = os.getenv('MODEL_BACKEND', 'torch').lower()
+ONNX_MODEL_PATH = os.getenv('ONNX_MODEL_PATH', 'app/ml_models/trained_model.onnx')
+MODEL_VARIANT = os.getenv('MODEL_VARIANT', 'eager').lower()
+MODEL_ARTIFACT_PATH = os.getenv('MODEL_ARTIFACT_PATH') or None
+MODEL_PARITY_GATE = os.getenv('MODEL_PARITY_GATE', 'true').lower() == 'true'
+MODEL_PARITY_CLIPS_DIR = os.getenv('MODEL_PARITY_CLIPS_DIR', 'app/ml_models/parity_clips')  # shipped with the app
+MODEL_PARITY_MAX_DRIFT = _env_float('MODEL_PARITY_MAX_DRIFT', 0.1)
+
+
+############### WORKER PROCESSES ###############
+# `python -m app.serve` loads the model in one parent process and forks SERVER_WORKERS workers that share
+# its memory copy-on-write. MODEL_MMAP memory-maps checkpoint tensors instead of copying them to the heap,
+# so processes that load the same checkpoint share its pages through the page cache.
+SERVER_WORKERS = _env_int('SERVER_WORKERS', 1)
+# Model versions loaded, activated or unloaded through /admin/models are stored in the database; every
+# process applies those changes to its own registry within MODEL_SYNC_INTERVAL_SECONDS
+MODEL_SYNC_INTERVAL_SECONDS = _env_float('MODEL_SYNC_INTERVAL_SECONDS', 5.0)
+MODEL_MMAP = os.getenv('MODEL_MMAP', 'true').lower() == 'true'
+
+
+############### STARTUP ###############
+# A loaded model predicts once on silence per MODEL_WARMUP_BATCH_SIZES entry before it can be activated.
+# FAST_START=true accepts connections as soon as the database is ready and imports torch, loads and warms the
+# model in the background; prediction routes answer 503 until it is active. Otherwise startup waits for the model.
+MODEL_WARMUP_BATCH_SIZES = [
+    int(size) for size in os.getenv('MODEL_WARMUP_BATCH_SIZES', '1').split(',') if size.strip()
+]
+FAST_START = os.getenv('FAST_START', 'false').lower() == 'true'
+
+
+############### HEALTH PROBES ###############
+# GET /healthcheck/ready answers 503 unless the model is loaded and warmed up, `SELECT 1` returns within
+# READINESS_DB_TIMEOUT_SECONDS (a pool with no free connection times out) and fewer than
+# READINESS_MAX_QUEUE_DEPTH requests wait in the batching queue. GET /healthcheck/live never does I/O.
+READINESS_DB_TIMEOUT_SECONDS = _env_float('READINESS_DB_TIMEOUT_SECONDS', 1.0)
+READINESS_MAX_QUEUE_DEPTH = _env_int('READINESS_MAX_QUEUE_DEPTH', 4 * BATCH_MAX_SIZE)
+
+
+############### PREDICTIONS ###############
+# Logits are divided by MODEL_TEMPERATURE before the softmax (temperature scaling; 1.0 leaves them unchanged).
+# A prediction whose top-1 probability is below MODEL_REJECTION_THRESHOLD is reported as 'unknown'
+# (0 disables rejection); the ranked top_k list still shows the model's categories.
+MODEL_TEMPERATURE = _env_float('MODEL_TEMPERATURE', 1.0)
+MODEL_REJECTION_THRESHOLD = _env_float('MODEL_REJECTION_THRESHOLD', 0.0)
+
+
+############### STREAMING ###############
+# /mlservice/v1/stream classifies the latest 5 s window every STREAM_HOP_SECONDS (clients may choose a hop
+# between STREAM_MIN_HOP_SECONDS and 5 s). A binary message larger than STREAM_MAX_CHUNK_BYTES closes the stream.
+STREAM_HOP_SECONDS = _env_float('STREAM_HOP_SECONDS', 1.0)
+STREAM_MIN_HOP_SECONDS = _env_float('STREAM_MIN_HOP_SECONDS', 0.25)
+STREAM_MAX_CHUNK_BYTES = _env_int('STREAM_MAX_CHUNK_BYTES', 1024 * 1024)
+
+
+############### ADMISSION CONTROL ###############
+# Token bucket per user on the inference routes. RATE_LIMITS gives each role's requests per second and
+# burst as 'role=rate/burst,...' (a rate of 0 is unlimited); /admin/limits overrides them per role or user.
+# RATE_LIMIT_BACKEND: 'memory' (per process) or 'redis' (REDIS_URL; buckets and overrides shared by all workers)
+RATE_LIMITS = os.getenv('RATE_LIMITS', 'user=10/20,admin=0/1')
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory').lower()
+# At most INFERENCE_MAX_IN_FLIGHT requests per process are admitted to inference; beyond that, or when
+# the estimated queue wait exceeds INFERENCE_LATENCY_BUDGET_SECONDS, requests get 503 with Retry-After
+INFERENCE_MAX_IN_FLIGHT = _env_int('INFERENCE_MAX_IN_FLIGHT', 64)
+INFERENCE_LATENCY_BUDGET_SECONDS = _env_float('INFERENCE_LATENCY_BUDGET_SECONDS', 2.0)
+
+
+############### METRICS ###############
+# GET /metrics serves every metric in the Prometheus text format for scrapers. It is off by default;
+# when on, scrapers must send `Authorization: Bearer <METRICS_TOKEN>` unless the token is left empty,
+# which leaves the endpoint open and is only meant for a private network
+METRICS_ENDPOINT = os.getenv('METRICS_ENDPOINT', 'false').lower() == 'true'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
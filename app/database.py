@@ -2,29 +2,78 @@
 
 import os
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+
+from . import config
+from .metrics import registry
 
 
 
 SQLALCHEMY_DATABASE_URL = os.environ['SQL_URL']
 print("Database URL:", SQLALCHEMY_DATABASE_URL)
 
-# base create_engine, uncomment next line for sql servers postgresql, mysql etc.
-# engine = create_engine(SQLALCHEMY_DATABASE_URL)
 
-# add connect_args={'check_same_thread': False} when using sqlite
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+def to_async_url(url: str) -> str:
+    """Maps sync driver URLs (postgresql://, sqlite://) to their async drivers (asyncpg, aiosqlite)"""
+    for sync_prefix, async_prefix in (
+        ('postgresql+psycopg2://', 'postgresql+asyncpg://'),
+        ('postgresql://', 'postgresql+asyncpg://'),
+        ('postgres://', 'postgresql+asyncpg://'),
+        ('sqlite://', 'sqlite+aiosqlite://'),
+    ):
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix):]
+    return url
+
+
+ASYNC_DATABASE_URL = to_async_url(SQLALCHEMY_DATABASE_URL)
+
+if ASYNC_DATABASE_URL.startswith('sqlite'):
+    engine = create_async_engine(ASYNC_DATABASE_URL, connect_args={'check_same_thread': False})
+else:
+    engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_pre_ping=config.DB_POOL_PRE_PING,
+    )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: attributes stay readable after commit without a lazy (blocking) reload
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+db_pool_size = registry.gauge('db_pool_size', 'Connections the pool keeps open')
+db_pool_checked_out = registry.gauge('db_pool_checked_out', 'Connections currently in use')
+db_pool_overflow = registry.gauge('db_pool_overflow', 'Connections open beyond the pool size')
+
+
+def _collect_pool_metrics() -> None:
+    pool = engine.sync_engine.pool
+    for gauge, method in ((db_pool_size, 'size'), (db_pool_checked_out, 'checkedout'), (db_pool_overflow, 'overflow')):
+        if hasattr(pool, method):  # not every pool class keeps these counts
+            gauge.set(getattr(pool, method)())
+
+
+registry.add_collector(_collect_pool_metrics)
+
+
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
-        
+
+
+async def create_tables() -> None:
+    """Creates missing tables only. Changes to existing tables are applied by `python -m app.migrate`."""
+    from .migrate import missing_columns
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        missing = await conn.run_sync(missing_columns)
+    if missing:
+        names = ', '.join(f'{column.table.name}.{column.name}' for column in missing)
+        print(f"The database schema is behind the models (missing {names}): run python -m app.migrate")
@@ -0,0 +1,76 @@
+# file: app/deployments.py
+# Model versions shared by every server process
+#
+# Each process has its own ModelRegistry. Under `python -m app.serve`, an /admin/models call
+# reaches one worker only, so the change is also recorded in the model_versions table, and
+# every process applies the recorded state to its registry every MODEL_SYNC_INTERVAL_SECONDS.
+
+import asyncio
+from typing import Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+from . import config
+from .database import SessionLocal
+from .models import ModelDeployment
+from .ml_models.registry import ModelRegistry, model_registry
+
+
+class ModelDeployments:
+    def __init__(self, registry: ModelRegistry, interval: float):
+        self.registry = registry
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, version: str, path: str) -> None:
+        """Records the version this process started with, active if none is yet, then syncs"""
+        async with SessionLocal() as db:
+            if await db.get(ModelDeployment, version) is None:
+                has_active = await db.scalar(select(ModelDeployment.version).where(ModelDeployment.active))
+                db.add(ModelDeployment(version=version, path=path, active=has_active is None))
+                try:
+                    await db.commit()
+                except IntegrityError:  # another worker recorded it first
+                    await db.rollback()
+        await self.sync()
+        self._task = asyncio.create_task(self._sync_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def sync(self) -> None:
+        async with SessionLocal() as db:
+            rows = (await db.scalars(select(ModelDeployment))).all()
+        self.registry.reconcile({row.version: (row.path, row.active) for row in rows})
+
+    async def _sync_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                print(f"Model version sync failed: {e}")
+
+    async def record_load(self, version: str, path: str, activate: bool) -> None:
+        async with SessionLocal() as db:
+            if activate:
+                await db.execute(update(ModelDeployment).values(active=False))
+            await db.merge(ModelDeployment(version=version, path=path, active=activate))
+            await db.commit()
+
+    async def record_activate(self, version: str) -> None:
+        async with SessionLocal() as db:
+            await db.execute(update(ModelDeployment).values(active=ModelDeployment.version == version))
+            await db.commit()
+
+    async def record_unload(self, version: str) -> None:
+        async with SessionLocal() as db:
+            await db.execute(delete(ModelDeployment).where(ModelDeployment.version == version))
+            await db.commit()
+
+
+model_deployments = ModelDeployments(model_registry, config.MODEL_SYNC_INTERVAL_SECONDS)
@@ -1,30 +1,33 @@
 # file: app/dev_tools.py
 
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from .models import User
-from passlib.context import CryptContext
+from .passwords import password_hasher
 
     
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def create_superuser(db: Session):
-    superuser = db.query(User).filter(User.username == 'superuser@example.com').first()
+async def create_superuser(db: AsyncSession):
+    superuser = await db.scalar(select(User).where(User.username == 'superuser@example.com'))
     if not superuser:
         superuser = User(
             username='superuser@example.com',
             first_name='Super',
             last_name='User',
-            hashed_password=pwd_context.hash('8888'),
+            hashed_password=await password_hasher.hash('8888'),
             is_active=True,
             role='admin',
             has_access_v1=True,
         )
         db.add(superuser)
-        db.commit()
+        try:
+            await db.commit()
+        except IntegrityError:  # another worker process created it first
+            await db.rollback()
 
-def remove_superuser(db: Session):
-    db.query(User).filter(User.username == 'superuser@example.com').delete()
-    db.commit()
+async def remove_superuser(db: AsyncSession):
+    await db.execute(delete(User).where(User.username == 'superuser@example.com'))
+    await db.commit()
     
     
     
@@ -0,0 +1,63 @@
+# file: app/instrumentation.py
+# Request metrics middleware and the per-stage latency histogram of the prediction routes
+
+import time
+
+from .metrics import registry
+
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+http_requests_total = registry.counter(
+    'http_requests_total', 'HTTP requests handled', labelnames=('method', 'route', 'status'),
+)
+http_request_duration_histogram = registry.histogram(
+    'http_request_duration_seconds', 'Time from receiving a request to the end of its response',
+    buckets=LATENCY_BUCKETS, labelnames=('method', 'route'),
+)
+http_requests_in_progress = registry.gauge('http_requests_in_progress', 'HTTP requests being handled')
+
+# Stages of the prediction routes: decode, resample, cache_lookup, inference, cache_store, usage_record.
+# Time spent queueing for the inference executor is part of the stage that waited for it.
+prediction_stage_histogram = registry.histogram(
+    'prediction_stage_seconds', 'Wall time of each stage of a prediction request',
+    buckets=LATENCY_BUCKETS, labelnames=('stage',),
+)
+
+
+def stage_timer(stage: str):
+    """`with stage_timer('decode'):` records the block in prediction_stage_seconds{stage="decode"}"""
+    return prediction_stage_histogram.labels(stage=stage).time()
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording every HTTP request's count, status and duration by route
+    template (e.g. /admin/users/{user_id}), so the label set stays bounded. Requests matching
+    no route are recorded under 'unmatched'. WebSocket connections are not recorded."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        started = time.perf_counter()
+        http_requests_in_progress.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_progress.dec()
+            route = scope.get('route')
+            route_path = getattr(route, 'path', 'unmatched')
+            http_request_duration_histogram.labels(scope['method'], route_path).observe(time.perf_counter() - started)
+            http_requests_total.labels(scope['method'], route_path, status_code).inc()
@@ -0,0 +1,204 @@
+# file: app/jobs.py
+# Persistent background jobs for long recordings and large batches
+
+import asyncio
+import itertools
+import os
+import shutil
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import func, select, update
+
+from . import config
+from .database import SessionLocal
+from .metrics import registry
+from .models import Job
+from .schemas import ServiceCallCreate
+from .usage import usage_recorder
+from .ml_models.executor import inference_executor
+
+
+JOB_KINDS = ('batch', 'long')
+
+jobs_queued = registry.gauge('jobs_queued', 'Jobs waiting for a worker')
+jobs_finished = registry.counter('jobs_finished_total', 'Jobs that reached succeeded or failed')
+job_duration_histogram = registry.histogram(
+    'job_duration_seconds', 'Run time of background jobs',
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0),
+)
+
+
+def job_input_dir(job_id: int) -> str:
+    return os.path.join(config.JOBS_DIR, str(job_id))
+
+
+class JobQueue:
+    """In-process priority queue of job ids backed by the jobs table.
+    Higher priority runs first, FIFO within a priority. Several processes (app.serve workers) may
+    hold the same job id: a job is claimed with a conditional UPDATE, so only one of them runs it.
+    A running job's heartbeat is refreshed while it runs; jobs whose heartbeat is older than
+    JOB_LEASE_SECONDS were left by a dead process and are queued again."""
+
+    def __init__(self, registry, workers: int):
+        self.registry = registry
+        self.workers = max(1, workers)
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._sequence = itertools.count()
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.PriorityQueue()
+        await self.requeue_expired()
+        async with SessionLocal() as db:
+            pending = await db.execute(
+                select(Job.id, Job.priority).where(Job.status == 'queued').order_by(Job.created_at, Job.id)
+            )
+            for job_id, priority in pending.all():
+                self.enqueue(job_id, priority)
+        self._tasks = [asyncio.create_task(self._work_forever()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._requeue_forever()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, job_id: int, priority: int) -> None:
+        if self._queue is None:
+            return  # not started yet (FAST_START): start() picks up the job from the table
+        self._queue.put_nowait((-priority, next(self._sequence), job_id))
+        jobs_queued.set(self._queue.qsize())
+
+    async def requeue_expired(self) -> int:
+        """Put running jobs whose heartbeat expired back in the queue; returns how many"""
+        cutoff = datetime.now() - timedelta(seconds=config.JOB_LEASE_SECONDS)
+        expired = (Job.status == 'running', func.coalesce(Job.heartbeat_at, Job.started_at) < cutoff)
+        requeued = []
+        async with SessionLocal() as db:
+            stale = await db.execute(select(Job.id, Job.priority).where(*expired))
+            for job_id, priority in stale.all():
+                result = await db.execute(update(Job).where(Job.id == job_id, *expired).values(status='queued'))
+                if result.rowcount == 1:  # another process may have requeued it first
+                    requeued.append((job_id, priority))
+            await db.commit()
+        for job_id, priority in requeued:
+            print(f"Job {job_id} lost its worker, queued again")
+            self.enqueue(job_id, priority)
+        return len(requeued)
+
+    async def _requeue_forever(self) -> None:
+        while True:
+            await asyncio.sleep(config.JOB_LEASE_SECONDS)
+            try:
+                await self.requeue_expired()
+            except Exception as e:
+                print(f"Requeueing expired jobs failed: {e}")
+
+    async def _claim(self, job_id: int) -> bool:
+        """queued -> running in one conditional UPDATE; False if another worker got it first"""
+        now = datetime.now()
+        async with SessionLocal() as db:
+            result = await db.execute(
+                update(Job).where(Job.id == job_id, Job.status == 'queued')
+                .values(status='running', started_at=now, heartbeat_at=now)
+            )
+            await db.commit()
+        return result.rowcount == 1
+
+    async def _heartbeat(self, job_id: int) -> None:
+        while True:
+            await asyncio.sleep(config.JOB_LEASE_SECONDS / 3)
+            try:
+                async with SessionLocal() as db:
+                    await db.execute(
+                        update(Job).where(Job.id == job_id, Job.status == 'running').values(heartbeat_at=datetime.now())
+                    )
+                    await db.commit()
+            except Exception as e:
+                print(f"Heartbeat of job {job_id} failed: {e}")
+
+    async def _work_forever(self) -> None:
+        while True:
+            _, _, job_id = await self._queue.get()
+            jobs_queued.set(self._queue.qsize())
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                print(f"Job {job_id} crashed: {e}")
+
+    async def _run(self, job_id: int) -> None:
+        if not await self._claim(job_id):
+            return
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            await self._run_claimed(job_id)
+        finally:
+            heartbeat.cancel()
+        shutil.rmtree(job_input_dir(job_id), ignore_errors=True)
+
+    async def _run_claimed(self, job_id: int) -> None:
+        async with SessionLocal() as db:
+            job = await db.get(Job, job_id)
+            service_calls: List[ServiceCallCreate] = []
+            model = None
+            try:
+                model = self.registry.active()  # the whole job runs on one model version
+                if job.kind == 'long':
+                    result = await self._run_long(model, job)
+                else:
+                    result = await self._run_batch(model, job)
+                job.result = [item.model_dump() for item in result]
+                job.status = 'succeeded'
+                successes = [getattr(item, 'error', None) is None for item in result] if job.kind == 'batch' else [True]
+            except Exception as e:
+                job.error = str(e)
+                job.status = 'failed'
+                successes = [False]
+            job.finished_at = datetime.now()
+
+            duration = (job.finished_at - job.started_at).total_seconds()
+            for success in successes:
+                service_calls.append(ServiceCallCreate(
+                    service_version=f"v1:{model.version if model is not None else 'none'}",
+                    success=success,
+                    owner_id=job.owner_id,
+                    request_time=job.started_at,
+                    completion_time=job.finished_at,
+                    duration=duration,
+                    priority=job.priority,
+                ))
+            await db.commit()
+            usage_recorder.record(*service_calls)
+            jobs_finished.inc()
+            job_duration_histogram.observe(duration)
+
+    def _input_paths(self, job: Job) -> List[str]:
+        return [os.path.join(job.input_dir, name) for name in job.params['stored_files']]
+
+    # The model code is imported here rather than with the module: a job only runs once a
+    # model is active, and by then the registry has imported it (and torch)
+    async def _run_long(self, model, job: Job) -> list:
+        from .ml_models.windowing import classify_long_audio
+        with open(self._input_paths(job)[0], 'rb') as audio_file:
+            return await classify_long_audio(
+                model, audio_file, job.params['hop_seconds'], config.LONG_AUDIO_BATCH_SIZE,
+                job.params.get('merge', True),
+            )
+
+    async def _run_batch(self, model, job: Job) -> list:
+        from .ml_models.ingestion import expand_archives
+        from .ml_models.pipelines import predict_files
+        handles = [open(path, 'rb') for path in self._input_paths(job)]
+        try:
+            files = await inference_executor.run(
+                expand_archives, list(zip(job.params['filenames'], handles)),
+                config.BATCH_PREDICT_MAX_FILES, config.ARCHIVE_MAX_BYTES,
+            )
+            return await predict_files(model, files, job.params.get('top_k', 1))
+        finally:
+            for handle in handles:
+                handle.close()
@@ -1,55 +1,127 @@
 # file: app/main.py
 
+from .startup import startup_profile  # first: its clock times the imports below
+
+import asyncio
+import hmac
 import os
+import time
+from typing import Optional
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
 
 
-from .ml_models.v1 import PlaceholderMLModelV1
+from .ml_models.registry import import_serving_modules, model_registry
+from .ml_models.executor import inference_executor
+from .cache import prediction_cache
+from .deployments import model_deployments
+from .usage import usage_recorder
+from .passwords import password_hasher
+from .admission import rate_limiter
+from . import config
+from .instrumentation import MetricsMiddleware
+from .metrics import registry
 from .models import Base
-from .database import engine, SessionLocal
-from .routers import auth, admin, users, ml_service_v1 
+from .database import SessionLocal, create_tables
+from .routers import auth, admin, users, ml_service_v1, jobs, health
 from .devtools import create_superuser, remove_superuser
 
 load_dotenv(override=True) # loads environment variables from the .environment folder
-
-############## ML MODELS ###############
-placeholder_ml_model_v1 = PlaceholderMLModelV1()
+startup_profile.record('import', time.perf_counter() - startup_profile.started)
 
 ############### API ###############
 app = FastAPI()
+app.add_middleware(MetricsMiddleware)
 app.include_router(auth.router) 
 app.include_router(admin.router)
 app.include_router(users.router)
 app.include_router(ml_service_v1.router)
+app.include_router(jobs.router)
+app.include_router(health.router)
 
 
-############### DATABASE ###############
-Base.metadata.create_all(bind=engine)
+############### LIFESPAN ###############
+# The database is prepared first, then the model. Preparing the model starts by importing torch, which
+# holds the GIL for long stretches, so running both at once only slowed the database down. With
+# FAST_START, startup returns once the database is ready and the model is prepared in the background
+# (see GET /admin/startup).
+_startup_task: Optional[asyncio.Task] = None
+
+
+async def prepare_database():
+    with startup_profile.stage('create_tables'):
+        await create_tables()
+    await usage_recorder.start()
+
+    if os.getenv('CREATE_SUPERUSER', 'false').lower() == 'true':
+        with startup_profile.stage('create_superuser'):
+            async with SessionLocal() as db:
+                await create_superuser(db)
+
+
+async def prepare_model():
+    with startup_profile.stage('model_import'):  # torch and the model code, off the event loop
+        await inference_executor.run(import_serving_modules)
+    from .ml_models.preprocessing import resampler_bank
+    with startup_profile.stage('resampler_prewarm'):
+        await inference_executor.run(resampler_bank.prewarm, config.RESAMPLER_PREWARM_RATES)
+    entry = await model_registry.load(config.MODEL_VERSION, config.MODEL_PATH, activate=True)
+    startup_profile.record('model_load', entry.model.load_seconds)
+    startup_profile.record('model_warmup', entry.model.warmup_seconds)
+
+
+async def finish_startup(model_ready: asyncio.Task):
+    await model_ready
+    await model_deployments.start(config.MODEL_VERSION, config.MODEL_PATH)  # versions loaded by other workers
+    await jobs.job_queue.start()  # after the model: queued jobs start running right away
+    startup_profile.mark_ready()
 
 
-############### LIFESPAN ###############
 @app.on_event('startup')
 async def startup_event():
-    if os.getenv('CREATE_SUPERUSER', 'false').lower() == 'true':
-        db = SessionLocal()
-        create_superuser(db)
-        db.close()
-                
-    await ml_service_v1.placeholder_ml_model_v1.load_model()
+    global _startup_task
+    inference_executor.start()
+    await ml_service_v1.prediction_batcher_v1.start()
+    await prepare_database()
+
+    model_ready = asyncio.create_task(prepare_model())
+    if config.FAST_START:
+        _startup_task = asyncio.create_task(finish_startup(model_ready))
+    else:
+        await finish_startup(model_ready)
         
         
         
 @app.on_event('shutdown')
 async def shutdown_event():
+    if _startup_task is not None:
+        _startup_task.cancel()
+        await asyncio.gather(_startup_task, return_exceptions=True)
+    await model_deployments.stop()
+    await jobs.job_queue.stop()
+    await ml_service_v1.prediction_batcher_v1.stop()
+    await model_registry.close()
+    inference_executor.shutdown()
+    password_hasher.shutdown()
+    await prediction_cache.close()
+    await rate_limiter.close()
+    await usage_recorder.stop()  # after the job queue and batcher, so their last records are written
+
     if os.getenv('CREATE_SUPERUSER', 'false').lower() == 'true':
-        db = SessionLocal()
-        remove_superuser(db)
-        db.close()
+        async with SessionLocal() as db:
+            await remove_superuser(db)
 
 
 ############### ROUTES ###############
-@app.get('/healthcheck')
-def get_healthcheck():
-    return {'status': 'healthy'}
-
+if config.METRICS_ENDPOINT:
+    @app.get('/metrics', response_class=PlainTextResponse)
+    def get_prometheus_metrics(authorization: Optional[str] = Header(None)):
+        """Every metric in the Prometheus text format, for scrapers; needs `Bearer <METRICS_TOKEN>`
+        when METRICS_TOKEN is set (admins can always use GET /admin/metrics)"""
+        if config.METRICS_TOKEN and not hmac.compare_digest(authorization or '', f'Bearer {config.METRICS_TOKEN}'):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token",
+                headers={'WWW-Authenticate': 'Bearer'},
+            )
+        return PlainTextResponse(registry.render_prometheus(), media_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,252 @@
+# file: app/metrics.py
+# Minimal in-process metrics: counters, gauges and histograms, optionally labelled,
+# exported as JSON (GET /admin/metrics) or in the Prometheus text format (GET /metrics)
+
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _escape(value: str, quotes: bool = True) -> str:
+    value = value.replace('\\', '\\\\').replace('\n', '\\n')
+    return value.replace('"', '\\"') if quotes else value
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + '}'
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def snapshot(self) -> dict:
+        return {'type': 'counter', 'value': self._value}
+
+    def samples(self, labels: Dict[str, str]) -> List[str]:
+        return [f'{self.name}{_format_labels(labels)} {_format_value(self._value)}']
+
+
+class Gauge:
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def snapshot(self) -> dict:
+        return {'type': 'gauge', 'value': self._value}
+
+    def samples(self, labels: Dict[str, str]) -> List[str]:
+        return [f'{self.name}{_format_labels(labels)} {_format_value(self._value)}']
+
+
+class _Timer:
+    def __init__(self, histogram: 'Histogram'):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._counts[bisect_left(self.buckets, value)] += 1
+            self._sum += value
+            self._count += 1
+
+    def time(self) -> _Timer:
+        """`with histogram.time():` observes the block's wall time in seconds"""
+        return _Timer(self)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def cumulative_counts(self) -> List[int]:
+        running, cumulative = 0, []
+        for count in self._counts:
+            running += count
+            cumulative.append(running)
+        return cumulative
+
+    def snapshot(self) -> dict:
+        return {
+            'type': 'histogram',
+            'count': self._count,
+            'sum': self._sum,
+            'mean': self._sum / self._count if self._count else None,
+            'buckets': dict(zip([*map(str, self.buckets), '+Inf'], self.cumulative_counts())),
+        }
+
+    def samples(self, labels: Dict[str, str]) -> List[str]:
+        with self._lock:
+            cumulative, total, count = self.cumulative_counts(), self._sum, self._count
+        lines = [
+            f'{self.name}_bucket{_format_labels({**labels, "le": _format_value(bound)})} {bucket_count}'
+            for bound, bucket_count in zip([*self.buckets, math.inf], cumulative)
+        ]
+        lines.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(total)}')
+        lines.append(f'{self.name}_count{_format_labels(labels)} {count}')
+        return lines
+
+
+class MetricFamily:
+    """A labelled metric: one Counter, Gauge or Histogram per combination of label values.
+    Label values should come from small, fixed sets (route templates, stages, status codes)."""
+
+    def __init__(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        self.cls = cls
+        self.type = cls.type
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._kwargs = kwargs
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **labels):
+        if labels:
+            values = tuple(labels[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self.cls(self.name, self.documentation, **self._kwargs))
+        return child
+
+    def series(self) -> List[Tuple[Dict[str, str], object]]:
+        return [(dict(zip(self.labelnames, key)), child) for key, child in sorted(self._children.items())]
+
+    def snapshot(self) -> dict:
+        return {
+            'type': self.type,
+            'series': [{'labels': labels, **child.snapshot()} for labels, child in self.series()],
+        }
+
+    def samples(self, labels: Dict[str, str]) -> List[str]:
+        return [line for child_labels, child in self.series() for line in child.samples({**labels, **child_labels})]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                if labelnames:
+                    metric = MetricFamily(cls, name, documentation, labelnames, **kwargs)
+                else:
+                    metric = cls(name, documentation, **kwargs)
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self, name: str, documentation: str, buckets: Optional[Sequence[float]] = None, labelnames: Sequence[str] = (),
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets or DEFAULT_BUCKETS)
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """`collector` runs before each export, to set gauges read from elsewhere (pool sizes...)"""
+        self._collectors.append(collector)
+
+    def collect(self) -> None:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Metrics collector {collector.__name__} failed: {e}")
+
+    def snapshot(self) -> dict:
+        self.collect()
+        return {name: metric.snapshot() for name, metric in sorted(self._metrics.items())}
+
+    def render_prometheus(self) -> str:
+        """Text exposition format 0.0.4"""
+        self.collect()
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            lines.append(f'# HELP {name} {_escape(metric.documentation, quotes=False)}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            lines.extend(metric.samples({}))
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
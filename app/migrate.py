@@ -0,0 +1,91 @@
+# file: app/migrate.py
+# Schema migrations: brings an existing database up to the models in app/models.py
+#
+# create_all (run by every process at startup) only creates missing tables. Columns, indexes
+# and VARCHAR lengths added to existing tables are applied here, once per deployment, before
+# the servers start:
+#   python -m app.migrate
+# app.serve runs it in the supervisor before forking its workers.
+
+import asyncio
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+
+from . import models  # noqa: F401  (registers the tables on Base.metadata)
+from .database import Base, engine
+
+
+def missing_columns(connection) -> list:
+    """Columns declared on tables that exist in the database but lack them"""
+    inspector = inspect(connection)
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if inspector.has_table(table.name):
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            missing.extend(column for column in table.columns if column.name not in existing)
+    return missing
+
+
+def add_missing_columns(connection) -> None:
+    """A NOT NULL column needs a server_default to fill the existing rows, otherwise it is skipped"""
+    preparer = connection.dialect.identifier_preparer
+    for column in missing_columns(connection):
+        name = f'{column.table.name}.{column.name}'
+        if not column.nullable and column.server_default is None:
+            print(f"Cannot add NOT NULL column {name} without a server_default")
+            continue
+        # CreateColumn renders the quoted name, type, DEFAULT and NOT NULL for this dialect
+        definition = CreateColumn(column).compile(dialect=connection.dialect)
+        connection.execute(text(f'ALTER TABLE {preparer.format_table(column.table)} ADD COLUMN {definition}'))
+        print(f"Added column {name}")
+
+
+def create_missing_indexes(connection) -> None:
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def widen_string_columns(connection) -> None:
+    """PostgreSQL only: SQLite does not enforce VARCHAR lengths"""
+    if connection.dialect.name != 'postgresql':
+        return
+    inspector = inspect(connection)
+    preparer = connection.dialect.identifier_preparer
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name']: column['type'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            declared = getattr(column.type, 'length', None)
+            current = getattr(existing.get(column.name), 'length', None)
+            if declared and current and current < declared:
+                connection.execute(text(
+                    f'ALTER TABLE {preparer.format_table(table)} ALTER COLUMN {preparer.format_column(column)} '
+                    f'TYPE {column.type.compile(dialect=connection.dialect)}'
+                ))
+                print(f"Widened {table.name}.{column.name} to {declared}")
+
+
+def migrate_sync(connection) -> None:
+    if connection.dialect.name == 'postgresql':
+        # one migration at a time, should two deployments start together; released on commit
+        connection.execute(text('SELECT pg_advisory_xact_lock(hashtext(:key))'), {'key': 'app.migrate'})
+    Base.metadata.create_all(connection)
+    add_missing_columns(connection)
+    create_missing_indexes(connection)
+    widen_string_columns(connection)
+
+
+async def migrate() -> None:
+    async with engine.begin() as connection:
+        await connection.run_sync(migrate_sync)
+
+
+if __name__ == '__main__':
+    async def main():
+        await migrate()
+        await engine.dispose()
+
+    asyncio.run(main())
@@ -0,0 +1,44 @@
+# file: app/ml_models/backends.py
+# Inference backends behind PlaceholderMLModelV1: each maps a [N, 80000] waveform batch to [N, num_classes] logits
+
+import torch
+import torch.nn as nn
+
+
+class TorchBackend:
+    """Any torch module: the eager Net or one of the variants from optimization.py"""
+
+    name = 'torch'
+
+    def __init__(self, module: nn.Module, variant: str = 'eager'):
+        self.module = module
+        self.variant = variant
+
+    def __call__(self, waveforms: torch.Tensor) -> torch.Tensor:
+        with torch.inference_mode():
+            return self.module(waveforms)
+
+
+class OnnxRuntimeBackend:
+    """ONNX Runtime on CPU, for graphs exported by export_onnx.py with a dynamic batch axis.
+    Inputs and outputs are converted without copies (torch <-> numpy share memory)."""
+
+    name = 'onnxruntime'
+
+    def __init__(self, path: str, num_threads: int):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise RuntimeError("MODEL_BACKEND=onnxruntime requires the 'onnxruntime' package") from e
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = max(1, num_threads)
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.variant = 'onnx'
+
+    def __call__(self, waveforms: torch.Tensor) -> torch.Tensor:
+        inputs = waveforms.detach().contiguous().to(torch.float32).numpy()
+        (logits,) = self.session.run(None, {self.input_name: inputs})
+        return torch.from_numpy(logits)
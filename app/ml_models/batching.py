@@ -0,0 +1,138 @@
+# file: app/ml_models/batching.py
+# Dynamic micro-batching: concurrent requests share a single forward pass
+
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+from ..metrics import registry
+
+
+BatchRunner = Callable[[List[Any]], Awaitable[List[Any]]]
+
+batch_size_histogram = registry.histogram(
+    'inference_batch_size', 'Number of requests merged into one forward pass',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+batch_queue_wait_histogram = registry.histogram(
+    'inference_queue_wait_seconds', 'Time a request waits in the batching queue',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+batch_duration_histogram = registry.histogram(
+    'inference_batch_duration_seconds', 'Wall time of one batched forward pass',
+)
+batches_total = registry.counter('inference_batches_total', 'Forward passes run by the batcher')
+batch_queue_depth = registry.gauge('inference_queue_depth', 'Requests waiting in the batching queue')
+
+
+class MicroBatcher:
+    """Collects items for up to `max_wait_ms` or `max_batch_size` items, then hands the whole
+    batch to `run_batch` and resolves each caller with its own result.
+    Up to `max_concurrent_batches` batches run at once (one per inference worker)."""
+
+    def __init__(
+        self,
+        run_batch: BatchRunner,
+        max_batch_size: int,
+        max_wait_ms: float,
+        max_concurrent_batches: int = 1,
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight: Set[asyncio.Task] = set()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+        self._task = asyncio.create_task(self._collect_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        while self._queue is not None and not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError('Batcher stopped'))
+
+    async def submit(self, item: Any) -> Any:
+        if not self.running:
+            await self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        await self._queue.put((item, future, loop.time()))
+        batch_queue_depth.set(self._queue.qsize())
+        return await future
+
+    async def _collect_forever(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()  # wait for a free worker before collecting the next batch
+            batch = []
+            try:
+                batch.append(await self._queue.get())
+                deadline = loop.time() + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except BaseException:
+                self._slots.release()
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError('Batcher stopped'))
+                raise
+            batch_queue_depth.set(self._queue.qsize())
+            task = asyncio.create_task(self._run(batch, loop))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future, float]], loop) -> None:
+        started = loop.time()
+        for _, _, enqueued in batch:
+            batch_queue_wait_histogram.observe(started - enqueued)
+        batch_size_histogram.observe(len(batch))
+        batches_total.inc()
+
+        try:
+            results = await self.run_batch([item for item, _, _ in batch])
+            if len(results) != len(batch):  # zip() would leave the unmatched callers waiting forever
+                raise RuntimeError(f"Batch runner returned {len(results)} results for {len(batch)} items")
+        except BaseException as e:
+            error = e if isinstance(e, Exception) else RuntimeError('Batcher stopped')
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(error)
+            if not isinstance(e, Exception):
+                raise
+        else:
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            batch_duration_histogram.observe(loop.time() - started)
+            self._slots.release()
@@ -0,0 +1,6 @@
+# file: app/ml_models/constants.py
+# The model's input format. No torch here: routes use these at import time, before torch is loaded.
+
+SAMPLE_RATE = 16000  # the model's expected sample rate
+TARGET_LENGTH = 80000  # 5 seconds at SAMPLE_RATE
+WINDOW_SECONDS = TARGET_LENGTH / SAMPLE_RATE
@@ -0,0 +1,48 @@
+# file: app/ml_models/executor.py
+# Dedicated thread pool for CPU-bound audio decoding and inference
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+from .. import config
+
+
+def _init_worker(torch_threads: int) -> None:
+    import torch  # in the worker thread: importing torch takes seconds, the event loop keeps serving
+    torch.set_num_threads(torch_threads)
+
+
+class InferenceExecutor:
+    """Bounded pool of worker threads. Torch kernels release the GIL, so a few threads are
+    enough to keep the cores busy while the event loop keeps serving other requests."""
+
+    def __init__(self, max_workers: int, torch_threads: int):
+        self.max_workers = max(1, max_workers)
+        self.torch_threads = max(1, torch_threads)
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def start(self) -> None:
+        if self._pool is not None:
+            return
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='inference',
+            initializer=_init_worker,
+            initargs=(self.torch_threads,),
+        )
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        if self._pool is None:
+            self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, partial(fn, *args, **kwargs))
+
+
+inference_executor = InferenceExecutor(config.INFERENCE_WORKERS, config.TORCH_NUM_THREADS)
@@ -0,0 +1,55 @@
+# file: app/ml_models/export_onnx.py
+# Exports Net to ONNX with a dynamic batch axis, for MODEL_BACKEND=onnxruntime
+#
+#   python -m app.ml_models.export_onnx --output app/ml_models/trained_model.onnx
+
+import torch
+
+from .optimization import fold_batchnorm
+from .preprocessing import TARGET_LENGTH
+
+
+INPUT_NAME = 'waveform'
+OUTPUT_NAME = 'logits'
+
+
+def export_onnx(model: torch.nn.Module, path: str, opset_version: int = 17) -> None:
+    """Exports the BatchNorm-folded model (explicit padding instead of padding='same').
+    Net's reshapes use -1 for the batch dimension (view(-1, 1, 1, 80000), view((-1, 1, 16, 625)),
+    view(x.size(0), -1)), so they export as shape-agnostic Reshape nodes and any batch size runs."""
+    example = torch.zeros(2, TARGET_LENGTH)
+    torch.onnx.export(
+        fold_batchnorm(model),
+        (example,),
+        path,
+        input_names=[INPUT_NAME],
+        output_names=[OUTPUT_NAME],
+        dynamic_axes={INPUT_NAME: {0: 'batch'}, OUTPUT_NAME: {0: 'batch'}},
+        opset_version=opset_version,
+        do_constant_folding=True,
+    )
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from .. import config
+    from .backends import OnnxRuntimeBackend
+    from .optimization import check_parity, load_parity_clips
+    from .v1 import load_eager_model
+
+    parser = argparse.ArgumentParser(description="Export Net to ONNX with a dynamic batch axis")
+    parser.add_argument('--output', default=config.ONNX_MODEL_PATH)
+    parser.add_argument('--opset', type=int, default=17)
+    parser.add_argument('--clips', default=config.MODEL_PARITY_CLIPS_DIR)
+    args = parser.parse_args()
+
+    eager = load_eager_model(config.MODEL_PATH)
+    export_onnx(eager, args.output, args.opset)
+
+    backend = OnnxRuntimeBackend(args.output, config.TORCH_NUM_THREADS)
+    clips = load_parity_clips(args.clips)
+    for batch_size in (1, 3, 16):
+        assert backend(torch.zeros(batch_size, TARGET_LENGTH)).shape[0] == batch_size
+    report = check_parity(eager, backend, clips, config.MODEL_PARITY_MAX_DRIFT)
+    print(f"Saved ONNX model to {args.output}: {report}")
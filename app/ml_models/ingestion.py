@@ -0,0 +1,109 @@
+# file: app/ml_models/ingestion.py
+# Bounded-memory ingestion of uploaded audio for single-window predictions
+
+import io
+import math
+import tarfile
+import zipfile
+from typing import BinaryIO, List, Tuple
+
+import torch
+from fastapi import UploadFile
+
+from .. import config
+from ..instrumentation import stage_timer
+from .executor import inference_executor
+from .preprocessing import (
+    SAMPLE_RATE, TARGET_LENGTH, WavFormatError, WavStreamDecoder, load_waveform, prepare_waveforms,
+)
+
+
+async def load_upload_waveform(upload: UploadFile) -> torch.Tensor:
+    """Decodes the first 5 s of an upload into a mono [1, TARGET_LENGTH] tensor at SAMPLE_RATE.
+
+    WAV uploads are parsed as they are read and decoded chunk by chunk into a buffer
+    preallocated for exactly 5 s at the file's own rate; reading stops as soon as it is full,
+    so peak memory does not depend on the upload size. Other formats are decoded in full."""
+    decoder = WavStreamDecoder()
+    buffer = None
+    filled = 0
+    with stage_timer('decode'):  # reading the upload and decoding it (or all of it, for non-WAV formats)
+        try:
+            while not decoder.finished and (buffer is None or filled < buffer.shape[-1]):
+                data = await upload.read(config.UPLOAD_CHUNK_BYTES)
+                if not data:
+                    break
+                for chunk in decoder.feed(data):
+                    if buffer is None:
+                        buffer = torch.zeros(1, math.ceil(TARGET_LENGTH * decoder.sample_rate / SAMPLE_RATE))
+                    n = min(chunk.shape[-1], buffer.shape[-1] - filled)
+                    buffer[:, filled:filled + n] = chunk[:, :n]
+                    filled += n
+            if not decoder.in_data:
+                raise WavFormatError("No WAV data chunk found")
+        except WavFormatError:
+            await upload.seek(0)
+            return await inference_executor.run(load_waveform, await upload.read())
+
+    if buffer is None:  # empty data chunk
+        return torch.zeros(1, TARGET_LENGTH)
+    if decoder.sample_rate == SAMPLE_RATE:
+        return buffer  # already [1, TARGET_LENGTH], zero-padded past `filled`
+    with stage_timer('resample'):
+        prepared = await inference_executor.run(prepare_waveforms, [(buffer[:, :filled], decoder.sample_rate)])
+    return prepared[0]
+
+
+############### ARCHIVES ###############
+def _is_hidden(name: str) -> bool:
+    return any(part.startswith(('.', '__MACOSX')) for part in name.split('/'))
+
+
+def _read_member(member_file: BinaryIO, declared_size: int, remaining: int, name: str) -> bytes:
+    """Reads one archive member, refusing it once it would exceed the `remaining` byte budget.
+    The declared size is checked first, and the read is capped too in case the header lies."""
+    if declared_size > remaining:
+        raise ValueError(f"Archive member {name} is too large: at most {remaining} more bytes per request")
+    data = member_file.read(remaining + 1)
+    if len(data) > remaining:
+        raise ValueError(f"Archive member {name} is too large: at most {remaining} more bytes per request")
+    return data
+
+
+def expand_archives(files: List[Tuple[str, BinaryIO]], max_files: int, max_bytes: int) -> List[Tuple[str, BinaryIO]]:
+    """Replaces zip and tar(.gz) uploads by their regular, non-hidden members, in archive order.
+    Raises ValueError when more than `max_files` files result, or when the extracted members
+    add up to more than `max_bytes` uncompressed (before reading the member that would)."""
+    expanded: List[Tuple[str, BinaryIO]] = []
+    remaining = max_bytes
+    for name, audio_file in files:
+        if zipfile.is_zipfile(audio_file):
+            audio_file.seek(0)
+            with zipfile.ZipFile(audio_file) as archive:
+                for member in archive.infolist():
+                    if not member.is_dir() and not _is_hidden(member.filename):
+                        with archive.open(member) as member_file:
+                            data = _read_member(member_file, member.file_size, remaining, member.filename)
+                        remaining -= len(data)
+                        expanded.append((member.filename, io.BytesIO(data)))
+                        if len(expanded) > max_files:
+                            break
+        else:
+            audio_file.seek(0)
+            try:
+                archive = tarfile.open(fileobj=audio_file, mode='r:*')
+            except tarfile.TarError:
+                audio_file.seek(0)
+                expanded.append((name, audio_file))
+            else:
+                with archive:
+                    for member in archive:
+                        if member.isfile() and not _is_hidden(member.name):
+                            data = _read_member(archive.extractfile(member), member.size, remaining, member.name)
+                            remaining -= len(data)
+                            expanded.append((member.name, io.BytesIO(data)))
+                            if len(expanded) > max_files:
+                                break
+        if len(expanded) > max_files:
+            raise ValueError(f"Too many files: at most {max_files} per request")
+    return expanded
@@ -0,0 +1,62 @@
+# file: app/ml_models/labels.py
+# Net's label space: output index -> ESC-50 category, decoded for a whole batch at once
+
+from typing import Sequence, Tuple
+
+import numpy as np
+import torch
+
+
+# Category of each of Net's 50 outputs, in index order
+CATEGORIES = (
+    'dog', 'rooster', 'pig', 'cow', 'frog', 'cat', 'hen', 'insects', 'sheep', 'crow',
+    'rain', 'sea_waves', 'crackling_fire', 'crickets', 'chirping_birds', 'water_drops', 'wind', 'pouring_water', 'toilet_flush', 'thunderstorm',
+    'crying_baby', 'sneezing', 'clapping', 'breathing', 'coughing', 'footsteps', 'laughing', 'brushing_teeth', 'snoring', 'drinking_sipping',
+    'door_wood_knock', 'mouse_click', 'keyboard_typing', 'door_wood_creaks', 'can_opening', 'washing_machine', 'vacuum_cleaner', 'clock_alarm', 'clock_tick', 'glass_breaking',
+    'helicopter', 'chainsaw', 'siren', 'car_horn', 'engine', 'train', 'church_bells', 'airplane', 'fireworks', 'hand_saw',
+)
+
+# Reported for rejected predictions and for indices outside the label space; never a class of its own
+UNKNOWN = 'unknown'
+
+
+class LabelSpace:
+    """Built once per model. Names live in one array whose extra last slot is UNKNOWN, so a
+    [N, k] tensor of indices decodes with a single array lookup, and out-of-range indices or
+    rejected predictions are redirected to that slot instead of being looked up one by one.
+
+    `temperature` divides the logits before the softmax (calibration; 1.0 leaves them as they
+    are). A top-1 probability below `rejection_threshold` is reported as UNKNOWN (0 disables it)."""
+
+    def __init__(self, categories: Sequence[str], temperature: float = 1.0, rejection_threshold: float = 0.0):
+        if temperature <= 0:
+            raise ValueError("temperature must be positive")
+        self.categories = tuple(categories)
+        self.unknown_index = len(self.categories)
+        self.temperature = temperature
+        self.rejection_threshold = rejection_threshold
+        self._names = np.array(self.categories + (UNKNOWN,), dtype=object)
+
+    def probabilities(self, logits: torch.Tensor) -> torch.Tensor:
+        if self.temperature != 1.0:
+            logits = logits / self.temperature
+        return torch.softmax(logits, dim=1)
+
+    def top_k(self, logits: torch.Tensor, k: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        """[N, k] probabilities and class indices, best first, from [N, num_classes] logits"""
+        probabilities = self.probabilities(logits)
+        return probabilities.topk(min(max(1, k), probabilities.shape[1]), dim=1)
+
+    def decode(self, indices: torch.Tensor) -> np.ndarray:
+        """Class indices (any shape) -> array of category names of the same shape"""
+        indices = indices.numpy()
+        in_range = (indices >= 0) & (indices < self.unknown_index)
+        return self._names[np.where(in_range, indices, self.unknown_index)]
+
+    def decode_top1(self, top_probabilities: torch.Tensor, top_indices: torch.Tensor) -> np.ndarray:
+        """[N] predicted categories from top_k() output, with rejected predictions as UNKNOWN"""
+        indices = top_indices[:, 0]
+        if self.rejection_threshold > 0:
+            rejected = top_probabilities[:, 0] < self.rejection_threshold
+            indices = indices.masked_fill(rejected, self.unknown_index)
+        return self.decode(indices)
@@ -0,0 +1,179 @@
+# file: app/ml_models/optimization.py
+# CPU serving variants of Net: BatchNorm folding, int8 quantization, TorchScript and torch.compile
+#
+# Export a TorchScript artifact (served by setting MODEL_ARTIFACT_PATH) and print its parity report:
+#   python -m app.ml_models.optimization --variant static_int8 --output app/ml_models/model_static_int8.pt
+
+import copy
+import glob
+import os
+import time
+from typing import List, Optional
+
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+from .preprocessing import load_waveform
+
+
+VARIANTS = ('eager', 'fused', 'dynamic_int8', 'static_int8', 'torchscript', 'compiled')
+
+NUM_CONV_BLOCKS = 8  # conv1/bn1 ... conv8/bn8
+
+
+############### TRANSFORMS ###############
+def explicit_padding(conv: nn.Conv2d) -> nn.Module:
+    """padding='same' with an even kernel pads asymmetrically, which neither quantized convs nor
+    the TorchScript inference passes accept. Rewrites it as ZeroPad2d + an unpadded conv."""
+    if conv.padding != 'same':
+        return conv
+    pads = []
+    for kernel, dilation in zip(reversed(conv.kernel_size), reversed(conv.dilation)):
+        total = dilation * (kernel - 1)
+        pads += [total // 2, total - total // 2]
+    unpadded = nn.Conv2d(
+        conv.in_channels, conv.out_channels, conv.kernel_size, conv.stride,
+        padding=0, dilation=conv.dilation, groups=conv.groups, bias=conv.bias is not None,
+    )
+    unpadded.load_state_dict(conv.state_dict())
+    return nn.Sequential(nn.ZeroPad2d(tuple(pads)), unpadded)
+
+
+def fold_batchnorm(model: nn.Module) -> nn.Module:
+    """Returns an eval-mode copy of Net with each bnN folded into convN and replaced by Identity"""
+    fused = copy.deepcopy(model).eval()
+    for i in range(1, NUM_CONV_BLOCKS + 1):
+        conv = fuse_conv_bn_eval(getattr(fused, f'conv{i}'), getattr(fused, f'bn{i}'))
+        setattr(fused, f'conv{i}', explicit_padding(conv))
+        setattr(fused, f'bn{i}', nn.Identity())
+    return fused
+
+
+def _quantized_engine() -> str:
+    engine = 'x86' if 'x86' in torch.backends.quantized.supported_engines else 'qnnpack'
+    torch.backends.quantized.engine = engine
+    return engine
+
+
+def quantize_dynamic_int8(model: nn.Module) -> nn.Module:
+    """Dynamic int8 of the dense layer. PyTorch has no dynamic kernels for convs, so they stay
+    float (folded); use static_int8 to quantize them."""
+    _quantized_engine()
+    return torch.ao.quantization.quantize_dynamic(fold_batchnorm(model), {nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_static_int8(model: nn.Module, calibration: torch.Tensor) -> nn.Module:
+    """Static (post-training) int8 of the convs, their ReLUs and the dense layer, via FX graph mode.
+    Only those ops are quantized: the raw waveform input, pooling and reshapes stay float, since
+    quantizing the input to 8 bits loses too much of quiet recordings.
+    `calibration` is a [N, 80000] batch of representative clips."""
+    from torch.ao.quantization import QConfigMapping, get_default_qconfig
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    qconfig = get_default_qconfig(_quantized_engine())
+    qconfig_mapping = (
+        QConfigMapping()
+        .set_object_type(nn.Conv2d, qconfig)
+        .set_object_type(nn.Linear, qconfig)
+        .set_object_type(nn.functional.relu, qconfig)
+    )
+
+    graph_module = torch.fx.symbolic_trace(fold_batchnorm(model))
+    for node in graph_module.graph.nodes:
+        # quantized activations are not always contiguous, which view() rejects
+        if node.op == 'call_method' and node.target == 'view':
+            node.target = 'reshape'
+    graph_module.recompile()
+
+    prepared = prepare_fx(graph_module, qconfig_mapping, example_inputs=(calibration[:1],))
+    with torch.inference_mode():
+        prepared(calibration)
+    return convert_fx(prepared).eval()
+
+
+def to_torchscript(model: nn.Module) -> torch.jit.ScriptModule:
+    """Scripted and frozen; this is the form saved by the export CLI"""
+    return torch.jit.freeze(torch.jit.script(model.eval()))
+
+
+def optimize_torchscript(module: torch.jit.ScriptModule) -> torch.jit.ScriptModule:
+    """Applied after loading: the optimized graph runs faster but cannot be saved again"""
+    return torch.jit.optimize_for_inference(module)
+
+
+def load_torchscript(path: str) -> torch.jit.ScriptModule:
+    return optimize_torchscript(torch.jit.load(path, map_location=torch.device('cpu')))
+
+
+def build_variant(model: nn.Module, variant: str, calibration: Optional[torch.Tensor] = None) -> nn.Module:
+    """Builds a serving variant from an eval-mode eager Net"""
+    if variant == 'eager':
+        return model
+    if variant == 'fused':
+        return fold_batchnorm(model)
+    if variant == 'dynamic_int8':
+        return quantize_dynamic_int8(model)
+    if variant == 'static_int8':
+        if calibration is None or len(calibration) == 0:
+            raise ValueError("static_int8 needs calibration clips")
+        return quantize_static_int8(model, calibration)
+    if variant == 'torchscript':
+        return optimize_torchscript(to_torchscript(fold_batchnorm(model)))
+    if variant == 'compiled':
+        return torch.compile(fold_batchnorm(model), dynamic=True)  # compiles on the first forward pass
+    raise ValueError(f"Unknown model variant '{variant}', expected one of {VARIANTS}")
+
+
+############### PARITY GATE ###############
+def load_parity_clips(directory: str) -> torch.Tensor:
+    """[N, 80000] batch of the audio files in `directory`; files that cannot be decoded are skipped"""
+    clips: List[torch.Tensor] = []
+    for path in sorted(glob.glob(os.path.join(directory, '*'))):
+        try:
+            with open(path, 'rb') as audio_file:
+                clips.append(load_waveform(audio_file.read()))
+        except Exception as e:
+            print(f"Parity clip {path} skipped: {e}")
+    return torch.cat(clips) if clips else torch.zeros(0, 80000)
+
+
+def check_parity(
+    reference: nn.Module, candidate: nn.Module, clips: torch.Tensor, max_drift: float
+) -> dict:
+    """Compares a variant with the eager model on `clips`: every clip must keep its top-1
+    category, and no class probability may move by more than `max_drift`"""
+    with torch.inference_mode():
+        expected = torch.softmax(reference(clips), dim=1)
+        started = time.perf_counter()
+        actual = torch.softmax(candidate(clips), dim=1)
+        elapsed = time.perf_counter() - started
+    agreement = (expected.argmax(dim=1) == actual.argmax(dim=1)).float().mean().item()
+    drift = (expected - actual).abs().max().item()
+    return {
+        'clips': len(clips),
+        'top1_agreement': agreement,
+        'max_probability_drift': drift,
+        'forward_seconds': elapsed,
+        'passed': len(clips) > 0 and agreement == 1.0 and drift <= max_drift,
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from .. import config
+    from .v1 import load_eager_model
+
+    parser = argparse.ArgumentParser(description="Export a TorchScript serving variant of Net")
+    parser.add_argument('--variant', choices=('fused', 'dynamic_int8', 'static_int8'), default='static_int8')
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--clips', default=config.MODEL_PARITY_CLIPS_DIR)
+    args = parser.parse_args()
+
+    eager = load_eager_model(config.MODEL_PATH)
+    clips = load_parity_clips(args.clips)
+    torch.jit.save(to_torchscript(build_variant(eager, args.variant, clips)), args.output)
+
+    report = check_parity(eager, load_torchscript(args.output), clips, config.MODEL_PARITY_MAX_DRIFT)
+    print(f"Saved {args.variant} to {args.output}: {report}")
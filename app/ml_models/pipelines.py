@@ -0,0 +1,66 @@
+# file: app/ml_models/pipelines.py
+# Multi-file prediction pipeline shared by /predict/batch and background jobs
+
+import asyncio
+from typing import BinaryIO, List, Optional, Tuple, Union
+
+import torch
+
+from .. import config
+from ..schemas import PredictionOutput
+from .executor import inference_executor
+from .preprocessing import decode_audio_prefix, prepare_waveforms
+
+
+async def _decode_or_error(audio_file: BinaryIO) -> Tuple[Optional[tuple], Optional[str]]:
+    try:
+        return await inference_executor.run(decode_audio_prefix, audio_file), None
+    except Exception as e:
+        return None, f"Could not decode audio: {e}"
+
+
+def _prepare_or_errors(clips: List[tuple]) -> List[Union[torch.Tensor, str]]:
+    """prepare_waveforms, except that a clip it cannot prepare gets an error message instead
+    of failing the others: after a failure the clips are retried one by one"""
+    try:
+        return prepare_waveforms(clips)
+    except Exception:
+        pass
+    prepared = []
+    for clip in clips:
+        try:
+            prepared.extend(prepare_waveforms([clip]))
+        except Exception as e:
+            prepared.append(f"Could not prepare audio: {e}")
+    return prepared
+
+
+async def predict_files(model, files: List[Tuple[str, BinaryIO]], top_k: int = 1) -> List[PredictionOutput]:
+    """Returns one PredictionOutput per (filename, file) in input order. Each file is decoded on
+    its own executor job, same-rate clips are resampled together and the model runs on chunks
+    of BATCH_MAX_SIZE clips. Files that fail to decode or resample get empty predictions and an error."""
+    decoded = await asyncio.gather(*(_decode_or_error(audio_file) for _, audio_file in files))
+    errors = [error for _, error in decoded]
+    decoded_ok = [i for i, (clip, _) in enumerate(decoded) if clip is not None]
+    prepared = await inference_executor.run(_prepare_or_errors, [decoded[i][0] for i in decoded_ok])
+    ok, waveforms = [], []
+    for i, waveform in zip(decoded_ok, prepared):
+        if isinstance(waveform, str):
+            errors[i] = waveform
+        else:
+            ok.append(i)
+            waveforms.append(waveform)
+
+    predictions = []
+    for start in range(0, len(waveforms), config.BATCH_MAX_SIZE):
+        batch = torch.cat(waveforms[start:start + config.BATCH_MAX_SIZE], dim=0)
+        output = await model.predict(batch, top_k)
+        predictions.extend(output[0].predictions)
+
+    outputs = [
+        PredictionOutput(filename=name, predictions=[], error=error, model_version=model.version)
+        for (name, _), error in zip(files, errors)
+    ]
+    for i, prediction in zip(ok, predictions):
+        outputs[i].predictions = [prediction]
+    return outputs
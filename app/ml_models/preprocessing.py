@@ -0,0 +1,305 @@
+# file: app/ml_models/preprocessing.py
+# Audio decoding and shaping for the v1 model. Blocking: call through the inference executor.
+
+import io
+import math
+import threading
+from collections import OrderedDict
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import torch
+import torchaudio
+
+from .. import config
+from .constants import SAMPLE_RATE, TARGET_LENGTH
+
+
+class ResamplerBank:
+    """Bounded LRU cache of `torchaudio.transforms.Resample` modules keyed by (source rate, dtype).
+    Building a Resample computes its sinc kernel, so each one is built once and reused;
+    applying a cached module is stateless and safe from several executor threads."""
+
+    def __init__(self, target_rate: int = SAMPLE_RATE, max_size: int = 8):
+        self.target_rate = target_rate
+        self.max_size = max(1, max_size)
+        self._resamplers: 'OrderedDict[Tuple[int, torch.dtype], torchaudio.transforms.Resample]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._resamplers)
+
+    def get(self, orig_freq: int, dtype: torch.dtype = torch.float32) -> torchaudio.transforms.Resample:
+        key = (orig_freq, dtype)
+        with self._lock:
+            resampler = self._resamplers.get(key)
+            if resampler is not None:
+                self._resamplers.move_to_end(key)
+                return resampler
+
+        resampler = torchaudio.transforms.Resample(orig_freq, self.target_rate, dtype=dtype)
+        with self._lock:
+            resampler = self._resamplers.setdefault(key, resampler)
+            self._resamplers.move_to_end(key)
+            while len(self._resamplers) > self.max_size:
+                self._resamplers.popitem(last=False)
+        return resampler
+
+    def prewarm(self, rates: Iterable[int], dtype: torch.dtype = torch.float32) -> None:
+        for rate in rates:
+            if rate != self.target_rate:
+                self.get(rate, dtype)
+
+    def resample(self, waveform: torch.Tensor, orig_freq: int) -> torch.Tensor:
+        if orig_freq == self.target_rate:
+            return waveform
+        if waveform.shape[-1] == 0:  # Resample cannot reshape an empty clip
+            return waveform
+        return self.get(orig_freq, waveform.dtype)(waveform)
+
+    def resample_batch(self, waveforms: List[torch.Tensor], orig_freq: int) -> List[torch.Tensor]:
+        """Resamples same-rate mono [1, time] clips in one call. Shorter clips are zero-padded
+        to the longest one for the call, then cropped back to their own resampled length."""
+        if orig_freq == self.target_rate:
+            return list(waveforms)
+        if len(waveforms) == 1:
+            return [self.resample(waveforms[0], orig_freq)]
+
+        lengths = [waveform.shape[-1] for waveform in waveforms]
+        batch = torch.cat([fit_length(waveform, max(lengths)) for waveform in waveforms], dim=0)
+        resampled = self.resample(batch, orig_freq)
+        return [
+            resampled[i:i + 1, :math.ceil(length * self.target_rate / orig_freq)]
+            for i, length in enumerate(lengths)
+        ]
+
+
+resampler_bank = ResamplerBank(SAMPLE_RATE, config.RESAMPLER_CACHE_SIZE)
+
+
+def fit_length(waveform: torch.Tensor, target_length: int = TARGET_LENGTH) -> torch.Tensor:
+    """Pads or trims the last dimension to `target_length` samples"""
+    if waveform.shape[-1] < target_length:
+        waveform = torch.nn.functional.pad(waveform, (0, target_length - waveform.shape[-1]))
+    elif waveform.shape[-1] > target_length:
+        waveform = waveform[..., :target_length]
+    return waveform
+
+
+def downmix_to_mono(waveform: torch.Tensor) -> torch.Tensor:
+    """Averages a [channels, time] waveform down to [1, time]"""
+    if waveform.shape[0] == 1:
+        return waveform
+    return waveform.mean(dim=0, keepdim=True)
+
+
+def decode_audio(audio_file: bytes) -> Tuple[torch.Tensor, int]:
+    """Decodes an uploaded audio file into a mono [1, time] tensor at its own sample rate"""
+    waveform, sample_rate = torchaudio.load(io.BytesIO(audio_file))
+    return downmix_to_mono(waveform), sample_rate
+
+
+def prepare_waveforms(decoded: List[Tuple[torch.Tensor, int]]) -> List[torch.Tensor]:
+    """Resamples and pads/trims decoded clips to [1, TARGET_LENGTH] each, resampling every
+    group of same-rate clips with one call. Output order matches the input."""
+    by_rate: Dict[int, List[int]] = {}
+    for i, (_, sample_rate) in enumerate(decoded):
+        by_rate.setdefault(sample_rate, []).append(i)
+
+    prepared: List[torch.Tensor] = [None] * len(decoded)
+    for sample_rate, indices in by_rate.items():
+        # trim before resampling: only the first TARGET_LENGTH output samples are kept
+        source_length = math.ceil(TARGET_LENGTH * sample_rate / SAMPLE_RATE)
+        clips = [decoded[i][0][..., :source_length] for i in indices]
+        for i, waveform in zip(indices, resampler_bank.resample_batch(clips, sample_rate)):
+            prepared[i] = fit_length(waveform)
+    return prepared
+
+
+def load_waveform(audio_file: bytes) -> torch.Tensor:
+    """Decodes an uploaded audio file into a mono [1, TARGET_LENGTH] tensor at SAMPLE_RATE"""
+    return prepare_waveforms([decode_audio(audio_file)])[0]
+
+
+############### STREAMED DECODING ###############
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class WavFormatError(ValueError):
+    pass
+
+
+def pcm_to_float(frames: bytes, sample_width: int, num_channels: int, is_float: bool = False) -> torch.Tensor:
+    """Converts interleaved little-endian PCM bytes to a float32 [channels, time] tensor in [-1, 1]"""
+    # the scales are float32 scalars: NumPy 1.x would promote a float32 array divided by a
+    # Python int that does not fit int16 (2 ** 23, 2 ** 31) to float64
+    if is_float:
+        samples = np.frombuffer(frames, dtype='<f4' if sample_width == 4 else '<f8').astype(np.float32)
+    elif sample_width == 1:  # 8-bit WAV is unsigned
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - np.float32(128)) / np.float32(128)
+    elif sample_width == 2:
+        samples = np.frombuffer(frames, dtype='<i2').astype(np.float32) / np.float32(32768)
+    elif sample_width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        packed = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        samples = ((packed ^ 0x800000) - 0x800000).astype(np.float32) / np.float32(8388608)
+    elif sample_width == 4:
+        samples = np.frombuffer(frames, dtype='<i4').astype(np.float32) / np.float32(2147483648)
+    else:
+        raise WavFormatError(f"Unsupported PCM sample width: {sample_width} bytes")
+    return torch.from_numpy(samples.reshape(-1, num_channels).T.copy())
+
+
+class WavStreamDecoder:
+    """Incremental RIFF/WAVE parser: feed raw bytes as they arrive and get mono float32 [1, n]
+    chunks back. Handles integer PCM (8/16/24/32-bit), IEEE float and WAVE_FORMAT_EXTENSIBLE;
+    raises WavFormatError for anything else so callers can fall back to a full decode."""
+
+    def __init__(self):
+        self._pending = bytearray()
+        self._state = 'riff'
+        self._chunk_size = 0
+        self._data_remaining: Optional[int] = None  # None: stream until EOF
+        self.sample_rate: Optional[int] = None
+        self.num_channels = 0
+        self.sample_width = 0
+        self.is_float = False
+
+    @property
+    def in_data(self) -> bool:
+        return self._state in ('data', 'done')
+
+    @property
+    def finished(self) -> bool:
+        return self._state == 'done'
+
+    def feed(self, data: bytes) -> List[torch.Tensor]:
+        self._pending += data
+        chunks: List[torch.Tensor] = []
+        while self._step(chunks):
+            pass
+        return chunks
+
+    def _step(self, chunks: List[torch.Tensor]) -> bool:
+        """Consumes one header or chunk from the pending bytes; False when more bytes are needed"""
+        pending = self._pending
+        if self._state == 'riff':
+            if len(pending) < 12:
+                return False
+            if pending[:4] != b'RIFF' or pending[8:12] != b'WAVE':
+                raise WavFormatError("Not a RIFF/WAVE stream")
+            del pending[:12]
+            self._state = 'chunk'
+        elif self._state == 'chunk':
+            if len(pending) < 8:
+                return False
+            chunk_id, size = bytes(pending[:4]), int.from_bytes(pending[4:8], 'little')
+            del pending[:8]
+            if chunk_id == b'fmt ':
+                self._state, self._chunk_size = 'fmt', size + (size & 1)
+            elif chunk_id == b'data':
+                if self.sample_rate is None:
+                    raise WavFormatError("WAV data chunk before fmt chunk")
+                # 0 and 0xFFFFFFFF are written by encoders that stream without knowing the length
+                self._data_remaining = None if size in (0, 0xFFFFFFFF) else size
+                self._state = 'data'
+            else:
+                self._state, self._chunk_size = 'skip', size + (size & 1)
+        elif self._state == 'fmt':
+            if len(pending) < self._chunk_size:
+                return False
+            self._parse_fmt(bytes(pending[:self._chunk_size]))
+            del pending[:self._chunk_size]
+            self._state = 'chunk'
+        elif self._state == 'skip':
+            n = min(self._chunk_size, len(pending))
+            del pending[:n]
+            self._chunk_size -= n
+            if self._chunk_size:
+                return False
+            self._state = 'chunk'
+        elif self._state == 'data':
+            block_align = self.sample_width * self.num_channels
+            usable = len(pending) - len(pending) % block_align
+            if self._data_remaining is not None:
+                usable = min(usable, self._data_remaining - self._data_remaining % block_align)
+            if usable:
+                chunks.append(downmix_to_mono(
+                    pcm_to_float(bytes(pending[:usable]), self.sample_width, self.num_channels, self.is_float)
+                ))
+                del pending[:usable]
+            if self._data_remaining is not None:
+                self._data_remaining -= usable
+                if self._data_remaining < block_align:
+                    self._state = 'done'
+                    pending.clear()
+            return False
+        else:  # done
+            pending.clear()
+            return False
+        return True
+
+    def _parse_fmt(self, fmt: bytes) -> None:
+        if len(fmt) < 16:
+            raise WavFormatError("Truncated WAV fmt chunk")
+        format_tag = int.from_bytes(fmt[0:2], 'little')
+        if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+            format_tag = int.from_bytes(fmt[24:26], 'little')  # first two bytes of the sub-format GUID
+        if format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+            raise WavFormatError(f"Unsupported WAV format tag: {format_tag:#06x}")
+
+        self.num_channels = int.from_bytes(fmt[2:4], 'little')
+        self.sample_rate = int.from_bytes(fmt[4:8], 'little')
+        self.sample_width = int.from_bytes(fmt[14:16], 'little') // 8
+        self.is_float = format_tag == WAVE_FORMAT_IEEE_FLOAT
+        if self.num_channels < 1 or self.sample_rate < 1 or self.sample_width not in (1, 2, 3, 4, 8):
+            raise WavFormatError("Invalid WAV fmt chunk")
+        if self.is_float and self.sample_width not in (4, 8) or not self.is_float and self.sample_width == 8:
+            raise WavFormatError("Invalid WAV sample width for its format")
+
+
+def _iter_wav_chunks(
+    audio_file: BinaryIO, decoder: WavStreamDecoder, first_chunks: List[torch.Tensor], chunk_bytes: int
+) -> Iterator[torch.Tensor]:
+    yield from first_chunks
+    while not decoder.finished:
+        data = audio_file.read(chunk_bytes)
+        if not data:
+            return
+        yield from decoder.feed(data)
+
+
+def open_audio_stream(audio_file: BinaryIO, chunk_bytes: int = 256 * 1024) -> Tuple[int, Iterator[torch.Tensor]]:
+    """Returns (sample_rate, iterator of mono [1, n] chunks at that rate).
+    WAV is decoded `chunk_bytes` at a time; other formats are decoded in full by torchaudio."""
+    decoder = WavStreamDecoder()
+    first_chunks: List[torch.Tensor] = []
+    try:
+        while not decoder.in_data:
+            data = audio_file.read(chunk_bytes)
+            if not data:
+                raise WavFormatError("No WAV data chunk found")
+            first_chunks += decoder.feed(data)
+    except WavFormatError:
+        audio_file.seek(0)
+        waveform, sample_rate = torchaudio.load(audio_file)
+        return sample_rate, iter(downmix_to_mono(waveform).split(TARGET_LENGTH, dim=-1))
+    return decoder.sample_rate, _iter_wav_chunks(audio_file, decoder, first_chunks, chunk_bytes)
+
+
+def decode_audio_prefix(audio_file: BinaryIO, chunk_bytes: int = 64 * 1024) -> Tuple[torch.Tensor, int]:
+    """Decodes only the first 5 s of a file object into a mono [1, time] tensor at its own rate.
+    WAV reading stops once enough frames are decoded; other formats are decoded in full."""
+    sample_rate, chunks = open_audio_stream(audio_file, chunk_bytes)
+    needed = math.ceil(TARGET_LENGTH * sample_rate / SAMPLE_RATE)
+    collected, total = [], 0
+    for chunk in chunks:
+        collected.append(chunk[:, :needed - total])
+        total += collected[-1].shape[-1]
+        if total >= needed:
+            break
+    if not collected:
+        return torch.zeros(1, 0), sample_rate
+    return torch.cat(collected, dim=-1), sample_rate
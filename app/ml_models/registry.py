@@ -0,0 +1,170 @@
+# file: app/ml_models/registry.py
+# One shared, loaded PlaceholderMLModelV1 per model version, with background loads and atomic swaps
+
+import asyncio
+import importlib
+import os
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from .. import config
+from ..metrics import registry
+from .executor import inference_executor
+
+if TYPE_CHECKING:
+    from .v1 import PlaceholderMLModelV1
+
+
+model_load_histogram = registry.histogram(
+    'model_load_seconds', 'Time to load a checkpoint and build its serving backend, parity gate and warm-up included',
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+)
+
+
+# Every module that imports torch. app.main and the routes import none of them, so torch (~2 s)
+# is imported by the first model load, on the inference executor, rather than with the app.
+SERVING_MODULES = ('v1', 'preprocessing', 'pipelines', 'ingestion', 'streaming', 'windowing')
+
+
+def import_serving_modules() -> None:
+    """Blocking: call through the inference executor"""
+    for name in SERVING_MODULES:
+        importlib.import_module(f'{__package__}.{name}')
+
+
+class ModelEntry:
+    def __init__(self, version: str, path: str):
+        self.version = version
+        self.path = path
+        self.model: Optional['PlaceholderMLModelV1'] = None  # set once torch and the model code are imported
+        self.status = 'loading'  # loading, ready or failed
+        self.loaded_at: Optional[datetime] = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+
+class ModelRegistry:
+    """Every route, batch and job gets its model from here, so each version's weights are in
+    memory once. A new checkpoint loads in the background while the active version keeps
+    serving; activate() then swaps a single reference. Requests already holding the previous
+    model finish on it, and it is freed once they are done and it has been unloaded."""
+
+    def __init__(self, model_dir: str):
+        self.model_dir = os.path.realpath(model_dir)
+        self._entries: Dict[str, ModelEntry] = {}
+        self._active_version: Optional[str] = None
+
+    @property
+    def active_version(self) -> Optional[str]:
+        return self._active_version
+
+    def active(self) -> 'PlaceholderMLModelV1':
+        if self._active_version is None:
+            raise LookupError("No model version is active")
+        return self._entries[self._active_version].model
+
+    def get(self, version: str) -> Optional['PlaceholderMLModelV1']:
+        entry = self._entries.get(version)
+        return entry.model if entry is not None and entry.status == 'ready' else None
+
+    def resolve_path(self, path: str) -> str:
+        """Checkpoints must live under MODEL_DIR: the admin API never loads arbitrary files"""
+        resolved = os.path.realpath(path if os.path.isabs(path) else os.path.join(self.model_dir, path))
+        if os.path.commonpath([resolved, self.model_dir]) != self.model_dir:
+            raise ValueError(f"Checkpoint must be inside {self.model_dir}")
+        if not os.path.isfile(resolved):
+            raise ValueError(f"Checkpoint {path} not found")
+        return resolved
+
+    async def load(self, version: str, path: str, activate: bool = False) -> ModelEntry:
+        """Loads `path` as `version` and waits for it; activates it afterwards if asked"""
+        entry = self.start_load(version, path, activate)
+        await asyncio.gather(entry.task, return_exceptions=True)
+        if entry.status == 'failed':
+            raise RuntimeError(f"Model {version} failed to load: {entry.error}")
+        return entry
+
+    def start_load(self, version: str, path: str, activate: bool = False) -> ModelEntry:
+        """Starts loading `path` as `version` in the background and returns immediately"""
+        current = self._entries.get(version)
+        if current is not None and current.status == 'loading':
+            raise ValueError(f"Model {version} is already loading")
+        if version == self._active_version:
+            raise ValueError(f"Model {version} is active; load the checkpoint under a new version")
+
+        entry = ModelEntry(version, path)
+        self._entries[version] = entry
+        entry.task = asyncio.create_task(self._load(entry, activate))
+        return entry
+
+    async def _load(self, entry: ModelEntry, activate: bool) -> None:
+        started = time.perf_counter()
+        try:
+            await inference_executor.run(import_serving_modules)
+            from .v1 import PlaceholderMLModelV1
+            entry.model = PlaceholderMLModelV1(version=entry.version, path=entry.path)
+            await entry.model.load_model()
+            model_load_histogram.observe(time.perf_counter() - started)
+        except Exception as e:
+            entry.status, entry.error = 'failed', str(e)
+            print(f"Model {entry.version} failed to load: {e}")
+            return
+        entry.status, entry.loaded_at = 'ready', datetime.now()
+        print(f"Model {entry.model.version} loaded from {entry.model.path} ({entry.model.backend.name}/{entry.model.variant})")
+        if activate:
+            self.activate(entry.model.version)
+
+    def activate(self, version: str) -> None:
+        entry = self._entries.get(version)
+        if entry is None or entry.status != 'ready':
+            raise ValueError(f"Model {version} is not loaded")
+        self._active_version = version  # one reference swap: new requests see it, in-flight ones keep theirs
+
+    def unload(self, version: str) -> None:
+        if version == self._active_version:
+            raise ValueError(f"Model {version} is active")
+        entry = self._entries.pop(version, None)
+        if entry is None:
+            raise KeyError(version)
+        if entry.task is not None and not entry.task.done():
+            entry.task.cancel()
+
+    def reconcile(self, desired: Dict[str, tuple]) -> None:
+        """Brings this process to `desired` (version -> (path, active)), as recorded by another
+        process: loads missing versions, activates the active one once it is ready and unloads
+        versions no longer listed. Failed loads are not retried."""
+        for version, (path, active) in desired.items():
+            entry = self._entries.get(version)
+            if entry is None:
+                self.start_load(version, path, activate=active)
+            elif active and entry.status == 'ready' and version != self._active_version:
+                self.activate(version)
+        for version in list(self._entries):
+            if version not in desired and version != self._active_version:
+                self.unload(version)
+
+    def describe(self) -> List[dict]:
+        return [
+            {
+                'version': version,
+                'path': entry.path,
+                'status': entry.status,
+                'active': version == self._active_version,
+                'backend': entry.model.backend.name if entry.status == 'ready' else None,
+                'variant': entry.model.variant if entry.status == 'ready' else None,
+                'loaded_at': entry.loaded_at,
+                'error': entry.error,
+                'parity': entry.model.parity if entry.status == 'ready' else None,
+                'fallback_reason': entry.model.fallback_reason if entry.status == 'ready' else None,
+            }
+            for version, entry in self._entries.items()
+        ]
+
+    async def close(self) -> None:
+        for entry in self._entries.values():
+            if entry.task is not None and not entry.task.done():
+                entry.task.cancel()
+
+
+model_registry = ModelRegistry(config.MODEL_DIR)
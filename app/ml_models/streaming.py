@@ -0,0 +1,86 @@
+# file: app/ml_models/streaming.py
+# Live audio streams: raw PCM chunks in, one 5 s window out every hop
+
+from typing import List, Tuple
+
+import torch
+
+from .preprocessing import SAMPLE_RATE, TARGET_LENGTH, downmix_to_mono, pcm_to_float
+
+
+# encoding -> (bytes per sample, is float)
+PCM_ENCODINGS = {'s16le': (2, False), 's32le': (4, False), 'f32le': (4, True)}
+
+
+class PcmDecoder:
+    """Interleaved little-endian PCM -> mono float32 samples. A chunk may end mid-frame: the
+    leftover bytes are kept and prefixed to the next chunk."""
+
+    def __init__(self, encoding: str, channels: int):
+        if encoding not in PCM_ENCODINGS:
+            raise ValueError(f"Unsupported encoding '{encoding}', expected one of {tuple(PCM_ENCODINGS)}")
+        self.sample_width, self.is_float = PCM_ENCODINGS[encoding]
+        self.channels = channels
+        self.frame_bytes = self.sample_width * channels
+        self._remainder = b''
+
+    def feed(self, data: bytes) -> torch.Tensor:
+        data = self._remainder + data
+        usable = len(data) - len(data) % self.frame_bytes
+        self._remainder = data[usable:]
+        if usable == 0:
+            return torch.zeros(0)
+        frames = pcm_to_float(data[:usable], self.sample_width, self.channels, self.is_float)
+        return downmix_to_mono(frames)[0]
+
+
+class RingBuffer:
+    """The last `size` samples of a stream in a preallocated buffer"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.buffer = torch.zeros(size)
+        self.position = 0  # next write index
+        self.total = 0  # samples written since the stream started
+
+    def write(self, samples: torch.Tensor) -> None:
+        n = samples.shape[0]
+        self.total += n
+        if n >= self.size:
+            self.buffer.copy_(samples[-self.size:])
+            self.position = 0
+            return
+        first = min(n, self.size - self.position)
+        self.buffer[self.position:self.position + first] = samples[:first]
+        self.buffer[:n - first] = samples[first:]
+        self.position = (self.position + n) % self.size
+
+    def window(self) -> torch.Tensor:
+        """A [1, size] copy of the buffer, oldest sample first"""
+        return torch.cat([self.buffer[self.position:], self.buffer[:self.position]]).unsqueeze(0)
+
+
+class StreamWindower:
+    """Emits the latest 5 s window every `hop_seconds` once the first 5 s have arrived.
+    Windows are at the stream's own sample rate: TARGET_LENGTH samples for 16 kHz streams."""
+
+    def __init__(self, sample_rate: int, hop_seconds: float):
+        self.sample_rate = sample_rate
+        self.window = round(TARGET_LENGTH / SAMPLE_RATE * sample_rate)
+        self.hop = max(1, round(hop_seconds * sample_rate))
+        self.ring = RingBuffer(self.window)
+        self._next_emit = self.window
+
+    def feed(self, samples: torch.Tensor) -> List[Tuple[float, float, torch.Tensor]]:
+        """Writes `samples` and returns the (start, end) seconds and [1, window] clip of every
+        window completed by them, in order. A long chunk can complete several hops."""
+        windows = []
+        while samples.shape[0] > 0:
+            take = min(samples.shape[0], self._next_emit - self.ring.total)
+            self.ring.write(samples[:take])
+            samples = samples[take:]
+            if self.ring.total == self._next_emit:
+                end = self.ring.total / self.sample_rate
+                windows.append((end - self.window / self.sample_rate, end, self.ring.window()))
+                self._next_emit += self.hop
+        return windows
@@ -1,21 +1,30 @@
 # File: ml_models/v1.py
 # Machine Learning Models
 
-from ..schemas import PredictionInput, PredictionOutput, Prediction
+from .. import config
+from ..metrics import registry
+from ..schemas import PredictionOutput, Prediction, CategoryScore
+from .executor import inference_executor
+from .backends import OnnxRuntimeBackend, TorchBackend
+from .labels import CATEGORIES, LabelSpace
+from .preprocessing import TARGET_LENGTH
 import os
-import io
+import time
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-import torchaudio  
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 
-        
-# A dictionary to decode the categories into targets
-decoder = {50: 'unknown', 51: 'unknown51', 0: 'dog', 14: 'chirping_birds', 36: 'vacuum_cleaner', 19: 'thunderstorm', 30: 'door_wood_knock',34: 'can_opening', 9: 'crow', 22: 'clapping', 48: 'fireworks', 41: 'chainsaw', 47: 'airplane', 31: 'mouse_click', 17: 'pouring_water', 45: 'train', 8: 'sheep', 15: 'water_drops', 46: 'church_bells', 37: 'clock_alarm', 32: 'keyboard_typing', 16: 'wind', 25: 'footsteps', 4: 'frog', 3: 'cow', 27: 'brushing_teeth', 43: 'car_horn', 12: 'crackling_fire', 40: 'helicopter', 29: 'drinking_sipping', 10: 'rain', 7: 'insects', 26: 'laughing', 6: 'hen', 44: 'engine', 23: 'breathing', 20: 'crying_baby', 49: 'hand_saw', 24: 'coughing', 39: 'glass_breaking', 28: 'snoring', 18: 'toilet_flush', 2: 'pig', 35: 'washing_machine', 38: 'clock_tick', 21: 'sneezing', 1: 'rooster', 11: 'sea_waves', 42: 'siren', 5: 'cat', 33: 'door_wood_creaks', 13: 'crickets'}
 
-# A dictionary to encode the categories into targets
-encoder = {'unknown51': 51, 'unknown': 51, 'dog': 0, 'chirping_birds': 14, 'vacuum_cleaner': 36, 'thunderstorm': 19, 'door_wood_knock': 30, 'can_opening': 34, 'crow': 9, 'clapping': 22, 'fireworks': 48, 'chainsaw': 41, 'airplane': 47, 'mouse_click': 31, 'pouring_water': 17, 'train': 45, 'sheep': 8, 'water_drops': 15, 'church_bells': 46, 'clock_alarm': 37, 'keyboard_typing': 32, 'wind': 16, 'footsteps': 25, 'frog': 4, 'cow': 3, 'brushing_teeth': 27, 'car_horn': 43, 'crackling_fire': 12, 'helicopter': 40, 'drinking_sipping': 29, 'rain': 10, 'insects': 7, 'laughing': 26, 'hen': 6, 'engine': 44, 'breathing': 23, 'crying_baby': 20, 'hand_saw': 49, 'coughing': 24, 'glass_breaking': 39, 'snoring': 28, 'toilet_flush': 18, 'pig': 2, 'washing_machine': 35, 'clock_tick': 38, 'sneezing': 21, 'rooster': 1, 'sea_waves': 11, 'siren': 42, 'cat': 5, 'door_wood_creaks': 33, 'crickets': 13}
+
+model_fallbacks_total = registry.counter(
+    'model_variant_fallbacks_total', 'Model loads that served eager instead of the configured backend / variant',
+    labelnames=('reason',),
+)
+
+# Index <-> category dictionaries, derived from the label space so they always agree
+decoder = dict(enumerate(CATEGORIES))
+encoder = {category: index for index, category in decoder.items()}
 
 
 class Net(nn.Module):
@@ -83,89 +92,172 @@ class Net(nn.Module):
 
 
 
+# Checkpoints loaded before the server forks its worker processes (see app/serve.py), keyed by
+# (real path, mtime, size). Workers reuse these modules, so their weights stay shared copy-on-write.
+_preloaded_models: Dict[Tuple[str, int, int], Net] = {}
+
+
+def _checkpoint_key(path: str) -> Tuple[str, int, int]:
+    stat = os.stat(path)
+    return os.path.realpath(path), stat.st_mtime_ns, stat.st_size
+
+
+def preload_eager_model(path: str) -> Net:
+    model = load_eager_model(path)
+    _preloaded_models[_checkpoint_key(path)] = model
+    return model
+
+
+def load_eager_model(path: str) -> Net:
+    """With MODEL_MMAP the tensors are assigned straight from the memory-mapped checkpoint,
+    so they are never copied to the heap (the freshly initialized ones are dropped; building
+    Net on the meta device instead costs ~0.5 s of one-off imports at cold start). The returned
+    module must be treated as read-only: it may be the preloaded one shared by every worker."""
+    preloaded = _preloaded_models.get(_checkpoint_key(path))
+    if preloaded is not None:
+        return preloaded
+
+    model = Net()  # Create a new instance of the Net class
+    state_dict = torch.load(path, map_location=torch.device('cpu'), weights_only=True, mmap=config.MODEL_MMAP)
+    model.load_state_dict(state_dict, assign=config.MODEL_MMAP)
+    model.eval()  # Set the model to evaluation mode
+    return model
+
+
 class PlaceholderMLModelV1: # SoundClassificationModel
-    def __init__(self):
+    def __init__(self, version: str = config.MODEL_VERSION, path: str = config.MODEL_PATH):
         self.loaded = False
-        self.model = Net()
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self.backend = TorchBackend(Net())
+        self.labels = LabelSpace(CATEGORIES, config.MODEL_TEMPERATURE, config.MODEL_REJECTION_THRESHOLD)
+        self.version = version
+        self.path = path
+        self.parity: Optional[dict] = None  # the gate's report, once a non-eager backend was checked
+        self.fallback_reason: Optional[str] = None  # why the configured backend is not served
 
-    async def load_model(self):
-        self.model = Net()  # Create a new instance of the Net class
-        state_dict = torch.load('app/ml_models/trained_model.pth', map_location=torch.device('cpu'))
-        self.model.load_state_dict(state_dict)
-        self.model.eval()  # Set the model to evaluation mode
+    @property
+    def variant(self) -> str:
+        return self.backend.variant
+
+    def _load_model_sync(self):
+        started = time.perf_counter()
+        eager = load_eager_model(self.path)
+        self.backend = self._build_gated_backend(eager)
+        self.load_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        self.warm_up(config.MODEL_WARMUP_BATCH_SIZES)
+        self.warmup_seconds = time.perf_counter() - started
         self.loaded = True
 
-    async def predict(self, waveform) -> List[PredictionOutput]:
-        print("Entering model.predict")  # Initial entry into the method
-        
-        if not self.loaded:
-            print("Model not loaded, loading now...")
-            await self.load_model()
-            print("Model successfully loaded")
-        
-        print("Model is ready for making predictions")
-        print(f"Waveform shape: {waveform.shape}")
-        
-        print("Making prediction")
-        prediction = self.model(waveform)
-        print(f"Raw prediction output: {prediction}") 
-        
-        # Assuming the prediction tensor shape is [batch_size, num_classes] and we want the predicted class index for each item in the batch
-        predicted_indices = torch.argmax(prediction, dim=1)
-        print(f"Predicted indices: {predicted_indices}")
-        
-        prediction_outputs = []  # This will hold Prediction objects, not PredictionOutput objects
-        for idx in predicted_indices:
-            predicted_index = idx.item()
-            if predicted_index >= len(decoder):
-                print(f"Error: Predicted index {predicted_index} is out of bounds. Decoder size: {len(decoder)}")
-                predicted_category = "Unknown"
-                predicted_probability = 0.0
-            else:
-                predicted_category = decoder[predicted_index]
-                predicted_probability = torch.softmax(prediction, dim=1)[0][predicted_index].item()
-                print(f"Predicted category: {predicted_category}, Probability: {predicted_probability}")
-            
-            # Create a Prediction object for each prediction and add it to the list
-            prediction_outputs.append(Prediction(category=predicted_category, probability=predicted_probability))
+    def warm_up(self, batch_sizes: List[int]) -> None:
+        """Predicts on silence once per batch size, so the first requests do not pay for
+        first-call allocations and kernel selection"""
+        for batch_size in batch_sizes:
+            self.predict_sync(torch.zeros(batch_size, TARGET_LENGTH), top_k=2)
+
+    @property
+    def _uses_exported_artifacts(self) -> bool:
+        """ONNX_MODEL_PATH and MODEL_ARTIFACT_PATH are exported from MODEL_PATH; other checkpoints
+        loaded through the registry build their torch variant instead"""
+        return self.path == config.MODEL_PATH
 
-        # Wrap the list of Prediction objects into a PredictionOutput object
-        final_prediction_output = PredictionOutput(predictions=prediction_outputs)
+    def _build_candidate(self, eager: Net, clips: torch.Tensor):
+        from .optimization import build_variant, load_torchscript
 
-        # Return a list containing the single PredictionOutput object
-        return [final_prediction_output]
+        if config.MODEL_BACKEND == 'onnxruntime' and self._uses_exported_artifacts:
+            return OnnxRuntimeBackend(config.ONNX_MODEL_PATH, config.TORCH_NUM_THREADS)
+        if config.MODEL_ARTIFACT_PATH and self._uses_exported_artifacts:
+            return TorchBackend(load_torchscript(config.MODEL_ARTIFACT_PATH), 'artifact')
+        return TorchBackend(build_variant(eager, config.MODEL_VARIANT, clips), config.MODEL_VARIANT)
 
+    def _build_gated_backend(self, eager: Net):
+        """Builds the configured backend / variant and returns it only if it passes the parity
+        gate against the eager model; any failure falls back to serving the eager model"""
+        fallback = TorchBackend(eager)
+        exported = (config.MODEL_BACKEND == 'onnxruntime' or config.MODEL_ARTIFACT_PATH) and self._uses_exported_artifacts
+        if not exported and config.MODEL_VARIANT == 'eager':
+            return fallback
 
+        # only imported when a variant is configured: it pulls in torch's quantization and fx stacks
+        from .optimization import check_parity, load_parity_clips
 
+        clips = load_parity_clips(config.MODEL_PARITY_CLIPS_DIR)
+        if config.MODEL_PARITY_GATE and not len(clips):
+            return self._fall_back(fallback, 'parity_failed', f"No parity clips could be read from {config.MODEL_PARITY_CLIPS_DIR}")
+        try:
+            candidate = self._build_candidate(eager, clips)
+            if not config.MODEL_PARITY_GATE:
+                return candidate
+            self.parity = check_parity(eager, candidate, clips, config.MODEL_PARITY_MAX_DRIFT)
+        except Exception as e:
+            return self._fall_back(fallback, 'build_failed', f"Backend '{config.MODEL_BACKEND}' could not be built: {e}")
+        print(f"Model {self.version} {candidate.name}/{candidate.variant} parity: {self.parity}")
+        if not self.parity['passed']:
+            return self._fall_back(fallback, 'parity_failed', f"{candidate.name}/{candidate.variant} failed the parity gate")
+        return candidate
 
+    def _fall_back(self, fallback: TorchBackend, kind: str, reason: str) -> TorchBackend:
+        """Serving eager instead is reported in the logs, model_variant_fallbacks_total and GET /admin/models"""
+        self.fallback_reason = reason
+        model_fallbacks_total.labels(reason=kind).inc()
+        print(f"Model {self.version}: {reason}; serving eager")
+        return fallback
+
+    async def load_model(self):
+        await inference_executor.run(self._load_model_sync)
 
-''' FOR SINGLE PREDICTIONS
-    async def predict(self, input: PredictionInput) -> PredictionOutput:
+    async def predict(self, waveform, top_k: int = 1) -> List[PredictionOutput]:
         if not self.loaded:
             await self.load_model()
-        
-        # Create a file-like object from the uploaded file data
-        audio_data = io.BytesIO(input.audio_file)
-        
-        # Process the audio data and make a prediction
-        waveform, sample_rate = torchaudio.load(audio_data)
-        
-        # Resample the audio to match the expected sample rate (if necessary)
-        if sample_rate != 16000:  # Adjust the sample rate as per your model's requirements
-            waveform = torchaudio.transforms.Resample(sample_rate, 16000)(waveform)
-        
-        # Pad or trim the audio to match the expected length (if necessary)
-        target_length = 80000  # Adjust the target length as per your model's requirements
-        if waveform.shape[1] < target_length:
-            waveform = torch.nn.functional.pad(waveform, (0, target_length - waveform.shape[1]))
-        elif waveform.shape[1] > target_length:
-            waveform = waveform[:, :target_length]
-        
-        prediction = self.model(waveform)
-        
-        predicted_index = torch.argmax(prediction).item()
-        predicted_category = decoder[predicted_index]
-        predicted_probability = torch.softmax(prediction, dim=1)[0][predicted_index].item()
-        
-        return PredictionOutput(category=predicted_category, probability=predicted_probability)
-'''         
+
+        return await inference_executor.run(self.predict_sync, waveform, top_k)
+
+    def predict_sync(self, waveform, top_k: int = 1) -> List[PredictionOutput]:
+        """Blocking forward pass and decoding, run on the inference executor.
+        One softmax, one top-k and one label lookup over the whole [batch_size, num_classes] output."""
+        logits = self.backend(waveform)
+        with torch.inference_mode():
+            top_probabilities, top_indices = self.labels.top_k(logits, top_k)
+            categories = self.labels.decode_top1(top_probabilities, top_indices).tolist()
+            ranked = self.labels.decode(top_indices).tolist() if top_k > 1 else None
+        probabilities = top_probabilities.tolist()
+
+        prediction_outputs = []
+        for i, (category, probabilities_row) in enumerate(zip(categories, probabilities)):
+            scores = [
+                CategoryScore(category=name, probability=probability)
+                for name, probability in zip(ranked[i], probabilities_row)
+            ] if ranked is not None else None
+            prediction_outputs.append(Prediction(
+                category=category,
+                probability=probabilities_row[0],
+                top_k=scores,
+            ))
+
+        return [PredictionOutput(predictions=prediction_outputs, model_version=self.version)]
+
+    async def predict_many(
+        self, requests: List[Tuple[torch.Tensor, int]]
+    ) -> List[List[PredictionOutput]]:
+        """Runs several requests' (waveform, top_k) as one batch and splits the output per request"""
+        waveforms = [waveform for waveform, _ in requests]
+        top_k = max(k for _, k in requests)
+        batch_output = await self.predict(torch.cat(waveforms, dim=0), top_k)
+        predictions = batch_output[0].predictions
+
+        outputs, offset = [], 0
+        for waveform, k in requests:
+            n = waveform.shape[0]
+            outputs.append([PredictionOutput(model_version=self.version, predictions=[
+                _trim_top_k(prediction, k) for prediction in predictions[offset:offset + n]
+            ])])
+            offset += n
+        return outputs
+
+
+def _trim_top_k(prediction: Prediction, top_k: int) -> Prediction:
+    if prediction.top_k is None or len(prediction.top_k) == top_k:
+        return prediction
+    return prediction.model_copy(update={'top_k': prediction.top_k[:top_k] if top_k > 1 else None})
@@ -0,0 +1,106 @@
+# file: app/ml_models/windowing.py
+# Sliding-window classification of recordings longer than the model's 5 s input
+
+from typing import BinaryIO, Iterable, Iterator, List, Tuple
+
+import torch
+
+from ..schemas import SegmentPrediction
+from .constants import SAMPLE_RATE, TARGET_LENGTH, WINDOW_SECONDS
+from .executor import inference_executor
+from .preprocessing import fit_length, open_audio_stream, resampler_bank
+
+
+def iter_windows(
+    chunks: Iterable[torch.Tensor], window: int, hop: int
+) -> Iterator[Tuple[int, torch.Tensor]]:
+    """Yields (start_sample, [1, <=window] tensor) windows over a stream of mono [1, n] chunks.
+    Only about one window plus one chunk is held in memory. A trailing partial window is
+    emitted when the last full window leaves samples uncovered."""
+    buffer = torch.zeros(1, 0)
+    buffer_start = 0  # absolute position of buffer[0]
+    covered_until = 0  # absolute end of the last emitted window
+    total = 0
+
+    for chunk in chunks:
+        buffer = torch.cat([buffer, chunk], dim=-1)
+        total += chunk.shape[-1]
+        while buffer.shape[-1] >= window:
+            yield buffer_start, buffer[:, :window]
+            covered_until = buffer_start + window
+            buffer = buffer[:, hop:]
+            buffer_start += hop
+
+    if total > covered_until and buffer.shape[-1] > 0:
+        yield buffer_start, buffer
+
+
+def iter_window_batches(
+    sample_rate: int, chunks: Iterable[torch.Tensor], hop_seconds: float, batch_size: int
+) -> Iterator[Tuple[torch.Tensor, List[Tuple[float, float]]]]:
+    """Groups windows into model-ready [N, TARGET_LENGTH] batches at SAMPLE_RATE, together with
+    each window's (start, end) time in seconds"""
+    window = round(WINDOW_SECONDS * sample_rate)
+    hop = max(1, round(hop_seconds * sample_rate))
+
+    pending: List[Tuple[int, torch.Tensor]] = []
+
+    def flush():
+        resampled = resampler_bank.resample_batch([clip for _, clip in pending], sample_rate)
+        batch = torch.cat([fit_length(clip) for clip in resampled], dim=0)
+        spans = [(start / sample_rate, (start + clip.shape[-1]) / sample_rate) for start, clip in pending]
+        return batch, spans
+
+    for start, clip in iter_windows(chunks, window, hop):
+        pending.append((start, clip))
+        if len(pending) == batch_size:
+            yield flush()
+            pending = []
+    if pending:
+        yield flush()
+
+
+def merge_segments(segments: List[SegmentPrediction]) -> List[SegmentPrediction]:
+    """Merges consecutive segments with the same category; the merged probability is the mean"""
+    merged: List[SegmentPrediction] = []
+    counts: List[int] = []
+    for segment in segments:
+        if merged and merged[-1].category == segment.category:
+            last, n = merged[-1], counts[-1]
+            merged[-1] = SegmentPrediction(
+                segment_start=last.segment_start,
+                segment_end=max(last.segment_end, segment.segment_end),
+                category=last.category,
+                probability=(last.probability * n + segment.probability) / (n + 1),
+            )
+            counts[-1] += 1
+        else:
+            merged.append(segment)
+            counts.append(1)
+    return merged
+
+
+async def classify_long_audio(
+    model, audio_file: BinaryIO, hop_seconds: float, batch_size: int, merge: bool = True
+) -> List[SegmentPrediction]:
+    """Classifies a recording window by window. Reading and resampling the next batch and
+    each forward pass are separate executor jobs, so long files share the workers fairly."""
+    sample_rate, chunks = await inference_executor.run(open_audio_stream, audio_file)
+    batches = iter_window_batches(sample_rate, chunks, hop_seconds, batch_size)
+
+    segments: List[SegmentPrediction] = []
+    while True:
+        next_batch = await inference_executor.run(next, batches, None)
+        if next_batch is None:
+            break
+        batch, spans = next_batch
+        output = await model.predict(batch)
+        for (start, end), prediction in zip(spans, output[0].predictions):
+            segments.append(SegmentPrediction(
+                segment_start=start,
+                segment_end=end,
+                category=prediction.category,
+                probability=prediction.probability,
+            ))
+
+    return merge_segments(segments) if merge else segments
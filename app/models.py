@@ -1,7 +1,7 @@
 #file: app/models.py
 
-from sqlalchemy import Column, Float, Integer, String, Boolean, ForeignKey, DateTime
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Float, Integer, String, Boolean, ForeignKey, DateTime, JSON, Text, Index
+from sqlalchemy.sql import false, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .database import Base
@@ -19,20 +19,91 @@ class User(Base):
     role: Mapped[str] = mapped_column(String(255))
     has_access_v1: Mapped[bool] = mapped_column(Boolean, default=False)
     service_calls = relationship('ServiceCall', back_populates='user')
+    jobs = relationship('Job', back_populates='user')
     
     
 class ServiceCall(Base):
     __tablename__ = 'service_calls'
     
     id: Mapped[str] = mapped_column(Integer, primary_key=True, index=True)
-    service_version: Mapped[str] = mapped_column(String(2))
-    #priority: Mapped[int] = mapped_column(Integer)
+    service_version: Mapped[str] = mapped_column(String(32))  # 'v1:<model version>'
+    priority: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
     success: Mapped[bool] = mapped_column(Boolean, default=False)
     owner_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'))
     request_time: Mapped[DateTime] = mapped_column(DateTime, default=func.now())
     completion_time: Mapped[DateTime] = mapped_column(DateTime)
     duration: Mapped[Float] = mapped_column(Float)
+    cached: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false())
     user = relationship('User', back_populates='service_calls')
 
+    __table_args__ = (
+        Index('ix_service_calls_owner_id_request_time', 'owner_id', 'request_time'),
+        Index('ix_service_calls_request_time', 'request_time'),
+    )
+
+
+class ServiceCallRollup(Base):
+    """Hourly ServiceCall totals per user and service version, updated on every usage flush"""
+    __tablename__ = 'service_call_rollups'
+
+    bucket_start: Mapped[DateTime] = mapped_column(DateTime, primary_key=True)
+    owner_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), primary_key=True)
+    service_version: Mapped[str] = mapped_column(String(32), primary_key=True)
+    calls: Mapped[int] = mapped_column(Integer, default=0)
+    errors: Mapped[int] = mapped_column(Integer, default=0)
+    cached_calls: Mapped[int] = mapped_column(Integer, default=0)
+    duration_sum: Mapped[Float] = mapped_column(Float, default=0.0)
+    duration_max: Mapped[Float] = mapped_column(Float, default=0.0)
+
+    __table_args__ = (
+        Index('ix_service_call_rollups_owner_id_bucket_start', 'owner_id', 'bucket_start'),
+    )
+
+
+class ServiceCallDurationRollup(Base):
+    """Hourly histogram of ServiceCall.duration: one row per non-empty bucket of
+    analytics.DURATION_BUCKETS (bucket_index == len(DURATION_BUCKETS) is +Inf)"""
+    __tablename__ = 'service_call_duration_rollups'
+
+    bucket_start: Mapped[DateTime] = mapped_column(DateTime, primary_key=True)
+    owner_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), primary_key=True)
+    service_version: Mapped[str] = mapped_column(String(32), primary_key=True)
+    bucket_index: Mapped[int] = mapped_column(Integer, primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0)
+
+    __table_args__ = (
+        Index('ix_service_call_duration_rollups_owner_id_bucket_start', 'owner_id', 'bucket_start'),
+    )
+
+
+class Job(Base):
+    __tablename__ = 'jobs'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    owner_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), index=True)
+    kind: Mapped[str] = mapped_column(String(16))  # 'batch' or 'long'
+    status: Mapped[str] = mapped_column(String(16), default='queued', index=True)  # queued, running, succeeded, failed
+    priority: Mapped[int] = mapped_column(Integer, default=0)
+    params: Mapped[dict] = mapped_column(JSON, default=dict)
+    input_dir: Mapped[str] = mapped_column(String(255))
+    result: Mapped[list] = mapped_column(JSON, nullable=True)
+    error: Mapped[str] = mapped_column(Text, nullable=True)
+    created_at: Mapped[DateTime] = mapped_column(DateTime, default=func.now())
+    started_at: Mapped[DateTime] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[DateTime] = mapped_column(DateTime, nullable=True)
+    heartbeat_at: Mapped[DateTime] = mapped_column(DateTime, nullable=True)  # refreshed while running
+    user = relationship('User', back_populates='jobs')
+
+
+class ModelDeployment(Base):
+    """Model versions every server process should have loaded, and the one they should serve
+    (see app/deployments.py)"""
+    __tablename__ = 'model_versions'
+
+    version: Mapped[str] = mapped_column(String(29), primary_key=True)
+    path: Mapped[str] = mapped_column(String(255))
+    active: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false())
+    updated_at: Mapped[DateTime] = mapped_column(DateTime, default=func.now(), onupdate=func.now())
+
     
 
@@ -0,0 +1,87 @@
+# file: app/passwords.py
+# bcrypt hashing and verification on a dedicated, bounded thread pool
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from . import config
+from .metrics import registry
+
+
+password_hash_histogram = registry.histogram(
+    'password_hash_seconds', 'Time spent in bcrypt hash / verify, queueing excluded',
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5),
+)
+password_hash_pending = registry.gauge('password_hash_pending', 'Password operations queued or running')
+password_hash_rejected = registry.counter(
+    'password_hash_rejected_total', 'Password operations refused because the pool was saturated'
+)
+
+
+class PasswordHasherBusy(RuntimeError):
+    pass
+
+
+class PasswordHasher:
+    """Runs bcrypt off the event loop. The bcrypt extension releases the GIL, so `max_workers`
+    threads hash in parallel while the loop keeps serving predictions. At most `max_pending`
+    operations may be queued or running; beyond that PasswordHasherBusy is raised rather than
+    letting a login flood build an unbounded backlog. passlib is imported on first use, which
+    keeps it off the import of app.main."""
+
+    def __init__(self, max_workers: int, max_pending: int, rounds: int):
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(self.max_workers, max_pending)
+        self.rounds = rounds
+        self._context = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+
+    @property
+    def context(self):
+        if self._context is None:
+            from passlib.context import CryptContext
+            self._context = CryptContext(schemes=['bcrypt'], deprecated='auto', bcrypt__rounds=self.rounds)
+        return self._context
+
+    def start(self) -> None:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='bcrypt')
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
+
+    def _timed(self, fn: Callable[..., Any], *args) -> Any:
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            password_hash_histogram.observe(time.perf_counter() - started)
+
+    async def _run(self, fn: Callable[..., Any], *args) -> Any:
+        if self._pending >= self.max_pending:
+            password_hash_rejected.inc()
+            raise PasswordHasherBusy("Too many password operations in progress")
+        if self._pool is None:
+            self.start()
+        self._pending += 1
+        password_hash_pending.set(self._pending)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, self._timed, fn, *args)
+        finally:
+            self._pending -= 1
+            password_hash_pending.set(self._pending)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(self.context.verify, password, hashed_password)
+
+
+password_hasher = PasswordHasher(config.PASSWORD_HASH_WORKERS, config.PASSWORD_HASH_MAX_PENDING, config.BCRYPT_ROUNDS)
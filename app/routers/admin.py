@@ -1,19 +1,27 @@
 # file: app/routers/admin.py
 
-from typing import Annotated, List
+from datetime import datetime
+from typing import Annotated, List, Optional
 from pydantic import BaseModel, Field, ValidationError
-from fastapi import Depends, status, HTTPException, Path, APIRouter, Body
-from sqlalchemy.orm import Session
+from fastapi import Depends, status, HTTPException, Path, APIRouter, Body, Query
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from .. import analytics
+from ..admission import RateLimit, inference_admission, rate_limiter
 from ..database import get_db
+from ..deployments import model_deployments
+from ..metrics import registry
+from ..ml_models.registry import model_registry
 from ..models import User
-from ..schemas import ChangeUserAccessRights, ReadUser, CreateAdmin
-from .auth import get_current_user, bcrypt_context
+from ..schemas import ChangeUserAccessRights, ReadUser, CreateAdmin, UsageBucket, LatencySummary, ErrorRate, ModelVersionRead, RateLimitUpdate
+from ..startup import startup_profile
+from .auth import get_current_user, hash_password
 
 router = APIRouter(prefix='/admin', tags=['admin'])
     
 
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]    
     
 
@@ -22,7 +30,168 @@ user_dependency = Annotated[dict, Depends(get_current_user)]
 async def get_all_users(user: user_dependency, db: db_dependency) -> list:
     if user is None or user.get('role') != 'admin':
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-    return db.query(User).all()
+    return (await db.scalars(select(User))).all()
+
+
+@router.get('/metrics', status_code=status.HTTP_200_OK)
+async def get_metrics(user: user_dependency) -> dict:
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    return registry.snapshot()
+
+
+@router.get('/startup', status_code=status.HTTP_200_OK)
+async def get_startup_profile(user: user_dependency) -> dict:
+    """Duration of each startup stage, and when the model became ready"""
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    return startup_profile.describe()
+
+
+@router.get('/usage/calls', status_code=status.HTTP_200_OK, response_model=List[UsageBucket])
+async def get_usage_calls(
+    user: user_dependency,
+    db: db_dependency,
+    granularity: str = Query('hour', pattern='^(hour|day)$'),
+    start: Optional[datetime] = Query(None, description="Defaults to 24 h before end; rounded down to the hour"),
+    end: Optional[datetime] = Query(None, description="Defaults to now"),
+    owner_id: Optional[int] = Query(None, gt=0),
+) -> list:
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    start, end = analytics.default_range(start, end)
+    return await analytics.calls_per_user(db, start, end, granularity, owner_id)
+
+
+@router.get('/usage/latency', status_code=status.HTTP_200_OK, response_model=LatencySummary)
+async def get_usage_latency(
+    user: user_dependency,
+    db: db_dependency,
+    start: Optional[datetime] = Query(None, description="Defaults to 24 h before end; rounded down to the hour"),
+    end: Optional[datetime] = Query(None, description="Defaults to now"),
+    owner_id: Optional[int] = Query(None, gt=0),
+) -> dict:
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    start, end = analytics.default_range(start, end)
+    return await analytics.latency_summary(db, start, end, owner_id)
+
+
+@router.get('/usage/errors', status_code=status.HTTP_200_OK, response_model=List[ErrorRate])
+async def get_usage_errors(
+    user: user_dependency,
+    db: db_dependency,
+    start: Optional[datetime] = Query(None, description="Defaults to 24 h before end; rounded down to the hour"),
+    end: Optional[datetime] = Query(None, description="Defaults to now"),
+) -> list:
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    start, end = analytics.default_range(start, end)
+    return await analytics.error_rates(db, start, end)
+
+
+@router.post('/usage/rebuild', status_code=status.HTTP_200_OK)
+async def rebuild_usage_rollups(
+    user: user_dependency,
+    db: db_dependency,
+    start: datetime = Query(..., description="Rounded down to the hour"),
+    end: datetime = Query(..., description="Rounded down to the hour (exclusive)"),
+) -> dict:
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    return {'service_calls': await analytics.rebuild_rollups(db, start, end)}
+
+
+@router.get('/models', status_code=status.HTTP_200_OK, response_model=List[ModelVersionRead])
+async def get_model_versions(user: user_dependency) -> list:
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    return model_registry.describe()
+
+
+@router.post('/models/{version}', status_code=status.HTTP_202_ACCEPTED)
+async def load_model_version(
+    user: user_dependency,
+    version: str = Path(min_length=1, max_length=29, pattern=r'^[A-Za-z0-9._-]+$'),
+    path: str = Query(..., description="Checkpoint (state dict), relative to MODEL_DIR"),
+    activate: bool = Query(False, description="Swap to this version as soon as it is loaded"),
+) -> dict:
+    """Loads a checkpoint in the background; poll GET /admin/models for its status. This process
+    starts right away, other server processes within MODEL_SYNC_INTERVAL_SECONDS."""
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    try:
+        resolved = model_registry.resolve_path(path)
+        model_registry.start_load(version, resolved, activate)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    await model_deployments.record_load(version, resolved, activate)
+    return {'version': version, 'status': 'loading'}
+
+
+@router.put('/models/{version}/active', status_code=status.HTTP_204_NO_CONTENT)
+async def activate_model_version(user: user_dependency, version: str) -> None:
+    """Swaps this process now, other server processes once they have the version loaded"""
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    try:
+        model_registry.activate(version)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    await model_deployments.record_activate(version)
+
+
+@router.delete('/models/{version}', status_code=status.HTTP_204_NO_CONTENT)
+async def unload_model_version(user: user_dependency, version: str) -> None:
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    try:
+        model_registry.unload(version)
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Model version not found")
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    await model_deployments.record_unload(version)
+
+
+@router.get('/limits', status_code=status.HTTP_200_OK)
+async def get_limits(user: user_dependency) -> dict:
+    """Role defaults from RATE_LIMITS, the overrides set here, and the in-flight cap of this process"""
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    return {**await rate_limiter.describe(), 'inference': inference_admission.describe()}
+
+
+@router.put('/limits/roles/{role}', status_code=status.HTTP_204_NO_CONTENT)
+async def set_role_limit(
+    user: user_dependency, limit: RateLimitUpdate, role: str = Path(min_length=1, max_length=255),
+) -> None:
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    await rate_limiter.backend.set_rule(f'role:{role}', RateLimit(limit.rate, limit.burst))
+
+
+@router.delete('/limits/roles/{role}', status_code=status.HTTP_204_NO_CONTENT)
+async def delete_role_limit(user: user_dependency, role: str) -> None:
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    if not await rate_limiter.backend.delete_rule(f'role:{role}'):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No override for this role")
+
+
+@router.put('/limits/users/{user_id}', status_code=status.HTTP_204_NO_CONTENT)
+async def set_user_limit(user: user_dependency, limit: RateLimitUpdate, user_id: int = Path(gt=0)) -> None:
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    await rate_limiter.backend.set_rule(f'user:{user_id}', RateLimit(limit.rate, limit.burst))
+
+
+@router.delete('/limits/users/{user_id}', status_code=status.HTTP_204_NO_CONTENT)
+async def delete_user_limit(user: user_dependency, user_id: int = Path(gt=0)) -> None:
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    if not await rate_limiter.backend.delete_rule(f'user:{user_id}'):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No override for this user")
 
 
 @router.post('/create', status_code=status.HTTP_201_CREATED)
@@ -33,10 +202,10 @@ async def create_admin(
         CreateAdmin.parse_obj(create_user_request.dict())
         password = create_user_request.password
         create_admin_model = User(**create_user_request.dict(exclude={"password"}))
-        create_admin_model.hashed_password = bcrypt_context.hash(password)
+        create_admin_model.hashed_password = await hash_password(password)
 
         db.add(create_admin_model)
-        db.commit()
+        await db.commit()
 
     except ValidationError as e:
         print(f"Validation Error: {e}")
@@ -54,7 +223,7 @@ async def change_user_access_rights(
     if user is None or user.get('role') != 'admin':
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
     
-    modified_user = db.query(User).filter(User.id == user_id).first()
+    modified_user = await db.get(User, user_id)
     if modified_user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, 
@@ -63,8 +232,7 @@ async def change_user_access_rights(
     modified_user.is_active = access_rights.is_active
     modified_user.has_access_v1 = access_rights.has_access_v1
     db.add(modified_user)
-    db.commit()
-    db.refresh(modified_user)
+    await db.commit()
     
 
 
@@ -80,5 +248,5 @@ async def delete_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Authentication failed')
         
-    user_model = db.query(User).filter(User.id == user_id).delete()
-    db.commit()
\ No newline at end of file
+    await db.execute(delete(User).where(User.id == user_id))
+    await db.commit()
\ No newline at end of file
@@ -6,14 +6,15 @@ from datetime import datetime, timedelta
 from pydantic import ValidationError
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
-from passlib.context import CryptContext
-from jose import jwt, JWTError
 
 from ..database import get_db
 from ..models import User
+from ..passwords import password_hasher, PasswordHasherBusy
+from ..tokens import InvalidToken, jwt_backend, token_cache
 from ..schemas import CreateUser, Token, TokenData
 
 router = APIRouter(
@@ -24,24 +25,36 @@ router = APIRouter(
 SECRET_KEY = os.environ['SECRET_KEY']
 ALGORITHM = 'HS256'
 
-bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
-
 
 
 ############### DEPENDENCIES ###############
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
 oauth2bearer = OAuth2PasswordBearer(tokenUrl='auth/token')
 
 
 
 ############### FUNCTIONS ###############
-def authenticate_user(
-    username: str, password: str, db
+async def hash_password(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={'Retry-After': '1'})
+
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    try:
+        return await password_hasher.verify(password, hashed_password)
+    except PasswordHasherBusy as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={'Retry-After': '1'})
+
+
+async def authenticate_user(
+    username: str, password: str, db: AsyncSession
 ) -> Optional[User]:
-    user = db.query(User).filter(User.username == username).first()
+    user = await db.scalar(select(User).where(User.username == username))
     if not user:
         return False
-    if not bcrypt_context.verify(password, user.hashed_password):
+    if not await verify_password(password, user.hashed_password):
         return False
     
     return user
@@ -52,29 +65,30 @@ def create_access_token(token_data: TokenData) -> str:
     expires = datetime.utcnow() + token_data.expires_delta
     encode.update({'exp': expires})
     encode.pop('expires_delta', None)
-    return jwt.encode(encode, SECRET_KEY, algorithm=ALGORITHM)
+    return jwt_backend.encode(encode, SECRET_KEY, ALGORITHM)
 
 
 async def get_current_user(
     token: Annotated[str, Depends(oauth2bearer)]
 ) -> dict:
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get('username')
-        user_id: int = payload.get('user_id')
-        role: str = payload.get('role')
-        has_access_v1: bool = payload.get('has_access_v1')
-
-        if username is None or user_id is None:
+    # Clients reuse a token for many calls: after the first full decode, its claims come
+    # from the verified-token cache until the token's exp
+    payload = token_cache.get(token)
+    if payload is None:
+        try:
+            payload = jwt_backend.decode(token, SECRET_KEY, ALGORITHM)
+        except InvalidToken:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate user')
+        if payload.get('username') is None or payload.get('user_id') is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate user')
-        return {
-            'username': username,
-            'id': user_id,
-            'role': role,
-            'has_access_v1': has_access_v1,
-        }
-    except jwt.JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate user')
+        token_cache.set(token, payload)
+
+    return {
+        'username': payload.get('username'),
+        'id': payload.get('user_id'),
+        'role': payload.get('role'),
+        'has_access_v1': payload.get('has_access_v1'),
+    }
     
     
     
@@ -93,10 +107,10 @@ async def create_user(
             "has_access_v1": False,
         })
         create_user_model = User(**create_user_data)
-        create_user_model.hashed_password = bcrypt_context.hash(password)
+        create_user_model.hashed_password = await hash_password(password)
 
         db.add(create_user_model)
-        db.commit()
+        await db.commit()
 
     except ValidationError as e:
         print(f"Validation Error: {e}")
@@ -109,7 +123,7 @@ async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     db: db_dependency
 ) -> dict:
-    user = authenticate_user(form_data.username, form_data.password, db)
+    user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
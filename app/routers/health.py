@@ -0,0 +1,99 @@
+# file: app/routers/health.py
+# Liveness and readiness probes, for orchestrators and load balancers (no authentication)
+
+import asyncio
+import time
+
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+
+from .. import config
+from ..admission import inference_admission
+from ..database import engine
+from ..ml_models.registry import model_registry
+from ..startup import startup_profile
+from .ml_service_v1 import prediction_batcher_v1
+
+router = APIRouter(prefix='/healthcheck', tags=['health'])
+
+
+############### CHECKS ###############
+# Each readiness check returns a dict with at least 'ok'
+async def check_model() -> dict:
+    """The active model is loaded and warmed up, and startup has finished"""
+    version = model_registry.active_version
+    model = model_registry.get(version) if version is not None else None
+    return {
+        'ok': model is not None and startup_profile.ready,
+        'active_version': version,
+        'warmup_seconds': model.warmup_seconds if model is not None else None,
+    }
+
+
+async def _ping_database() -> None:
+    async with engine.connect() as connection:
+        await connection.execute(text('SELECT 1'))
+
+
+async def check_database() -> dict:
+    """`SELECT 1` through the pool: an exhausted pool times out like an unreachable server"""
+    pool = engine.sync_engine.pool
+    details = {'checked_out': pool.checkedout() if hasattr(pool, 'checkedout') else None}
+    try:
+        await asyncio.wait_for(_ping_database(), config.READINESS_DB_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        return {'ok': False, 'error': f"No answer within {config.READINESS_DB_TIMEOUT_SECONDS} s", **details}
+    except Exception as e:
+        return {'ok': False, 'error': str(e), **details}
+    return {'ok': True, **details}
+
+
+async def check_inference_queue() -> dict:
+    depth = prediction_batcher_v1.queue_depth
+    return {
+        'ok': depth < config.READINESS_MAX_QUEUE_DEPTH,
+        'depth': depth,
+        'max_depth': config.READINESS_MAX_QUEUE_DEPTH,
+        'in_flight': inference_admission.in_flight,
+    }
+
+
+READINESS_CHECKS = (('model', check_model), ('database', check_database), ('inference_queue', check_inference_queue))
+
+
+async def timed(check) -> dict:
+    started = time.perf_counter()
+    result = await check()
+    result['duration_ms'] = round((time.perf_counter() - started) * 1000, 3)
+    return result
+
+
+
+############### ROUTES ###############
+@router.get('', status_code=status.HTTP_200_OK)
+@router.get('/live', status_code=status.HTTP_200_OK)
+async def get_liveness() -> dict:
+    """Answers as long as the event loop serves requests; never touches the model or the database"""
+    return {
+        'status': 'healthy',
+        'uptime_seconds': round(time.perf_counter() - startup_profile.started, 3),
+        'ready_after_seconds': startup_profile.ready_after,
+    }
+
+
+@router.get('/ready', status_code=status.HTTP_200_OK)
+async def get_readiness() -> JSONResponse:
+    """200 when every check passes, otherwise 503; the body lists each check with its duration"""
+    started = time.perf_counter()
+    results = await asyncio.gather(*(timed(check) for _, check in READINESS_CHECKS))
+    checks = {name: result for (name, _), result in zip(READINESS_CHECKS, results)}
+    ready = all(check['ok'] for check in checks.values())
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={
+            'status': 'ready' if ready else 'not ready',
+            'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+            'checks': checks,
+        },
+    )
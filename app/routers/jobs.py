@@ -0,0 +1,147 @@
+# file: app/routers/jobs.py
+
+import os
+import shutil
+from datetime import datetime
+from typing import Annotated, List
+
+from fastapi import APIRouter, Depends, File, HTTPException, Path, Query, UploadFile, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import config
+from ..database import get_db
+from ..jobs import JobQueue, job_input_dir
+from ..models import Job
+from ..schemas import JobRead, JobResultPage
+from ..ml_models.executor import inference_executor
+from ..ml_models.registry import model_registry
+from ..ml_models.constants import WINDOW_SECONDS
+from .auth import get_current_user
+from .ml_service_v1 import rate_limit_user
+
+router = APIRouter(prefix='/mlservice/v1/jobs', tags=['jobs'])
+
+job_queue = JobQueue(model_registry, config.JOB_WORKERS)
+
+
+############### DEPENDENCIES ###############
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+user_dependency = Annotated[dict, Depends(get_current_user)]
+
+
+
+############### FUNCTIONS ###############
+def check_access(user: dict) -> None:
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User is None")
+    if not user.get('has_access_v1'):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User does not have access to the service")
+
+
+async def get_owned_job(db: AsyncSession, user: dict, job_id: int) -> Job:
+    job = await db.get(Job, job_id)
+    if job is None or (job.owner_id != user.get('id') and user.get('role') != 'admin'):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
+def store_uploads(input_dir: str, uploads: List[UploadFile]) -> List[str]:
+    os.makedirs(input_dir, exist_ok=True)
+    stored = []
+    for i, upload in enumerate(uploads):
+        stored_name = f'{i:05d}'
+        upload.file.seek(0)
+        with open(os.path.join(input_dir, stored_name), 'wb') as out:
+            shutil.copyfileobj(upload.file, out)
+        stored.append(stored_name)
+    return stored
+
+
+
+############### ROUTES ###############
+@router.post('', status_code=status.HTTP_202_ACCEPTED, response_model=JobRead, dependencies=[Depends(rate_limit_user)])
+async def submit_job(
+    user: user_dependency,
+    db: db_dependency,
+    audio_files: List[UploadFile] = File(..., description="One recording for 'long', files or archives for 'batch'"),
+    kind: str = Query('batch', pattern='^(batch|long)$'),
+    priority: int = Query(0, ge=0, le=9, description="Higher runs first"),
+    top_k: int = Query(1, ge=1, le=50, description="'batch' only: ranked categories per file"),
+    hop_seconds: float = Query(
+        config.LONG_AUDIO_HOP_SECONDS, ge=config.LONG_AUDIO_MIN_HOP_SECONDS, le=WINDOW_SECONDS, description="'long' only",
+    ),
+    merge: bool = Query(True, description="'long' only: merge consecutive windows with the same category"),
+) -> Job:
+    check_access(user)
+    if kind == 'long' and len(audio_files) != 1:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'long' jobs take exactly one file")
+
+    job = Job(owner_id=user['id'], kind=kind, status='uploading', priority=priority, params={}, input_dir='')
+    db.add(job)
+    await db.commit()
+
+    input_dir = job_input_dir(job.id)
+    try:
+        stored = await inference_executor.run(store_uploads, input_dir, audio_files)
+    except Exception as e:
+        shutil.rmtree(input_dir, ignore_errors=True)
+        job.status, job.error, job.finished_at = 'failed', f"Storing the uploads failed: {e}", datetime.now()
+        await db.commit()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not store the uploads")
+    job.input_dir = input_dir
+    job.params = {
+        'stored_files': stored,
+        'filenames': [upload.filename for upload in audio_files],
+        'top_k': top_k,
+        'hop_seconds': hop_seconds,
+        'merge': merge,
+    }
+    job.status = 'queued'
+    await db.commit()
+
+    job_queue.enqueue(job.id, job.priority)
+    return job
+
+
+@router.get('', status_code=status.HTTP_200_OK, response_model=List[JobRead])
+async def list_jobs(
+    user: user_dependency,
+    db: db_dependency,
+    limit: int = Query(50, ge=1, le=500),
+) -> List[Job]:
+    check_access(user)
+    query = select(Job).where(Job.owner_id == user['id']).order_by(Job.id.desc()).limit(limit)
+    return (await db.scalars(query)).all()
+
+
+@router.get('/{job_id}', status_code=status.HTTP_200_OK, response_model=JobRead)
+async def get_job_status(user: user_dependency, db: db_dependency, job_id: int = Path(gt=0)) -> Job:
+    check_access(user)
+    return await get_owned_job(db, user, job_id)
+
+
+@router.get('/{job_id}/result', status_code=status.HTTP_200_OK, response_model=JobResultPage)
+async def get_job_result(
+    user: user_dependency,
+    db: db_dependency,
+    job_id: int = Path(gt=0),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(config.JOB_RESULT_PAGE_SIZE, ge=1, le=1000),
+) -> dict:
+    check_access(user)
+    job = await get_owned_job(db, user, job_id)
+    if job.status == 'failed':
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job failed: {job.error}")
+    if job.status != 'succeeded':
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job is {job.status}")
+
+    items = job.result or []
+    return {
+        'job_id': job.id,
+        'kind': job.kind,
+        'total': len(items),
+        'offset': offset,
+        'limit': limit,
+        'items': items[offset:offset + limit],
+    }
@@ -1,59 +1,125 @@
 # file: app/routers/ml_service_v1.py
 
 
-from typing import List
-import torch
-import torchaudio
-import io
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import math
 from datetime import datetime
+from typing import TYPE_CHECKING, Annotated, List, Optional
 
-from datetime import datetime
-from typing import Annotated
-from fastapi import APIRouter, File, UploadFile
-from fastapi import Depends, status, HTTPException, APIRouter
-from sqlalchemy.orm import Session
-
-from ..database import get_db
-from ..models import User, ServiceCall
-from ..schemas import PredictionInput, PredictionOutput, ServiceCallCreate, SegmentPrediction
-from ..ml_models.v1 import PlaceholderMLModelV1
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, WebSocket, WebSocketDisconnect, status
+
+from .. import config
+from ..admission import Overloaded, RateLimited, inference_admission, rate_limiter
+from ..cache import prediction_cache, hash_bytes, hash_file
+from ..instrumentation import stage_timer
+from ..schemas import PredictionOutput, ServiceCallCreate, SegmentPrediction, SegmentPredictionOutput
+from ..ml_models.batching import MicroBatcher
+from ..ml_models.constants import SAMPLE_RATE, WINDOW_SECONDS
+from ..ml_models.registry import model_registry
+from ..ml_models.executor import inference_executor
+from ..usage import usage_recorder
 from .auth import get_current_user
 
+# The torch-based model code (ml_models.registry.SERVING_MODULES) is imported inside the routes:
+# they only get that far once a model is active, and loading it has imported them already
+if TYPE_CHECKING:
+    from ..ml_models.v1 import PlaceholderMLModelV1
+
 router = APIRouter(prefix='/mlservice/v1', tags=['mlservice/v1'])
 
-placeholder_ml_model_v1 = PlaceholderMLModelV1()
+
+
+async def predict_many_active(requests):
+    """Each batch runs on the model active when it is dispatched; outputs carry its version"""
+    return await model_registry.active().predict_many(requests)
+
+
+prediction_batcher_v1 = MicroBatcher(
+    predict_many_active,
+    max_batch_size=config.BATCH_MAX_SIZE,
+    max_wait_ms=config.BATCH_MAX_WAIT_MS,
+    max_concurrent_batches=config.INFERENCE_WORKERS,
+)
 
 
 ############### DEPENDENCIES ###############
-async def get_ml_model_v1(model: PlaceholderMLModelV1 = Depends()) -> PlaceholderMLModelV1:
-    """Dependency to lazy-load a ML model"""
-    if not model.loaded:
-        await model.load_model()
-    return model
+async def get_ml_model_v1() -> 'PlaceholderMLModelV1':
+    """Dependency returning the shared, loaded model of the active version"""
+    try:
+        return model_registry.active()
+    except LookupError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="No model loaded")
 
 
-db_dependency = Annotated[Session, Depends(get_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
-ml_model_v1_dependency = Annotated[PlaceholderMLModelV1, Depends(get_ml_model_v1)]
+ml_model_v1_dependency = Annotated['PlaceholderMLModelV1', Depends(get_ml_model_v1)]
+
+
+def retry_after(seconds: float) -> dict:
+    return {'Retry-After': str(max(1, math.ceil(seconds)))}
 
 
+async def check_rate_limit(user: dict) -> None:
+    try:
+        await rate_limiter.check(user)
+    except RateLimited as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e), headers=retry_after(e.retry_after))
+
+
+async def rate_limit_user(user: user_dependency) -> None:
+    """Dependency applying the user's token bucket"""
+    if user is not None:  # the routes reject anonymous requests themselves
+        await check_rate_limit(user)
+
+
+async def admit_inference(user: user_dependency):
+    """Dependency applying the user's token bucket (429), then taking a slot under the global
+    in-flight cap (503); the slot is released once the route has returned"""
+    await rate_limit_user(user)
+    try:
+        inference_admission.acquire()
+    except Overloaded as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers=retry_after(e.retry_after))
+    try:
+        yield
+    finally:
+        inference_admission.release()
+
+
+
+############### FUNCTIONS ###############
+def make_service_call(
+    owner_id: int, request_time: datetime, completion_time: datetime, model_version: str,
+    success: bool = True, cached: bool = False,
+) -> ServiceCallCreate:
+    return ServiceCallCreate(
+        service_version=f'v1:{model_version}',
+        success=success,
+        owner_id=owner_id,
+        request_time=request_time,
+        completion_time=completion_time,
+        duration=(completion_time - request_time).total_seconds(),
+        cached=cached,
+    )
+
 
 
 ############### ROUTES ###############
 @router.get('/healthcheck', status_code=status.HTTP_200_OK)
-async def check_service_v1(user: user_dependency, db: db_dependency) -> dict:
+async def check_service_v1(user: user_dependency, model: ml_model_v1_dependency) -> dict:
+    """The caller may use the service and a model is active (503 otherwise); see also the
+    unauthenticated GET /healthcheck/ready"""
     if user is None or not user.get('has_access_v1'):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-    return {'status': 'healthy'}
+    return {'status': 'healthy', 'model_version': model.version}
 
 
-@router.post('/predict', status_code=status.HTTP_200_OK)
+@router.post('/predict', status_code=status.HTTP_200_OK, dependencies=[Depends(admit_inference)])
 async def make_prediction_v1(
     user: user_dependency, 
-    db: db_dependency, 
     model: ml_model_v1_dependency,
-    prediction_input: PredictionInput = Depends(PredictionInput.as_form), 
+    audio_file: UploadFile = File(...),
+    top_k: int = Query(1, ge=1, le=50, description="Number of ranked categories to return per item"),
 ):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User is None")
@@ -61,74 +127,203 @@ async def make_prediction_v1(
     if not user.get('has_access_v1'):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User does not have access to the service")
     
+    ################## CACHE LOOKUP ##################
+    request_time = datetime.now()
+    cache_key = None
+    if prediction_cache.enabled and prediction_cache.key_mode == 'upload':
+        with stage_timer('cache_lookup'):
+            digest = await inference_executor.run(hash_file, audio_file.file)
+            cache_key = prediction_cache.key(digest, model.version, top_k)
+            prediction_output = await prediction_cache.get(cache_key)
+        if prediction_output is not None:
+            usage_recorder.record(make_service_call(
+                user['id'], request_time, datetime.now(), model.version, cached=True,
+            ))
+            return prediction_output
+
     ################## AUDIO PROCESSING ##################
-    # Create a file-like object from the uploaded file data
-    audio_data = io.BytesIO(prediction_input.audio_file)
-    
-    # Process the audio data here, before calling model.predict
-    waveform, sample_rate = torchaudio.load(audio_data)
-    if sample_rate != 16000:  # Adjust the sample rate to the model's requirements
-        waveform = torchaudio.transforms.Resample(sample_rate, 16000)(waveform)
-    target_length = 80000  # Adjust the target length to the model requirements
-    if waveform.shape[1] < target_length:
-        waveform = torch.nn.functional.pad(waveform, (0, target_length - waveform.shape[1]))
-    elif waveform.shape[1] > target_length:
-        waveform = waveform[:, :target_length]
+    # Only the first 5 s are read and decoded; resampling runs on the inference executor.
+    # Records the 'decode' and 'resample' stages.
+    from ..ml_models.ingestion import load_upload_waveform
+    waveform = await load_upload_waveform(audio_file)
+
+    if prediction_cache.enabled and prediction_cache.key_mode == 'waveform':
+        with stage_timer('cache_lookup'):
+            digest = await inference_executor.run(hash_bytes, waveform.numpy().tobytes())
+            cache_key = prediction_cache.key(digest, model.version, top_k)
+            prediction_output = await prediction_cache.get(cache_key)
+        if prediction_output is not None:
+            usage_recorder.record(make_service_call(
+                user['id'], request_time, datetime.now(), model.version, cached=True,
+            ))
+            return prediction_output
     
     
     ####################### PREDICTION / DB FLOW ###################
-    request_time = datetime.now()
-    prediction_output = await model.predict(waveform)  # Adjusted to pass preprocessed waveform
+    with stage_timer('inference'):  # batching queue wait and the shared forward pass
+        prediction_output = await prediction_batcher_v1.submit((waveform, top_k))  # shares a forward pass with concurrent requests
     completion_time = datetime.now()
-    duration = (completion_time - request_time).total_seconds()
-    
-    service_call_data = ServiceCallCreate(
-        service_version='v1',
-        success=True,
-        owner_id=user['id'],
-        request_time=request_time,
-        completion_time=completion_time,
-        duration=duration
-    )
-    service_call = ServiceCall(**service_call_data.dict())
-    db.add(service_call)
-    db.commit()
-    db.refresh(service_call)
+    model_version = prediction_output[0].model_version  # the active model may have been swapped meanwhile
+    if cache_key is not None and model_version == model.version:
+        with stage_timer('cache_store'):
+            await prediction_cache.set(cache_key, prediction_output)
+    with stage_timer('usage_record'):  # queued here; the bulk DB write is usage_flush_seconds
+        usage_recorder.record(make_service_call(user['id'], request_time, completion_time, model_version))
     
     return prediction_output
 
 
-'''
-@router.post('/predict', status_code=status.HTTP_200_OK)
-async def make_prediction_v1(
-    user: user_dependency, 
-    db: db_dependency, 
+@router.post('/predict/batch', status_code=status.HTTP_200_OK, response_model=List[PredictionOutput], dependencies=[Depends(admit_inference)])
+async def make_batch_prediction_v1(
+    user: user_dependency,
     model: ml_model_v1_dependency,
-    prediction_input: PredictionInput = Depends(PredictionInput.as_form), 
+    audio_files: List[UploadFile] = File(..., description="Audio files, or zip / tar archives of audio files"),
+    top_k: int = Query(1, ge=1, le=50, description="Number of ranked categories to return per item"),
 ):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User is None")
-    
+
     if not user.get('has_access_v1'):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User does not have access to the service")
-    
+
+    from ..ml_models.ingestion import expand_archives
+    from ..ml_models.pipelines import predict_files
+
     request_time = datetime.now()
-    prediction_output = await model.predict(prediction_input)
+    try:
+        files = await inference_executor.run(
+            expand_archives, [(upload.filename, upload.file) for upload in audio_files],
+            config.BATCH_PREDICT_MAX_FILES, config.ARCHIVE_MAX_BYTES,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+
+    ####################### PREDICTION / DB FLOW ###################
+    # Files are decoded concurrently, same-rate clips resampled together, then run in big batches
+    outputs = await predict_files(model, files, top_k)
     completion_time = datetime.now()
-    duration = (completion_time - request_time).total_seconds()
-    
-    service_call_data = ServiceCallCreate(
-        service_version='v1',
-        success=True,
-        owner_id=user['id'],
-        request_time=request_time,
-        completion_time=completion_time,
-        duration=duration
+
+    usage_recorder.record(*[
+        make_service_call(user['id'], request_time, completion_time, model.version, success=output.error is None)
+        for output in outputs
+    ])
+
+    return outputs
+
+
+@router.post('/predict/long', status_code=status.HTTP_200_OK, response_model=SegmentPredictionOutput, dependencies=[Depends(admit_inference)])
+async def make_long_prediction_v1(
+    user: user_dependency,
+    model: ml_model_v1_dependency,
+    audio_file: UploadFile = File(...),
+    hop_seconds: float = Query(
+        config.LONG_AUDIO_HOP_SECONDS, ge=config.LONG_AUDIO_MIN_HOP_SECONDS, le=WINDOW_SECONDS,
+        description="Seconds between the starts of consecutive 5 s windows",
+    ),
+    merge: bool = Query(True, description="Merge consecutive windows with the same category"),
+):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User is None")
+
+    if not user.get('has_access_v1'):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User does not have access to the service")
+
+    from ..ml_models.windowing import classify_long_audio
+
+    request_time = datetime.now()
+    segments = await classify_long_audio(
+        model, audio_file.file, hop_seconds, config.LONG_AUDIO_BATCH_SIZE, merge,
     )
-    service_call = ServiceCall(**service_call_data.dict())
-    db.add(service_call)
-    db.commit()
-    db.refresh(service_call)
-    
-    return prediction_output
-'''
\ No newline at end of file
+    completion_time = datetime.now()
+    usage_recorder.record(make_service_call(user['id'], request_time, completion_time, model.version))
+
+    return SegmentPredictionOutput(segments=segments, model_version=model.version)
+
+
+############### STREAMING ###############
+def _websocket_token(websocket: WebSocket) -> Optional[str]:
+    """Bearer token from the Authorization header, or from ?token= for clients such as
+    browsers that cannot set headers on a WebSocket"""
+    scheme, _, token = websocket.headers.get('authorization', '').partition(' ')
+    if scheme.lower() == 'bearer' and token:
+        return token
+    return websocket.query_params.get('token')
+
+
+async def _classify_stream_windows(
+    websocket: WebSocket, user: dict, sample_rate: int, windows: List[tuple],
+) -> None:
+    """Windows of every open stream go through the shared batcher, so concurrent streams (and
+    /predict requests) share forward passes. Each call holds one slot under the global in-flight
+    cap, like a /predict request, and raises Overloaded when none is free. Events are sent in
+    window order."""
+    from ..ml_models.preprocessing import prepare_waveforms
+
+    inference_admission.acquire()
+    try:
+        request_time = datetime.now()
+        waveforms = await inference_executor.run(prepare_waveforms, [(clip, sample_rate) for _, _, clip in windows])
+        outputs = await asyncio.gather(*(prediction_batcher_v1.submit((waveform, 1)) for waveform in waveforms))
+        completion_time = datetime.now()
+    finally:
+        inference_admission.release()
+
+    for (start, end, _), output in zip(windows, outputs):
+        prediction = output[0].predictions[0]
+        segment = SegmentPrediction(
+            segment_start=start, segment_end=end, category=prediction.category, probability=prediction.probability,
+        )
+        await websocket.send_text(segment.model_dump_json())
+        usage_recorder.record(make_service_call(user['id'], request_time, completion_time, output[0].model_version))
+
+
+@router.websocket('/stream')
+async def stream_predictions_v1(
+    websocket: WebSocket,
+    sample_rate: int = Query(SAMPLE_RATE, ge=8000, le=192000),
+    channels: int = Query(1, ge=1, le=8),
+    encoding: str = Query('s16le', pattern='^(s16le|s32le|f32le)$'),
+    hop_seconds: float = Query(config.STREAM_HOP_SECONDS, ge=config.STREAM_MIN_HOP_SECONDS, le=WINDOW_SECONDS),
+):
+    """Binary messages are interleaved little-endian PCM of any length; text messages are
+    ignored. Once 5 s have arrived, a SegmentPrediction (times in seconds since the stream
+    started) is sent for the latest 5 s every `hop_seconds` of audio."""
+    token = _websocket_token(websocket)
+    try:
+        user = await get_current_user(token) if token else None
+    except HTTPException:
+        user = None
+    if user is None or not user.get('has_access_v1'):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    try:
+        await rate_limiter.check(user)  # once per stream; each batch of windows then takes an admission slot
+    except RateLimited:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+    if model_registry.active_version is None:  # also means the model code may not be imported yet
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+    from ..ml_models.streaming import PcmDecoder, StreamWindower
+
+    await websocket.accept()
+    decoder = PcmDecoder(encoding, channels)
+    windower = StreamWindower(sample_rate, hop_seconds)
+    try:
+        while True:
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                return
+            data = message.get('bytes')
+            if data is None:
+                continue
+            if len(data) > config.STREAM_MAX_CHUNK_BYTES:
+                await websocket.close(code=status.WS_1009_MESSAGE_TOO_BIG)
+                return
+            windows = windower.feed(decoder.feed(data))
+            if windows:
+                await _classify_stream_windows(websocket, user, sample_rate, windows)
+    except WebSocketDisconnect:
+        return
+    except (LookupError, Overloaded):  # no active model, or inference is shedding load
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
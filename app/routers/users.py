@@ -1,21 +1,20 @@
 # file: users.py
 
 from typing import Annotated
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import APIRouter, status, HTTPException, Depends
-from passlib.context import CryptContext
 
 from ..models import User
 from ..schemas import UserVerification, ReadUser
 from ..database import get_db
-from .auth import get_current_user
+from .auth import get_current_user, hash_password, verify_password
 
 router = APIRouter(prefix='/user', tags=['user'])
 
 ############### DEPENDENCIES ###############
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
-bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
 
 
 
@@ -28,7 +27,7 @@ async def get_user(user: user_dependency, db: db_dependency) -> User:
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Authentication failed'
         )
-    return db.query(User).filter(User.id == user.get('id')).first()
+    return await db.get(User, user.get('id'))
 
 
 @router.put('/password', status_code=status.HTTP_204_NO_CONTENT)
@@ -41,12 +40,12 @@ async def change_password(
             detail='Authentication failed'
         )
     
-    user_model = db.query(User).filter(User.id == user.get('id')).first()
-    if not bcrypt_context.verify(user_verification.password, user_model.hashed_password):
+    user_model = await db.get(User, user.get('id'))
+    if not await verify_password(user_verification.password, user_model.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Error on password change'
         )
-    user_model.hashed_password = bcrypt_context.hash(user_verification.new_password)
+    user_model.hashed_password = await hash_password(user_verification.new_password)
     db.add(user_model)
-    db.commit()
\ No newline at end of file
+    await db.commit()
\ No newline at end of file
@@ -5,7 +5,7 @@ from typing import Optional
 from pydantic import BaseModel, EmailStr, SecretStr, Field
 from fastapi import File, Form, UploadFile
 
-from typing import List, Tuple
+from typing import List, Tuple, Union
 
 
 class BaseUser(BaseModel):
@@ -90,12 +90,32 @@ class SegmentPrediction(BaseModel):
     probability: float
 
 
+class SegmentPredictionOutput(BaseModel):
+    segments: List[SegmentPrediction]
+    model_version: Optional[str] = None
+
+    class Config:
+        protected_namespaces = ()
+
+
+class CategoryScore(BaseModel):
+    category: str
+    probability: float
+
+
 class Prediction(BaseModel):
     category: str
     probability: float
+    top_k: Optional[List[CategoryScore]] = None
 
 class PredictionOutput(BaseModel):
     predictions: List[Prediction]
+    filename: Optional[str] = None  # set on /predict/batch results
+    error: Optional[str] = None  # set when a batch item could not be decoded
+    model_version: Optional[str] = None
+
+    class Config:
+        protected_namespaces = ()
 
 
 class ServiceCallCreate(BaseModel):
@@ -105,6 +125,8 @@ class ServiceCallCreate(BaseModel):
     request_time: datetime
     completion_time: datetime
     duration: float
+    cached: bool = False
+    priority: int = 0
     
     class Config:
         from_attributes = True
@@ -114,3 +136,69 @@ class ServiceCallRead(ServiceCallCreate):
     id: int
 
 
+class UsageBucket(BaseModel):
+    bucket_start: datetime
+    owner_id: int
+    calls: int
+    errors: int
+    cached_calls: int
+
+
+class LatencySummary(BaseModel):
+    start: datetime
+    end: datetime
+    calls: int
+    mean: Optional[float] = None
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+    p99: Optional[float] = None
+    max: Optional[float] = None
+
+
+class ErrorRate(BaseModel):
+    owner_id: int
+    calls: int
+    errors: int
+    error_rate: float
+
+
+
+class JobRead(BaseModel):
+    id: int
+    kind: str
+    status: str
+    priority: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class RateLimitUpdate(BaseModel):
+    rate: float = Field(ge=0, description="Requests per second; 0 is unlimited")
+    burst: int = Field(ge=1, description="Requests allowed at once after being idle")
+
+
+class ModelVersionRead(BaseModel):
+    version: str
+    path: str
+    status: str  # loading, ready or failed
+    active: bool
+    backend: Optional[str] = None
+    variant: Optional[str] = None
+    loaded_at: Optional[datetime] = None
+    error: Optional[str] = None
+    parity: Optional[dict] = None  # parity gate report of a non-eager backend
+    fallback_reason: Optional[str] = None  # set when eager is served instead of the configured backend
+
+
+class JobResultPage(BaseModel):
+    job_id: int
+    kind: str
+    total: int
+    offset: int
+    limit: int
+    items: List[Union[PredictionOutput, SegmentPrediction]]
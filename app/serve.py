@@ -0,0 +1,148 @@
+# file: app/serve.py
+# Multi-process serving: the parent imports the app and loads the model once, then forks workers
+#
+# Each worker inherits the parent's memory copy-on-write: the torch runtime, the imported modules
+# and Net's weights are mapped into every worker instead of being loaded again per process.
+# Workers share one listening socket and each runs its own event loop, batcher and executor.
+#
+#   python -m app.serve --host 0.0.0.0 --port 5555 --workers 4
+#   python -m app.serve --workers 4 --no-preload   # every worker imports and loads on its own
+
+import argparse
+import asyncio
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict
+
+import uvicorn
+
+from . import config
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def prepare_database() -> None:
+    """Creates and migrates the tables once (app.migrate), before the workers' startup events
+    would race to do it. The engine is disposed afterwards so no connection is inherited by the workers."""
+    from .database import engine
+    from .migrate import migrate
+
+    async def prepare():
+        await migrate()
+        await engine.dispose()
+
+    asyncio.run(prepare())
+
+
+def preload() -> None:
+    """Runs in the parent before forking. No torch op may run here: an intra-op thread pool
+    started before fork() is not usable in the children, so loading stays single-threaded."""
+    import torch
+
+    from .ml_models.registry import import_serving_modules
+    from .ml_models.v1 import preload_eager_model
+
+    torch.set_num_threads(1)  # the workers' inference executor sets TORCH_NUM_THREADS again
+    preload_eager_model(config.MODEL_PATH)
+    import_serving_modules()  # app.main does not import the model code; the workers would each do it
+    from . import main  # noqa: F401  (imports every router and schema)
+
+    # Objects allocated so far are never freed; keeping the collector off them stops its
+    # reference updates from copying their pages into each worker
+    gc.collect()
+    gc.freeze()
+
+
+def run_worker(sock: socket.socket, log_level: str) -> None:
+    from .main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level, lifespan='on'))
+    server.run(sockets=[sock])
+
+
+class Supervisor:
+    """Forks the workers, replaces any that exit unexpectedly and stops them on SIGINT / SIGTERM"""
+
+    def __init__(self, sock: socket.socket, workers: int, log_level: str):
+        self.sock = sock
+        self.workers = max(1, workers)
+        self.log_level = log_level
+        self.children: Dict[int, int] = {}  # pid -> worker slot
+        self.stopping = False
+
+    def spawn(self, slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = 0
+            try:
+                run_worker(self.sock, self.log_level)
+            except BaseException as e:
+                print(f"Worker {os.getpid()} failed: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = slot
+        print(f"Started worker {slot} (pid {pid})")
+
+    def stop(self, signum, frame) -> None:
+        self.stopping = True
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        for slot in range(self.workers):
+            self.spawn(slot)
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            slot = self.children.pop(pid, None)
+            if slot is None or self.stopping:
+                continue
+            print(f"Worker {slot} (pid {pid}) exited with status {status}, restarting")
+            time.sleep(1)
+            self.spawn(slot)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the API from several forked worker processes")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--workers', type=int, default=config.SERVER_WORKERS)
+    parser.add_argument('--log-level', default='info')
+    parser.add_argument('--no-preload', action='store_true', help="import and load the model in each worker")
+    args = parser.parse_args()
+
+    sock = bind_socket(args.host, args.port)
+    prepare_database()
+    if not args.no_preload:
+        preload()
+    print(f"Serving on {args.host}:{args.port} with {args.workers} workers (pid {os.getpid()})")
+    Supervisor(sock, args.workers, args.log_level).run()
+    sock.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
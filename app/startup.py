@@ -0,0 +1,55 @@
+# file: app/startup.py
+# Startup profile: how long each startup stage took, and when the process became ready to predict
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from .metrics import registry
+
+
+startup_stage_gauge = registry.gauge('startup_stage_seconds', 'Wall time of each startup stage', labelnames=('stage',))
+startup_ready_gauge = registry.gauge('startup_ready', '1 once the model is loaded, warmed up and active')
+
+
+class StartupProfile:
+    """Durations of the startup stages, in the order they finished. 'import' is the time to
+    import app.main, from the first import of this module; interpreter and server startup come
+    before it and are not included. torch is not part of it: it is imported in 'model_import'."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.ready_after: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_after is not None
+
+    def record(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = seconds
+        startup_stage_gauge.labels(stage=stage).set(seconds)
+
+    @contextmanager
+    def stage(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def mark_ready(self) -> None:
+        self.ready_after = time.perf_counter() - self.started
+        startup_ready_gauge.set(1)
+        breakdown = ', '.join(f'{stage} {seconds:.3f}s' for stage, seconds in self.stages.items())
+        print(f"Ready after {self.ready_after:.3f}s ({breakdown})")
+
+    def describe(self) -> dict:
+        return {
+            'ready': self.ready,
+            'ready_after_seconds': self.ready_after,
+            'stages': dict(self.stages),
+        }
+
+
+startup_profile = StartupProfile()
@@ -0,0 +1,172 @@
+# file: app/usage.py
+# Buffered, bulk writer for ServiceCall usage records
+
+import asyncio
+import fcntl
+import os
+import time
+from typing import List, Optional
+
+from sqlalchemy import insert
+
+from . import config
+from .analytics import apply_rollups
+from .database import SessionLocal
+from .metrics import registry
+from .models import ServiceCall
+from .schemas import ServiceCallCreate
+
+
+usage_queue_depth = registry.gauge('usage_queue_depth', 'ServiceCall records waiting to be written')
+usage_flush_histogram = registry.histogram(
+    'usage_flush_seconds', 'Time to write one batch of ServiceCall records',
+)
+usage_flush_size_histogram = registry.histogram(
+    'usage_flush_size', 'ServiceCall records written per flush',
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000),
+)
+usage_records_written = registry.counter('usage_records_written_total', 'ServiceCall records written')
+usage_flush_failures = registry.counter('usage_flush_failures_total', 'Flushes that failed and were retried')
+
+COPY_COLUMNS = (
+    'service_version', 'success', 'owner_id', 'request_time', 'completion_time', 'duration', 'cached', 'priority',
+)
+
+
+class UsageRecorder:
+    """Buffers ServiceCallCreate records in memory and writes them in bulk when `flush_size`
+    records are waiting or every `flush_interval` seconds. A failed flush keeps its records
+    for the next attempt. On stop, whatever cannot be written is spilled to `spill_path`
+    and re-read on the next start."""
+
+    def __init__(
+        self, flush_size: int, flush_interval: float, method: str = 'insert', spill_path: Optional[str] = None
+    ):
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self.method = method
+        self.spill_path = spill_path
+        self._buffer: List[ServiceCallCreate] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._buffer)
+
+    def record(self, *service_calls: ServiceCallCreate) -> None:
+        self._buffer.extend(service_calls)
+        usage_queue_depth.set(len(self._buffer))
+        if len(self._buffer) >= self.flush_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._stopping = False
+        self._load_spill()
+        self._task = asyncio.create_task(self._flush_forever())
+
+    async def stop(self) -> None:
+        """Lets a write in progress finish (it is never cancelled mid-transaction), then writes
+        the whole buffer. Records are spilled only after 3 consecutive failed flushes."""
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        failures = 0
+        while self._buffer and failures < 3:
+            if await self.flush():
+                failures = 0
+            else:
+                failures += 1
+                await asyncio.sleep(0.5)
+        if self._buffer:
+            self._spill()
+
+    async def _flush_forever(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._buffer and not self._stopping:
+                if not await self.flush():
+                    break  # keep the records, retry on the next tick
+
+    async def flush(self) -> bool:
+        """Writes up to `flush_size` buffered records; returns False if the write failed"""
+        async with self._flush_lock:
+            batch = self._buffer[:self.flush_size]
+            if not batch:
+                return True
+            del self._buffer[:len(batch)]
+
+            started = time.perf_counter()
+            try:
+                await self._write(batch)
+            except BaseException as e:
+                self._buffer[:0] = batch  # also on cancellation: stop() writes or spills them
+                if not isinstance(e, Exception):
+                    raise
+                usage_flush_failures.inc()
+                print(f"Usage flush of {len(batch)} records failed: {e}")
+                return False
+            finally:
+                usage_queue_depth.set(len(self._buffer))
+            usage_flush_histogram.observe(time.perf_counter() - started)
+            usage_flush_size_histogram.observe(len(batch))
+            usage_records_written.inc(len(batch))
+            return True
+
+    async def _write(self, batch: List[ServiceCallCreate]) -> None:
+        async with SessionLocal() as db:
+            if self.method == 'copy' and db.bind.dialect.driver == 'asyncpg':
+                connection = await db.connection()
+                raw = await connection.get_raw_connection()
+                await raw.driver_connection.copy_records_to_table(
+                    ServiceCall.__tablename__,
+                    records=[tuple(getattr(record, column) for column in COPY_COLUMNS) for record in batch],
+                    columns=COPY_COLUMNS,
+                )
+            else:
+                await db.execute(insert(ServiceCall), [record.dict() for record in batch])
+            await apply_rollups(db, batch)
+            await db.commit()
+
+    def _spill(self) -> None:
+        if not self.spill_path:
+            print(f"Dropping {len(self._buffer)} usage records: no USAGE_SPILL_PATH")
+            return
+        with open(self.spill_path, 'a') as spill:
+            fcntl.flock(spill, fcntl.LOCK_EX)  # every app.serve worker spills to the same file
+            for record in self._buffer:
+                spill.write(record.model_dump_json() + '\n')
+            spill.flush()  # before the lock is released with the file
+        print(f"Spilled {len(self._buffer)} usage records to {self.spill_path}")
+        self._buffer.clear()
+
+    def _load_spill(self) -> None:
+        """Takes every spilled record under the file lock and empties the file. It is truncated,
+        not removed: a worker waiting for the lock to append still holds the same file open."""
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        with open(self.spill_path, 'r+') as spill:
+            fcntl.flock(spill, fcntl.LOCK_EX)
+            self._buffer[:0] = [ServiceCallCreate.model_validate_json(line) for line in spill if line.strip()]
+            spill.truncate(0)
+        usage_queue_depth.set(len(self._buffer))
+
+
+usage_recorder = UsageRecorder(
+    config.USAGE_FLUSH_SIZE,
+    config.USAGE_FLUSH_INTERVAL_SECONDS,
+    config.USAGE_FLUSH_METHOD,
+    config.USAGE_SPILL_PATH,
+)
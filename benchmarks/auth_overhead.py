@@ -0,0 +1,54 @@
+# file: benchmarks/auth_overhead.py
+# Per-request cost of bearer-token validation in get_current_user
+#
+# Compares a full decode with python-jose, a full decode with the stdlib HMAC backend and a
+# verified-token cache hit, calling get_current_user directly so only auth is measured.
+#
+#   SQL_URL=sqlite:////tmp/bench.db SECRET_KEY=bench python -m benchmarks.auth_overhead
+
+import argparse
+import asyncio
+import time
+from datetime import timedelta
+
+from app import tokens
+from app.routers import auth
+from app.schemas import TokenData
+
+from .common import write_report
+
+
+async def measure(token: str, iterations: int) -> dict:
+    await auth.get_current_user(token)  # warm-up, and fills the cache when it is enabled
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await auth.get_current_user(token)
+    elapsed = time.perf_counter() - started
+    return {'iterations': iterations, 'us_per_call': round(elapsed / iterations * 1e6, 2)}
+
+
+async def main(iterations: int) -> dict:
+    token_data = TokenData(
+        username='bench@example.com', user_id=1, role='user', has_access_v1=True, expires_delta=timedelta(minutes=20),
+    )
+    token = auth.create_access_token(token_data)
+
+    results = {}
+    for backend_name in ('jose', 'hmac'):
+        auth.jwt_backend = tokens.create_jwt_backend(backend_name)
+        auth.token_cache = tokens.VerifiedTokenCache(0)
+        results[f'{backend_name}_decode'] = await measure(token, iterations)
+
+    auth.jwt_backend = tokens.create_jwt_backend('jose')
+    auth.token_cache = tokens.VerifiedTokenCache(1000)
+    results['cache_hit'] = await measure(token, iterations)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Per-request bearer-token validation cost")
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--output', help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    write_report('auth_overhead', asyncio.run(main(args.iterations)), args.output)
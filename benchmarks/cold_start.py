@@ -0,0 +1,109 @@
+# file: benchmarks/cold_start.py
+# Cold start of a local uvicorn: time to accept connections, to pass GET /healthcheck/ready and to
+# the first prediction, and the server's own per-stage breakdown (GET /admin/startup)
+#
+# Each run starts a fresh process on a fresh SQLite database, with FAST_START off and then on:
+#   python -m benchmarks.cold_start
+#   python -m benchmarks.cold_start --runs 5 --output cold_start.json
+#
+# Times are from spawning the process, so they include the interpreter and uvicorn imports
+# that the server's own 'import' stage does not see. torch is imported in the 'model_import' stage,
+# which FAST_START moves after accepting connections.
+
+import argparse
+import asyncio
+import glob
+import os
+import statistics
+import time
+
+import httpx
+
+from .common import write_report
+from .load import AUDIO_GLOB, PASSWORD, USERNAME, start_server
+
+
+DB_PATH = '/tmp/sound_classification_cold_start.db'
+
+
+async def poll(client: httpx.AsyncClient, send, server, timeout: float) -> httpx.Response:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with status {server.returncode}")
+        try:
+            response = await send(client)
+            if response.status_code == 200:
+                return response
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.02)
+    raise TimeoutError(f"No successful response after {timeout} s")
+
+
+async def measure(port: int, fast_start: bool, audio: bytes, timeout: float) -> dict:
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    os.environ.update(SQL_URL=f'sqlite:///{DB_PATH}', FAST_START=str(fast_start).lower())
+
+    started = time.perf_counter()
+    server = start_server(port, workers=1)
+    try:
+        async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', timeout=30) as client:
+            await poll(client, lambda client: client.get('/healthcheck'), server, timeout)
+            accepting = time.perf_counter() - started
+            await poll(client, lambda client: client.get('/healthcheck/ready'), server, timeout)
+            ready = time.perf_counter() - started
+
+            login = await poll(
+                client, lambda client: client.post('/auth/token', data={'username': USERNAME, 'password': PASSWORD}),
+                server, timeout,
+            )
+            headers = {'Authorization': f"Bearer {login.json()['access_token']}"}
+            await poll(
+                client, lambda client: client.post(
+                    '/mlservice/v1/predict', headers=headers, files={'audio_file': ('clip.wav', audio, 'audio/wav')},
+                ),
+                server, timeout,
+            )
+            first_prediction = time.perf_counter() - started
+            profile = (await client.get('/admin/startup', headers=headers)).json()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    return {
+        'accepting_seconds': round(accepting, 3),
+        'ready_seconds': round(ready, 3),
+        'first_prediction_seconds': round(first_prediction, 3),
+        'server_ready_after_seconds': profile['ready_after_seconds'],
+        'server_stages': profile['stages'],
+    }
+
+
+async def main(args: argparse.Namespace) -> dict:
+    with open(sorted(glob.glob(AUDIO_GLOB))[0], 'rb') as f:
+        audio = f.read()
+
+    results = {}
+    for fast_start in (False, True):
+        runs = [await measure(args.port, fast_start, audio, args.timeout) for _ in range(args.runs)]
+        results['fast_start' if fast_start else 'default'] = {
+            'runs': args.runs,
+            'accepting_seconds': statistics.median(run['accepting_seconds'] for run in runs),
+            'ready_seconds': statistics.median(run['ready_seconds'] for run in runs),
+            'first_prediction_seconds': statistics.median(run['first_prediction_seconds'] for run in runs),
+            'last_run': runs[-1],
+        }
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Cold start time, with and without FAST_START")
+    parser.add_argument('--runs', type=int, default=3, help="Process starts per mode (medians are reported)")
+    parser.add_argument('--port', type=int, default=5581)
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--output', help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    write_report('cold_start', asyncio.run(main(args)), args.output)
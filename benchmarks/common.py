@@ -0,0 +1,88 @@
+# file: benchmarks/common.py
+# Helpers shared by the benchmarks: latency summaries and the JSON report envelope
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of already sorted `values`"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summarize(latencies: List[float], errors: int, seconds: float) -> dict:
+    latencies = sorted(latencies)
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / seconds, 2),
+        'mean_ms': ms(statistics.mean(latencies)) if latencies else None,
+        'p50_ms': ms(percentile(latencies, 0.50)),
+        'p95_ms': ms(percentile(latencies, 0.95)),
+        'p99_ms': ms(percentile(latencies, 0.99)),
+        'max_ms': ms(latencies[-1]) if latencies else None,
+    }
+
+
+def time_calls(fn, iterations: int, warmup: int = 3) -> dict:
+    """Calls `fn()` `warmup` times, then `iterations` times, and summarizes the per-call wall time"""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        'iterations': iterations,
+        'mean_ms': round(statistics.mean(timings) * 1000, 4),
+        'p50_ms': round(percentile(timings, 0.50) * 1000, 4),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 4),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> dict:
+    """Where and on what a report was produced, so reports from different commits can be compared"""
+    import torch
+
+    return {
+        'commit': _git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'torch_threads': torch.get_num_threads(),
+    }
+
+
+def write_report(name: str, results: dict, output: Optional[str] = None) -> dict:
+    report = {'benchmark': name, 'environment': environment(), 'results': results}
+    print(json.dumps(report, indent=2))
+    if output:
+        with open(output, 'w') as out:
+            json.dump(report, out, indent=2)
+    return report
@@ -0,0 +1,61 @@
+# file: benchmarks/compare.py
+# Side-by-side diff of two JSON reports written with --output by the other benchmarks
+#
+#   git checkout main && python -m benchmarks.micro --output before.json
+#   git checkout my-branch && python -m benchmarks.micro --output after.json
+#   python -m benchmarks.compare before.json after.json
+#
+# Every numeric leaf present in both reports is printed with its relative change. Metrics where
+# lower is better (*_ms, *_us_per_call, errors) are flagged REGRESSION when they grow by more than
+# --threshold; throughput-style metrics are flagged when they shrink by more than --threshold.
+
+import argparse
+import json
+import sys
+
+
+LOWER_IS_BETTER = ('_ms', 'us_per_call', 'errors')
+
+
+def flatten(node, prefix: str = ''):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            yield from flatten(value, f'{prefix}.{key}' if prefix else key)
+    elif isinstance(node, (int, float)) and not isinstance(node, bool):
+        yield prefix, node
+
+
+def compare(before: dict, after: dict, threshold: float):
+    old, new = dict(flatten(before['results'])), dict(flatten(after['results']))
+    rows, regressions = [], 0
+    for key in old.keys() & new.keys():
+        if key.endswith(('iterations', 'requests', 'offered_rps')) or '.statuses.' in key:
+            continue
+        change = (new[key] - old[key]) / old[key] if old[key] else 0.0
+        worse = -change if not key.endswith(LOWER_IS_BETTER) else change
+        flag = 'REGRESSION' if worse > threshold else ''
+        regressions += bool(flag)
+        rows.append((key, old[key], new[key], change, flag))
+    return sorted(rows), regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=0.10, help="Relative change flagged as a regression")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    if before['benchmark'] != after['benchmark']:
+        sys.exit(f"Reports are from different benchmarks: {before['benchmark']} vs {after['benchmark']}")
+
+    print(f"{before['benchmark']}: {before['environment']['commit']} -> {after['environment']['commit']}")
+    rows, regressions = compare(before, after, args.threshold)
+    width = max((len(row[0]) for row in rows), default=0)
+    for key, old, new, change, flag in rows:
+        print(f"{key:<{width}}  {old:>12.4g}  {new:>12.4g}  {change:>+8.1%}  {flag}")
+    sys.exit(1 if regressions else 0)
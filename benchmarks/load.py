@@ -0,0 +1,192 @@
+# file: benchmarks/load.py
+# Open-loop load test of /auth/token and /mlservice/v1/predict at fixed request rates
+#
+# Requests are sent on a fixed schedule (--login-rps, --predict-rps) whether or not earlier ones
+# have finished, and each latency is measured from its scheduled send time, so a slow server shows
+# up as latency instead of silently lowering the offered load. Both endpoints run at the same time.
+#
+#   In-process (the app runs in this process, behind an ASGI transport):
+#     python -m benchmarks.load --predict-rps 20 --login-rps 2
+#   Against a local uvicorn (or `app.serve` with --workers) using SQLite, started for the run:
+#     python -m benchmarks.load --uvicorn --workers 2 --predict-rps 40
+#   Against a running server started with CREATE_SUPERUSER=true:
+#     python -m benchmarks.load --url http://localhost:5555
+#
+# In-process and --uvicorn default to SQL_URL=sqlite:////tmp/sound_classification_bench.db.
+# The predict scenario cycles through the e2e_tests clips, so it mostly measures prediction cache
+# hits; --no-cache sets PREDICTION_CACHE_BACKEND=none there to measure inference on every request.
+# Prints a JSON report; --output also writes it to a file for benchmarks.compare.
+
+import argparse
+import asyncio
+import glob
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import List, Optional
+
+import httpx
+
+from .common import summarize, write_report
+
+
+USERNAME = 'superuser@example.com'
+PASSWORD = '8888'
+AUDIO_GLOB = os.path.join(os.path.dirname(__file__), '..', 'e2e_tests', 'audio', '*.wav')
+BENCH_ENV = {
+    'SQL_URL': 'sqlite:////tmp/sound_classification_bench.db',
+    'SECRET_KEY': 'bench',
+    'CREATE_SUPERUSER': 'true',
+}
+
+
+class Scenario:
+    """One endpoint driven at `rps` requests per second"""
+
+    def __init__(self, name: str, rps: float, send):
+        self.name = name
+        self.rps = rps
+        self.send = send
+        self.latencies: List[float] = []
+        self.statuses: Counter = Counter()
+
+    async def _request(self, client: httpx.AsyncClient, scheduled: float, record: bool) -> None:
+        try:
+            response = await self.send(client)
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        if record:
+            self.statuses[status] += 1
+            if status == 200:
+                self.latencies.append(time.perf_counter() - scheduled)
+
+    async def run(self, client: httpx.AsyncClient, warmup: float, duration: float, max_in_flight: int) -> None:
+        if self.rps <= 0:
+            return
+        interval = 1 / self.rps
+        start = time.perf_counter()
+        measured_from, end = start + warmup, start + warmup + duration
+        slots = asyncio.Semaphore(max_in_flight)
+        tasks = []
+
+        async def bounded(scheduled: float, record: bool):
+            async with slots:
+                await self._request(client, scheduled, record)
+
+        n = 0
+        while (scheduled := start + n * interval) < end:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(bounded(scheduled, scheduled >= measured_from)))
+            n += 1
+        await asyncio.gather(*tasks)
+
+    def report(self, duration: float) -> dict:
+        errors = sum(count for status, count in self.statuses.items() if status != 200)
+        return {
+            'offered_rps': self.rps,
+            **summarize(self.latencies, errors, duration),
+            'statuses': {str(status): count for status, count in sorted(self.statuses.items(), key=str)},
+        }
+
+
+def start_server(port: int, workers: int) -> subprocess.Popen:
+    env = {**os.environ, **{key: os.environ.get(key, value) for key, value in BENCH_ENV.items()}}
+    if workers > 1:
+        command = [sys.executable, '-m', 'app.serve', '--port', str(port), '--workers', str(workers), '--log-level', 'warning']
+    else:
+        command = [sys.executable, '-m', 'uvicorn', 'app.main:app', '--port', str(port), '--log-level', 'warning']
+    return subprocess.Popen(command, env=env)
+
+
+async def wait_until_ready(client: httpx.AsyncClient, server: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with status {server.returncode}")
+        try:
+            if (await client.get('/healthcheck')).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    raise TimeoutError(f"Server not ready after {timeout} s")
+
+
+async def main(args: argparse.Namespace) -> dict:
+    audio = [open(path, 'rb').read() for path in sorted(glob.glob(AUDIO_GLOB))]
+    app, server = None, None
+    if args.no_cache:
+        os.environ['PREDICTION_CACHE_BACKEND'] = 'none'
+    if args.url or args.uvicorn:
+        base_url = args.url or f'http://127.0.0.1:{args.port}'
+        client = httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=httpx.Limits(max_connections=args.max_in_flight))
+        if args.uvicorn:
+            server = start_server(args.port, args.workers)
+            await wait_until_ready(client, server, args.startup_timeout)
+            await asyncio.sleep(2)  # let every worker finish its startup, not just the first one
+    else:
+        for key, value in BENCH_ENV.items():
+            os.environ.setdefault(key, value)
+        from app.main import app
+        await app.router.startup()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://bench', timeout=args.timeout)
+
+    async def login(client: httpx.AsyncClient) -> httpx.Response:
+        return await client.post('/auth/token', data={'username': USERNAME, 'password': PASSWORD})
+
+    counter = iter(range(sys.maxsize))
+    token: Optional[str] = None
+
+    async def predict(client: httpx.AsyncClient) -> httpx.Response:
+        return await client.post(
+            '/mlservice/v1/predict',
+            headers={'Authorization': f'Bearer {token}'},
+            files={'audio_file': ('clip.wav', audio[next(counter) % len(audio)], 'audio/wav')},
+        )
+
+    scenarios = [Scenario('login', args.login_rps, login), Scenario('predict', args.predict_rps, predict)]
+    try:
+        token = (await login(client)).json()['access_token']
+        await asyncio.gather(*(
+            scenario.run(client, args.warmup, args.duration, args.max_in_flight) for scenario in scenarios
+        ))
+    finally:
+        await client.aclose()
+        if app is not None:
+            await app.router.shutdown()
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    return {
+        'target': args.url or (f'uvicorn ({args.workers} workers)' if args.uvicorn else 'in-process'),
+        'duration_seconds': args.duration,
+        'warmup_seconds': args.warmup,
+        **{scenario.name: scenario.report(args.duration) for scenario in scenarios if scenario.rps > 0},
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Open-loop load test of login and predict")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', help="Base URL of a running server")
+    target.add_argument('--uvicorn', action='store_true', help="Start a local server on SQLite for the run")
+    parser.add_argument('--workers', type=int, default=1, help="--uvicorn: worker processes (app.serve when > 1)")
+    parser.add_argument('--port', type=int, default=5580, help="--uvicorn: port to listen on")
+    parser.add_argument('--no-cache', action='store_true', help="Disable the prediction cache (in-process, --uvicorn)")
+    parser.add_argument('--predict-rps', type=float, default=10.0)
+    parser.add_argument('--login-rps', type=float, default=1.0)
+    parser.add_argument('--duration', type=float, default=20.0, help="Measured seconds")
+    parser.add_argument('--warmup', type=float, default=3.0, help="Seconds of load before measuring")
+    parser.add_argument('--max-in-flight', type=int, default=256, help="Cap on outstanding requests per endpoint")
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--startup-timeout', type=float, default=120.0)
+    parser.add_argument('--output', help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    write_report('load', asyncio.run(main(args)), args.output)
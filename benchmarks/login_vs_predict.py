@@ -0,0 +1,126 @@
+# file: benchmarks/login_vs_predict.py
+# How /auth/token load affects concurrent /mlservice/v1/predict latency
+#
+# Runs a predict-only phase, then the same predict load alongside login workers, and prints
+# predict latency percentiles and login throughput for both as JSON.
+#
+#   In-process (needs SQL_URL and SECRET_KEY; the superuser is created for the run):
+#     SQL_URL=sqlite:////tmp/bench.db SECRET_KEY=bench python -m benchmarks.login_vs_predict
+#   Against a running server started with CREATE_SUPERUSER=true:
+#     python -m benchmarks.login_vs_predict --url http://localhost:5050
+#
+# --inline-bcrypt (in-process only) runs bcrypt on the event loop, as before the password pool,
+# to compare both behaviours on the same machine.
+
+import argparse
+import asyncio
+import glob
+import os
+import sys
+import time
+from typing import List
+
+import httpx
+
+from .common import summarize, write_report
+
+
+USERNAME = 'superuser@example.com'
+PASSWORD = '8888'
+AUDIO_GLOB = os.path.join(os.path.dirname(__file__), '..', 'e2e_tests', 'audio', '*.wav')
+
+
+async def login(client: httpx.AsyncClient) -> httpx.Response:
+    return await client.post('/auth/token', data={'username': USERNAME, 'password': PASSWORD})
+
+
+async def worker(client: httpx.AsyncClient, send, deadline: float, latencies: List[float], errors: List[int]) -> None:
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await send(client)
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors[0] += 1
+
+
+async def run_phase(
+    client: httpx.AsyncClient, token: str, audio: List[bytes], duration: float, predict_workers: int, login_workers: int
+) -> dict:
+    counter = iter(range(sys.maxsize))
+
+    async def predict(client: httpx.AsyncClient) -> httpx.Response:
+        data = audio[next(counter) % len(audio)]
+        return await client.post(
+            '/mlservice/v1/predict',
+            headers={'Authorization': f'Bearer {token}'},
+            files={'audio_file': ('clip.wav', data, 'audio/wav')},
+        )
+
+    predict_latencies, predict_errors = [], [0]
+    login_latencies, login_errors = [], [0]
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(
+        *[worker(client, predict, deadline, predict_latencies, predict_errors) for _ in range(predict_workers)],
+        *[worker(client, login, deadline, login_latencies, login_errors) for _ in range(login_workers)],
+    )
+    return {
+        'login_workers': login_workers,
+        'predict': summarize(predict_latencies, predict_errors[0], duration),
+        'login': summarize(login_latencies, login_errors[0], duration),
+    }
+
+
+async def main(args: argparse.Namespace) -> dict:
+    audio = [open(path, 'rb').read() for path in sorted(glob.glob(AUDIO_GLOB))]
+    app = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        os.environ['CREATE_SUPERUSER'] = 'true'
+        from app.main import app
+        if args.inline_bcrypt:
+            from app.passwords import password_hasher
+
+            async def run_inline(fn, *fn_args):
+                return fn(*fn_args)
+            password_hasher._run = run_inline
+        await app.router.startup()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://bench', timeout=60)
+
+    try:
+        token = (await login(client)).json()['access_token']
+        await run_phase(client, token, audio, args.warmup, args.predict_workers, 0)
+        phases = [
+            await run_phase(client, token, audio, args.duration, args.predict_workers, login_workers)
+            for login_workers in args.login_workers
+        ]
+    finally:
+        await client.aclose()
+        if app is not None:
+            await app.router.shutdown()
+
+    return {
+        'target': args.url or 'in-process',
+        'inline_bcrypt': args.inline_bcrypt,
+        'duration_seconds': args.duration,
+        'predict_workers': args.predict_workers,
+        'phases': phases,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Predict latency under concurrent login load")
+    parser.add_argument('--url', help="Base URL of a running server; in-process when omitted")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds per phase")
+    parser.add_argument('--warmup', type=float, default=2.0)
+    parser.add_argument('--predict-workers', type=int, default=4, help="Concurrent predict clients")
+    parser.add_argument('--login-workers', type=int, nargs='+', default=[0, 4, 16],
+                        help="Concurrent login clients, one phase per value")
+    parser.add_argument('--inline-bcrypt', action='store_true')
+    parser.add_argument('--output', help="Also write the JSON report to this file")
+    args = parser.parse_args()
+    if args.inline_bcrypt and args.url:
+        parser.error("--inline-bcrypt only applies in-process")
+
+    write_report('login_vs_predict', asyncio.run(main(args)), args.output)
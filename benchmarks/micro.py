@@ -0,0 +1,93 @@
+# file: benchmarks/micro.py
+# Microbenchmarks of the hot paths under the API: model forward, audio decode, resampling, JWT checks
+#
+# Each stage is timed on its own, without HTTP, so a change in /predict latency measured by
+# benchmarks.load can be traced to the stage that moved.
+#
+#   python -m benchmarks.micro
+#   python -m benchmarks.micro --only forward --batch-sizes 1 8 --output before.json
+
+import argparse
+import asyncio
+import glob
+import io
+import os
+
+import torch
+
+for key, value in {'SQL_URL': 'sqlite:////tmp/sound_classification_bench.db', 'SECRET_KEY': 'bench'}.items():
+    os.environ.setdefault(key, value)
+
+from app import config
+from app.ml_models.preprocessing import SAMPLE_RATE, TARGET_LENGTH, decode_audio, decode_audio_prefix, resampler_bank
+from app.ml_models.v1 import load_eager_model
+
+from . import auth_overhead
+from .common import time_calls, write_report
+
+
+AUDIO_GLOB = os.path.join(os.path.dirname(__file__), '..', 'e2e_tests', 'audio', '*.wav')
+STAGES = ('forward', 'decode', 'resample', 'auth')
+
+
+def bench_forward(batch_sizes, iterations: int) -> dict:
+    model = load_eager_model(config.MODEL_PATH)
+    results = {}
+    with torch.inference_mode():
+        for batch_size in batch_sizes:
+            batch = torch.randn(batch_size, 1, TARGET_LENGTH)
+            timing = time_calls(lambda: model(batch), iterations)
+            timing['clips_per_second'] = round(batch_size / timing['mean_ms'] * 1000, 1)
+            results[f'batch_{batch_size}'] = timing
+    return results
+
+
+def bench_decode(iterations: int) -> dict:
+    results = {}
+    for path in sorted(glob.glob(AUDIO_GLOB)):
+        with open(path, 'rb') as f:
+            audio = f.read()
+        name = os.path.basename(path)
+        results[f'{name}_full'] = time_calls(lambda: decode_audio(audio), iterations)
+        results[f'{name}_prefix'] = time_calls(lambda: decode_audio_prefix(io.BytesIO(audio)), iterations)
+    return results
+
+
+def bench_resample(rates, batch_sizes, iterations: int) -> dict:
+    results = {}
+    for rate in rates:
+        for batch_size in batch_sizes:
+            clips = [torch.randn(1, round(TARGET_LENGTH / SAMPLE_RATE * rate)) for _ in range(batch_size)]
+            results[f'{rate}hz_batch_{batch_size}'] = time_calls(
+                lambda: resampler_bank.resample_batch(clips, rate), iterations,
+            )
+    return results
+
+
+def main(args: argparse.Namespace) -> dict:
+    torch.set_num_threads(args.threads or config.TORCH_NUM_THREADS or torch.get_num_threads())
+    stages = args.only or STAGES
+    results = {}
+    if 'forward' in stages:
+        results['forward'] = bench_forward(args.batch_sizes, args.iterations)
+    if 'decode' in stages:
+        results['decode'] = bench_decode(args.iterations)
+    if 'resample' in stages:
+        results['resample'] = bench_resample(args.rates, args.batch_sizes, args.iterations)
+    if 'auth' in stages:
+        results['auth'] = asyncio.run(auth_overhead.main(args.auth_iterations))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the prediction and auth hot paths")
+    parser.add_argument('--only', nargs='+', choices=STAGES, help="Stages to run (default: all)")
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--auth-iterations', type=int, default=20000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 16, 32])
+    parser.add_argument('--rates', type=int, nargs='+', default=[8000, 22050, 44100, 48000])
+    parser.add_argument('--threads', type=int, help="torch intra-op threads (default: TORCH_NUM_THREADS)")
+    parser.add_argument('--output', help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    write_report('micro', main(args), args.output)
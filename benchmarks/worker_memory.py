@@ -0,0 +1,93 @@
+# file: benchmarks/worker_memory.py
+# Memory per worker process of `python -m app.serve`, with and without the preloading parent
+#
+# Starts the server once per mode, waits until every worker has finished its startup (model
+# loaded), then reads /proc/<pid>/smaps_rollup for the parent and each worker. RSS counts shared
+# pages in every process that maps them; PSS divides them between the sharers, so the sum of PSS
+# is the memory the whole server really uses. Linux only. Prints the report as JSON.
+#
+#   SQL_URL=sqlite:////tmp/bench.db SECRET_KEY=bench python -m benchmarks.worker_memory --workers 4
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+STARTED = 'Application startup complete'
+
+
+def memory_kib(pid: int) -> Dict[str, int]:
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as rollup:
+        for line in rollup:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        'rss': fields['Rss'],
+        'pss': fields['Pss'],
+        'shared': fields['Shared_Clean'] + fields['Shared_Dirty'],
+        'private': fields['Private_Clean'] + fields['Private_Dirty'],
+    }
+
+
+def children_of(pid: int) -> List[int]:
+    with open(f'/proc/{pid}/task/{pid}/children') as children:
+        return [int(child) for child in children.read().split()]
+
+
+def measure(workers: int, port: int, preload: bool, timeout: float) -> dict:
+    command = [sys.executable, '-m', 'app.serve', '--workers', str(workers), '--port', str(port)]
+    if not preload:
+        command.append('--no-preload')
+    env = dict(os.environ, PYTHONUNBUFFERED='1')
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, env=env)
+    try:
+        started, deadline = 0, time.monotonic() + timeout
+        while started < workers:
+            line = server.stdout.readline()
+            if not line:
+                raise RuntimeError(f"Server exited with status {server.wait()} before its workers started")
+            if STARTED in line:
+                started += 1
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Only {started}/{workers} workers started within {timeout}s")
+
+        parent = memory_kib(server.pid)
+        worker_memory = [memory_kib(pid) for pid in children_of(server.pid)]
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    def mean(key: str) -> float:
+        return round(sum(memory[key] for memory in worker_memory) / len(worker_memory) / 1024, 1)
+
+    return {
+        'workers': len(worker_memory),
+        'parent_rss_mib': round(parent['rss'] / 1024, 1),
+        'worker_rss_mib': mean('rss'),
+        'worker_pss_mib': mean('pss'),
+        'worker_shared_mib': mean('shared'),
+        'worker_private_mib': mean('private'),
+        'total_pss_mib': round((parent['pss'] + sum(memory['pss'] for memory in worker_memory)) / 1024, 1),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="RSS / PSS per worker of app.serve, with and without preloading")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--port', type=int, default=5570)
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args()
+
+    report = {
+        'per_worker_load': measure(args.workers, args.port, preload=False, timeout=args.timeout),
+        'preloaded_parent': measure(args.workers, args.port, preload=True, timeout=args.timeout),
+    }
+    report['total_pss_saved_mib'] = round(
+        report['per_worker_load']['total_pss_mib'] - report['preloaded_parent']['total_pss_mib'], 1
+    )
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,38 @@
+# file: tests/conftest.py
+# Unit tests run against a throwaway SQLite database and never import app.main,
+# so neither the model nor the .env settings are loaded
+
+import os
+import tempfile
+
+os.environ['SQL_URL'] = 'sqlite+aiosqlite:///' + os.path.join(tempfile.mkdtemp(prefix='app-tests-'), 'app.db')
+os.environ.setdefault('SECRET_KEY', 'test-secret-key')
+
+import pytest
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+@pytest.fixture
+async def engine():
+    """app.database's engine with fresh tables; disposed afterwards so no aiosqlite thread outlives the test"""
+    from app.database import engine
+    from app.models import Base
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+
+@pytest.fixture
+async def db(engine):
+    from app.database import SessionLocal
+
+    async with SessionLocal() as session:
+        yield session
@@ -0,0 +1,154 @@
+# file: tests/test_admission.py
+
+import pytest
+
+from app import admission
+from app.admission import (
+    InferenceAdmission, InProcessLimiterBackend, Overloaded, RateLimit, RateLimited, RateLimiter, parse_rate_limits,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(admission, 'time', clock)
+    return clock
+
+
+@pytest.fixture(params=['memory', 'redis'])
+async def backend(request):
+    if request.param == 'memory':
+        yield InProcessLimiterBackend()
+        return
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    backend = admission.RedisLimiterBackend('redis://localhost')
+    backend._client = fakeredis.FakeAsyncRedis()
+    backend._take = backend._client.register_script(admission._TAKE_SCRIPT)
+    yield backend
+    await backend.close()
+
+
+def test_parse_rate_limits():
+    assert parse_rate_limits('user=10/20, admin=0/1,,guest=0.5') == {
+        'user': RateLimit(10, 20), 'admin': RateLimit(0, 1), 'guest': RateLimit(0.5, 1),
+    }
+
+
+############### RATE LIMITER ###############
+async def test_bucket_allows_a_burst_then_refills_at_the_rate(clock, backend):
+    limiter = RateLimiter(backend, {'user': RateLimit(2, 3)})
+    user = {'id': 1, 'role': 'user'}
+    for _ in range(3):
+        await limiter.check(user)
+    with pytest.raises(RateLimited) as rejected:
+        await limiter.check(user)
+    assert rejected.value.retry_after == pytest.approx(0.5)
+
+    clock.now += 0.5  # one token at 2/s
+    await limiter.check(user)
+    with pytest.raises(RateLimited):
+        await limiter.check(user)
+
+    clock.now += 60  # refills up to the burst, not beyond
+    for _ in range(3):
+        await limiter.check(user)
+    with pytest.raises(RateLimited):
+        await limiter.check(user)
+
+
+async def test_buckets_are_per_user(clock, backend):
+    limiter = RateLimiter(backend, {'user': RateLimit(1, 1)})
+    await limiter.check({'id': 1, 'role': 'user'})
+    await limiter.check({'id': 2, 'role': 'user'})
+    with pytest.raises(RateLimited):
+        await limiter.check({'id': 1, 'role': 'user'})
+
+
+async def test_overrides_take_precedence_over_role_defaults(clock, backend):
+    limiter = RateLimiter(backend, {'user': RateLimit(1, 1), 'admin': RateLimit(0, 1)})
+    for _ in range(50):  # rate 0 is unlimited
+        await limiter.check({'id': 9, 'role': 'admin'})
+
+    await backend.set_rule('role:user', RateLimit(1, 2))
+    await backend.set_rule('user:3', RateLimit(0, 1))
+    for _ in range(2):
+        await limiter.check({'id': 1, 'role': 'user'})
+    with pytest.raises(RateLimited):
+        await limiter.check({'id': 1, 'role': 'user'})
+    for _ in range(50):
+        await limiter.check({'id': 3, 'role': 'user'})
+
+    described = await limiter.describe()
+    assert described['roles'] == {'user': {'rate': 1.0, 'burst': 2.0}}
+    assert described['users'] == {'3': {'rate': 0.0, 'burst': 1.0}}
+    assert await backend.delete_rule('user:3') and not await backend.delete_rule('user:3')
+
+
+async def test_unknown_roles_use_the_user_default(clock):
+    limiter = RateLimiter(InProcessLimiterBackend(), {'user': RateLimit(1, 1)})
+    await limiter.check({'id': 1, 'role': 'auditor'})
+    with pytest.raises(RateLimited):
+        await limiter.check({'id': 1, 'role': 'auditor'})
+
+
+############### INFERENCE ADMISSION ###############
+def test_sheds_beyond_max_in_flight(clock):
+    gate = InferenceAdmission(max_in_flight=2, latency_budget=60)
+    gate.acquire()
+    gate.acquire()
+    with pytest.raises(Overloaded):
+        gate.acquire()
+    assert gate.in_flight == 2
+    gate.release()
+    gate.acquire()
+    assert gate.describe()['in_flight'] == 2
+
+
+def test_sheds_once_the_estimated_wait_exceeds_the_budget(clock):
+    gate = InferenceAdmission(max_in_flight=100, latency_budget=1.0, smoothing=1.0)
+    gate.acquire()
+    clock.now += 0.5
+    gate.release()  # completions drain every 0.5 s
+    assert gate.estimated_wait() == 0
+
+    gate.acquire()
+    gate.acquire()
+    gate.acquire()  # 2 ahead: 1.0 s, within the budget
+    with pytest.raises(Overloaded) as shed:
+        gate.acquire()  # 3 ahead: 1.5 s
+    assert shed.value.retry_after >= 0.5
+    assert gate.in_flight == 3
+
+    clock.now += 0.1
+    gate.release()  # the EWMA follows the faster drain
+    gate.acquire()
+    assert gate.estimated_wait() == pytest.approx(0.3)
+
+
+def test_idle_gaps_do_not_count_as_drain_time(clock):
+    gate = InferenceAdmission(max_in_flight=100, latency_budget=1.0, smoothing=1.0)
+    gate.acquire()
+    clock.now += 0.1
+    gate.release()
+    clock.now += 3600  # idle
+    gate.acquire()
+    clock.now += 0.1
+    gate.release()
+    assert gate.estimated_wait() == 0
+    for _ in range(10):
+        gate.acquire()
+    assert gate.estimated_wait() == pytest.approx(1.0)
@@ -0,0 +1,182 @@
+# file: tests/test_analytics.py
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, select
+
+from app import analytics
+from app.analytics import DURATION_BUCKETS, aggregate, apply_rollups, percentile, rebuild_rollups
+from app.models import ServiceCall, ServiceCallDurationRollup, ServiceCallRollup
+from app.schemas import ServiceCallCreate
+
+T0 = datetime(2026, 3, 1, 10, 0)
+
+
+def call(owner_id=1, minutes=0, duration=0.1, success=True, cached=False, version='v1:1') -> ServiceCallCreate:
+    request_time = T0 + timedelta(minutes=minutes)
+    return ServiceCallCreate(
+        service_version=version, success=success, owner_id=owner_id, request_time=request_time,
+        completion_time=request_time + timedelta(seconds=duration), duration=duration, cached=cached,
+    )
+
+
+############### AGGREGATE ###############
+def test_aggregate_groups_by_hour_owner_and_version():
+    totals, histogram = aggregate([
+        call(minutes=1, duration=0.2),
+        call(minutes=59, duration=0.4, success=False),
+        call(minutes=60, duration=0.01, cached=True),
+        call(owner_id=2, minutes=5),
+        call(minutes=5, version='v1:2'),
+    ])
+    hour = T0
+    assert totals[(hour, 1, 'v1:1')] == [2, 1, 0, pytest.approx(0.6), 0.4]
+    assert totals[(hour + timedelta(hours=1), 1, 'v1:1')] == [1, 0, 1, 0.01, 0.01]
+    assert totals[(hour, 2, 'v1:1')][0] == 1 and totals[(hour, 1, 'v1:2')][0] == 1
+    assert histogram[(hour, 1, 'v1:1', DURATION_BUCKETS.index(0.25))] == 1
+    assert histogram[(hour, 1, 'v1:1', DURATION_BUCKETS.index(0.5))] == 1
+    assert sum(histogram.values()) == 5
+
+
+def test_aggregate_bucket_bounds_are_inclusive():
+    _, histogram = aggregate([call(duration=0.1), call(duration=0.1001), call(duration=10_000)])
+    assert sorted(key[-1] for key in histogram) == [
+        DURATION_BUCKETS.index(0.1), DURATION_BUCKETS.index(0.15), len(DURATION_BUCKETS),
+    ]
+
+
+############### PERCENTILE ###############
+def counts_with(**by_bound) -> list:
+    counts = [0] * (len(DURATION_BUCKETS) + 1)
+    for bound, count in by_bound.items():
+        index = len(DURATION_BUCKETS) if bound == 'inf' else DURATION_BUCKETS.index(float(bound.replace('_', '.')))
+        counts[index] = count
+    return counts
+
+
+def test_percentile_of_an_empty_histogram_is_none():
+    assert percentile(counts_with(), 0.5, 0.0) is None
+
+
+def test_percentile_interpolates_inside_the_bucket():
+    counts = counts_with(**{'0_1': 10})  # all in (0.075, 0.1]
+    assert percentile(counts, 0.5, 0.1) == pytest.approx(0.0875)
+    assert percentile(counts, 1.0, 0.1) == pytest.approx(0.1)
+    assert percentile(counts_with(**{'0_005': 4}), 0.25, 0.005) == pytest.approx(0.00125)  # first bucket starts at 0
+
+
+def test_percentile_picks_the_bucket_holding_the_rank():
+    counts = counts_with(**{'0_01': 50, '1_0': 45, '5_0': 5})
+    assert 0.005 < percentile(counts, 0.5, 4.0) <= 0.01
+    assert 0.75 < percentile(counts, 0.95, 4.0) <= 1.0
+    assert 2.5 < percentile(counts, 0.99, 4.0) <= 4.0  # capped at the largest observed value
+
+
+def test_percentile_bounds_the_last_bucket_by_the_max():
+    counts = counts_with(inf=2)
+    assert percentile(counts, 0.5, 1200.0) == pytest.approx(1050.0)
+    assert percentile(counts, 1.0, 1200.0) == pytest.approx(1200.0)
+
+
+############### ROLLUPS ###############
+async def rollups(db) -> dict:
+    rows = (await db.scalars(select(ServiceCallRollup))).all()
+    return {
+        (row.bucket_start, row.owner_id, row.service_version):
+            [row.calls, row.errors, row.cached_calls, pytest.approx(row.duration_sum), row.duration_max]
+        for row in rows
+    }
+
+
+async def histogram_rows(db) -> dict:
+    rows = (await db.scalars(select(ServiceCallDurationRollup))).all()
+    return {(row.bucket_start, row.owner_id, row.service_version, row.bucket_index): row.count for row in rows}
+
+
+@pytest.mark.anyio
+async def test_apply_rollups_upserts_onto_existing_rows(db):
+    first = [call(duration=0.2), call(duration=0.3, success=False)]
+    second = [call(minutes=30, duration=0.9, cached=True), call(owner_id=2)]
+    await apply_rollups(db, first)
+    await db.commit()
+    await apply_rollups(db, second)
+    await apply_rollups(db, [])
+    await db.commit()
+
+    totals, histogram = aggregate(first + second)
+    assert await rollups(db) == totals
+    assert await histogram_rows(db) == histogram
+    assert (await rollups(db))[(T0, 1, 'v1:1')] == [3, 1, 1, pytest.approx(1.4), 0.9]
+
+    await apply_rollups(db, [call(duration=0.05)])  # a smaller duration keeps the max
+    await db.commit()
+    assert (await rollups(db))[(T0, 1, 'v1:1')][4] == 0.9
+
+
+@pytest.mark.anyio
+async def test_apply_rollups_splits_large_batches(db, engine, monkeypatch):
+    monkeypatch.setattr(analytics, 'MAX_BIND_PARAMS', 40)  # 5 rollup rows, 8 histogram rows per statement
+    statements = []
+
+    def count_inserts(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT'):
+            statements.append(statement.split()[2])
+
+    calls = [call(owner_id=owner, duration=0.001 * owner) for owner in range(1, 13)]
+    event.listen(engine.sync_engine, 'before_cursor_execute', count_inserts)
+    try:
+        await apply_rollups(db, calls)
+        await db.commit()
+    finally:
+        event.remove(engine.sync_engine, 'before_cursor_execute', count_inserts)
+
+    assert statements.count('service_call_rollups') == 3
+    assert statements.count('service_call_duration_rollups') == 2
+    totals, histogram = aggregate(calls)
+    assert await rollups(db) == totals
+    assert await histogram_rows(db) == histogram
+
+
+@pytest.mark.anyio
+async def test_rebuild_rollups_recomputes_whole_hours(db, monkeypatch):
+    monkeypatch.setattr(analytics, 'REBUILD_CHUNK_ROWS', 3)
+    calls = [call(owner_id=owner, minutes=minutes, duration=0.01 * minutes, success=minutes % 4 != 0)
+             for owner in (1, 2) for minutes in range(0, 180, 11)]
+    db.add_all(ServiceCall(**c.model_dump()) for c in calls)
+    await apply_rollups(db, [call(owner_id=1, duration=99.0)])  # stale rollups are replaced
+    await db.commit()
+
+    read = await rebuild_rollups(db, T0 + timedelta(minutes=30), T0 + timedelta(hours=3))
+    assert read == len(calls)
+    totals, histogram = aggregate(calls)
+    assert await rollups(db) == totals
+    assert await histogram_rows(db) == histogram
+
+
+@pytest.mark.anyio
+async def test_queries_read_the_rollups(db):
+    await apply_rollups(db, [
+        call(duration=0.02), call(duration=0.04, success=False), call(minutes=90, duration=2.0), call(owner_id=2),
+    ])
+    await db.commit()
+    start, end = T0, T0 + timedelta(hours=2)
+
+    hourly = await analytics.calls_per_user(db, start, end)
+    assert [(row['bucket_start'], row['owner_id'], row['calls'], row['errors']) for row in hourly] == [
+        (T0, 1, 2, 1), (T0, 2, 1, 0), (T0 + timedelta(hours=1), 1, 1, 0),
+    ]
+    daily = await analytics.calls_per_user(db, start, end, granularity='day', owner_id=1)
+    assert [(row['bucket_start'], row['calls']) for row in daily] == [(T0.replace(hour=0), 3)]
+
+    summary = await analytics.latency_summary(db, start, end, owner_id=1)
+    assert summary['calls'] == 3 and summary['max'] == 2.0
+    assert summary['mean'] == pytest.approx(2.06 / 3)
+    assert summary['p50'] <= 0.05 and 1.5 < summary['p99'] <= 2.0
+
+    assert await analytics.error_rates(db, start, end) == [
+        {'owner_id': 1, 'calls': 3, 'errors': 1, 'error_rate': pytest.approx(1 / 3)},
+        {'owner_id': 2, 'calls': 1, 'errors': 0, 'error_rate': 0.0},
+    ]
+    empty = await analytics.latency_summary(db, T0 - timedelta(days=2), T0 - timedelta(days=1))
+    assert (empty['calls'], empty['mean'], empty['p50'], empty['max']) == (0, None, None, None)
@@ -0,0 +1,101 @@
+# file: tests/test_archives.py
+
+import io
+import tarfile
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from app.ml_models.ingestion import _read_member, expand_archives
+
+WAV = (Path(__file__).parents[1] / 'app' / 'ml_models' / 'parity_clips' / 'dog-whine.wav').read_bytes()
+
+
+def make_zip(members: dict, compression=zipfile.ZIP_DEFLATED) -> io.BytesIO:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression) as archive:
+        for name, data in members.items():
+            if name.endswith('/'):
+                archive.mkdir(name)
+            else:
+                archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def make_tar(members: dict, mode: str = 'w:gz') -> io.BytesIO:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            if name.endswith('/'):
+                info.type = tarfile.DIRTYPE
+                archive.addfile(info)
+            else:
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+    buffer.seek(0)
+    return buffer
+
+
+def expanded(files, max_files=100, max_bytes=10 ** 8) -> list:
+    return [(name, audio_file.read()) for name, audio_file in expand_archives(files, max_files, max_bytes)]
+
+
+############### EXPANSION ###############
+def test_plain_files_pass_through():
+    result = expanded([('a.wav', io.BytesIO(WAV)), ('empty.wav', io.BytesIO(b'')), ('b.bin', io.BytesIO(b'x' * 600))])
+    assert result == [('a.wav', WAV), ('empty.wav', b''), ('b.bin', b'x' * 600)]
+
+
+@pytest.mark.parametrize('make_archive', [
+    make_zip,
+    lambda members: make_zip(members, zipfile.ZIP_STORED),
+    make_tar,
+    lambda members: make_tar(members, 'w'),
+])
+def test_archives_are_replaced_by_their_regular_visible_members(make_archive):
+    archive = make_archive({
+        'clips/': b'',
+        'clips/one.wav': WAV,
+        'clips/.hidden.wav': b'hidden',
+        '__MACOSX/clips/._one.wav': b'resource fork',
+        'clips/two.wav': b'two',
+    })
+    result = expanded([('first.wav', io.BytesIO(b'first')), ('clips.archive', archive), ('last.wav', io.BytesIO(b'last'))])
+    assert result == [
+        ('first.wav', b'first'), ('clips/one.wav', WAV), ('clips/two.wav', b'two'), ('last.wav', b'last'),
+    ]
+
+
+############### LIMITS ###############
+def test_file_count_includes_plain_files_and_members():
+    archive = {f'{i}.wav': b'x' for i in range(3)}
+    assert len(expanded([('a.wav', io.BytesIO(b'a')), ('b.zip', make_zip(archive))], max_files=4)) == 4
+    with pytest.raises(ValueError, match='Too many files'):
+        expanded([('a.wav', io.BytesIO(b'a')), ('b.zip', make_zip(archive))], max_files=3)
+    with pytest.raises(ValueError, match='Too many files'):
+        expanded([('a.tgz', make_tar(archive)), ('b.tgz', make_tar(archive))], max_files=5)
+
+
+@pytest.mark.parametrize('make_archive', [make_zip, make_tar])
+def test_extracted_bytes_are_bounded_across_archives(make_archive):
+    members = {'a.wav': b'a' * 400, 'b.wav': b'b' * 400}
+    assert len(expanded([('x', make_archive(members)), ('y', make_archive({'c.wav': b'c' * 200}))], max_bytes=1000)) == 3
+    with pytest.raises(ValueError, match='too large'):
+        expanded([('x', make_archive(members)), ('y', make_archive({'c.wav': b'c' * 201}))], max_bytes=1000)
+
+
+@pytest.mark.parametrize('make_archive', [make_zip, make_tar])
+def test_a_compression_bomb_is_refused_before_it_is_inflated(make_archive):
+    bomb = make_archive({'zeros.wav': bytes(50 * 2 ** 20)})
+    assert len(bomb.getvalue()) < 2 ** 20
+    with pytest.raises(ValueError, match='zeros.wav is too large'):
+        expanded([('bomb', bomb)], max_bytes=2 ** 20)
+
+
+def test_a_member_larger_than_its_header_is_cut_off():
+    with pytest.raises(ValueError, match='too large'):
+        _read_member(io.BytesIO(b'x' * 101), declared_size=10, remaining=100, name='liar.wav')
+    assert _read_member(io.BytesIO(b'x' * 100), declared_size=10, remaining=100, name='ok.wav') == b'x' * 100
@@ -0,0 +1,127 @@
+# file: tests/test_batching.py
+
+import asyncio
+
+import pytest
+
+from app.ml_models.batching import MicroBatcher
+
+pytestmark = pytest.mark.anyio
+
+
+class Runner:
+    """Doubles every item and records the batches it was given; raises for batches holding 'bad'"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = []
+        self.running = 0
+        self.peak = 0
+
+    async def __call__(self, items):
+        self.batches.append(list(items))
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+            if 'bad' in items:
+                raise ValueError('bad item in batch')
+            return [item * 2 for item in items]
+        finally:
+            self.running -= 1
+
+
+async def test_concurrent_requests_share_batches_and_get_their_own_results():
+    runner = Runner()
+    batcher = MicroBatcher(runner, max_batch_size=4, max_wait_ms=50)
+    try:
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+    finally:
+        await batcher.stop()
+    assert results == [i * 2 for i in range(10)]
+    assert [len(batch) for batch in runner.batches] == [4, 4, 2]
+    assert sorted(item for batch in runner.batches for item in batch) == list(range(10))
+
+
+async def test_a_lone_request_is_flushed_after_max_wait():
+    runner = Runner()
+    batcher = MicroBatcher(runner, max_batch_size=64, max_wait_ms=20)
+    loop = asyncio.get_running_loop()
+    try:
+        started = loop.time()
+        assert await batcher.submit(21) == 42
+        assert loop.time() - started < 1.0
+    finally:
+        await batcher.stop()
+    assert runner.batches == [[21]]
+
+
+async def test_a_failing_batch_fails_only_its_own_requests():
+    runner = Runner(delay=0.01)
+    batcher = MicroBatcher(runner, max_batch_size=2, max_wait_ms=20)
+    try:
+        results = await asyncio.gather(*(batcher.submit(item) for item in [1, 'bad', 3, 4]), return_exceptions=True)
+        assert isinstance(results[0], ValueError) and results[1] is results[0]
+        assert results[2:] == [6, 8]
+        assert batcher.running
+        assert await batcher.submit(5) == 10
+    finally:
+        await batcher.stop()
+
+
+async def test_a_short_result_list_fails_the_batch_instead_of_hanging():
+    async def drop_last(items):
+        return [item for item in items[:-1]]
+
+    batcher = MicroBatcher(drop_last, max_batch_size=3, max_wait_ms=20)
+    try:
+        results = await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True), timeout=5,
+        )
+    finally:
+        await batcher.stop()
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+async def test_cancelled_caller_does_not_affect_the_rest_of_its_batch():
+    runner = Runner(delay=0.05)
+    batcher = MicroBatcher(runner, max_batch_size=3, max_wait_ms=20)
+    try:
+        tasks = [asyncio.create_task(batcher.submit(i)) for i in range(3)]
+        await asyncio.sleep(0.03)  # the batch is running
+        tasks[1].cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        await batcher.stop()
+    assert results[0] == 0 and results[2] == 4
+    assert isinstance(results[1], asyncio.CancelledError)
+
+
+async def test_concurrent_batches_are_bounded():
+    runner = Runner(delay=0.02)
+    batcher = MicroBatcher(runner, max_batch_size=1, max_wait_ms=0, max_concurrent_batches=2)
+    try:
+        assert await asyncio.gather(*(batcher.submit(i) for i in range(8))) == [i * 2 for i in range(8)]
+    finally:
+        await batcher.stop()
+    assert runner.peak == 2
+
+
+async def test_stop_fails_queued_requests():
+    release = asyncio.Event()
+
+    async def blocked(items):
+        await release.wait()
+        return items
+
+    batcher = MicroBatcher(blocked, max_batch_size=1, max_wait_ms=0)
+    tasks = [asyncio.create_task(batcher.submit(i)) for i in range(3)]
+    await asyncio.sleep(0.02)
+    stopping = asyncio.create_task(batcher.stop())
+    await asyncio.sleep(0.02)
+    release.set()
+    await stopping
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    assert results[0] == 0
+    assert [str(result) for result in results[1:]] == ['Batcher stopped'] * 2
+    assert not batcher.running
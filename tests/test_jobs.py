@@ -0,0 +1,209 @@
+# file: tests/test_jobs.py
+
+import asyncio
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app import config, jobs
+from app.database import SessionLocal
+from app.jobs import JobQueue, job_input_dir
+from app.models import Job
+from app.schemas import PredictionOutput
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeRegistry:
+    def __init__(self, version='7'):
+        self.model = SimpleNamespace(version=version) if version else None
+
+    def active(self):
+        if self.model is None:
+            raise LookupError('No model is active')
+        return self.model
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def record(self, *service_calls):
+        self.calls.extend(service_calls)
+
+
+@pytest.fixture
+def usage(monkeypatch):
+    recorder = Recorder()
+    monkeypatch.setattr(jobs, 'usage_recorder', recorder)
+    return recorder
+
+
+@pytest.fixture
+def jobs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'JOBS_DIR', str(tmp_path))
+    return tmp_path
+
+
+async def add_job(priority=0, status='queued', kind='batch', **columns) -> int:
+    async with SessionLocal() as db:
+        job = Job(owner_id=1, kind=kind, status=status, priority=priority, params={}, input_dir='', **columns)
+        db.add(job)
+        await db.commit()
+        job.input_dir = job_input_dir(job.id)
+        os.makedirs(job.input_dir)
+        await db.commit()
+        return job.id
+
+
+async def get_job(job_id: int) -> Job:
+    async with SessionLocal() as db:
+        return await db.get(Job, job_id)
+
+
+async def wait_finished(*job_ids: int, timeout: float = 5.0) -> list:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        found = [await get_job(job_id) for job_id in job_ids]
+        if all(job.status in ('succeeded', 'failed') for job in found):
+            return found
+        assert loop.time() < deadline, [(job.id, job.status) for job in found]
+        await asyncio.sleep(0.02)
+
+
+def run_batch_with(ran: list, delay: float = 0.0, fail: bool = False):
+    async def run_batch(model, job):
+        ran.append(job.id)
+        await asyncio.sleep(delay)
+        if fail:
+            raise RuntimeError('decoder exploded')
+        return [
+            PredictionOutput(filename='a.wav', predictions=[], model_version=model.version),
+            PredictionOutput(filename='b.wav', predictions=[], error='Could not decode audio', model_version=model.version),
+        ]
+    return run_batch
+
+
+############### LIFECYCLE ###############
+async def test_queued_jobs_run_by_priority_and_record_their_result(engine, jobs_dir, usage):
+    low, high, second_low = await add_job(priority=0), await add_job(priority=5), await add_job(priority=0)
+    queue = JobQueue(FakeRegistry(), workers=1)
+    ran = []
+    queue._run_batch = run_batch_with(ran)
+    await queue.start()
+    try:
+        finished = await wait_finished(low, high, second_low)
+    finally:
+        await queue.stop()
+
+    assert ran == [high, low, second_low]
+    for job in finished:
+        assert job.status == 'succeeded' and job.error is None
+        assert [item['filename'] for item in job.result] == ['a.wav', 'b.wav']
+        assert job.started_at <= job.finished_at
+        assert not os.path.exists(job.input_dir)
+    assert [(call.success, call.service_version) for call in usage.calls] == [(True, 'v1:7'), (False, 'v1:7')] * 3
+
+
+async def test_jobs_enqueued_after_start_run_too(engine, jobs_dir, usage):
+    queue = JobQueue(FakeRegistry(), workers=2)
+    ran = []
+    queue._run_batch = run_batch_with(ran)
+    queue.enqueue(12345, 0)  # before start (FAST_START): ignored, start() reads the table
+    await queue.start()
+    try:
+        job_id = await add_job()
+        queue.enqueue(job_id, 0)
+        [job] = await wait_finished(job_id)
+    finally:
+        await queue.stop()
+    assert job.status == 'succeeded' and ran == [job_id]
+
+
+async def test_a_failing_job_records_its_error(engine, jobs_dir, usage):
+    job_id = await add_job(priority=1)
+    queue = JobQueue(FakeRegistry(), workers=1)
+    queue._run_batch = run_batch_with([], fail=True)
+    await queue.start()
+    try:
+        [job] = await wait_finished(job_id)
+    finally:
+        await queue.stop()
+    assert (job.status, job.error, job.result) == ('failed', 'decoder exploded', None)
+    assert job.finished_at is not None and not os.path.exists(job.input_dir)
+    assert [(call.success, call.priority) for call in usage.calls] == [(False, 1)]
+
+
+async def test_a_job_without_an_active_model_fails(engine, jobs_dir, usage):
+    job_id = await add_job(kind='long')
+    queue = JobQueue(FakeRegistry(version=None), workers=1)
+    await queue.start()
+    try:
+        [job] = await wait_finished(job_id)
+    finally:
+        await queue.stop()
+    assert (job.status, job.error) == ('failed', 'No model is active')
+    assert usage.calls[0].service_version == 'v1:none'
+
+
+############### CLAIMS AND LEASES ###############
+async def test_only_one_worker_claims_a_job(engine, jobs_dir):
+    job_id = await add_job()
+    claims = await asyncio.gather(*(JobQueue(FakeRegistry(), 1)._claim(job_id) for _ in range(4)))
+    assert sorted(claims) == [False, False, False, True]
+    job = await get_job(job_id)
+    assert job.status == 'running' and job.heartbeat_at == job.started_at
+
+    finished = await add_job(status='succeeded')
+    assert not await JobQueue(FakeRegistry(), 1)._claim(finished)
+
+
+async def test_a_claimed_job_is_not_run_twice(engine, jobs_dir, usage):
+    job_id = await add_job()
+    ran = []
+    queues = [JobQueue(FakeRegistry(), workers=1) for _ in range(3)]
+    for queue in queues:
+        queue._run_batch = run_batch_with(ran, delay=0.05)
+    await asyncio.gather(*(queue._run(job_id) for queue in queues))
+    assert ran == [job_id]
+    assert (await get_job(job_id)).status == 'succeeded'
+
+
+async def test_only_expired_leases_are_requeued(engine, jobs_dir, usage, monkeypatch):
+    monkeypatch.setattr(config, 'JOB_LEASE_SECONDS', 60)
+    now = datetime.now()
+    expired = await add_job(status='running', started_at=now - timedelta(minutes=10), heartbeat_at=now - timedelta(minutes=2))
+    never_beat = await add_job(status='running', started_at=now - timedelta(minutes=2))
+    alive = await add_job(status='running', started_at=now - timedelta(minutes=10), heartbeat_at=now - timedelta(seconds=5))
+    done = await add_job(status='succeeded', started_at=now - timedelta(minutes=10))
+
+    queue = JobQueue(FakeRegistry(), workers=1)
+    ran = []
+    queue._run_batch = run_batch_with(ran)
+    await queue.start()
+    try:
+        await wait_finished(expired, never_beat)
+    finally:
+        await queue.stop()
+    assert sorted(ran) == sorted([expired, never_beat])
+    assert (await get_job(alive)).status == 'running'
+    assert (await get_job(done)).status == 'succeeded'
+    assert await JobQueue(FakeRegistry(), 1).requeue_expired() == 0
+
+
+async def test_a_running_job_keeps_its_lease(engine, jobs_dir, usage, monkeypatch):
+    monkeypatch.setattr(config, 'JOB_LEASE_SECONDS', 0.3)
+    job_id = await add_job()
+    queue = JobQueue(FakeRegistry(), workers=1)
+    queue._run_batch = run_batch_with([], delay=0.6)
+    run = asyncio.create_task(queue._run(job_id))
+    await asyncio.sleep(0.45)
+
+    job = await get_job(job_id)
+    assert job.status == 'running' and job.heartbeat_at > job.started_at
+    assert await JobQueue(FakeRegistry(), 1).requeue_expired() == 0
+    await run
+    assert (await get_job(job_id)).status == 'succeeded'
@@ -0,0 +1,117 @@
+# file: tests/test_tokens.py
+
+import base64
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.tokens import HMACBackend, InvalidToken, VerifiedTokenCache
+
+KEY = 'test-key'
+
+
+def b64(data: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b'=').decode()
+
+
+############### HMAC BACKEND ###############
+def test_round_trip():
+    backend = HMACBackend()
+    expires = datetime.now(timezone.utc) + timedelta(minutes=5)
+    token = backend.encode({'sub': 'alice', 'id': 1, 'exp': expires}, KEY, 'HS256')
+    claims = backend.decode(token, KEY, 'HS256')
+    assert claims['sub'] == 'alice' and claims['id'] == 1
+    assert claims['exp'] == int(expires.timestamp())
+
+
+def test_matches_python_jose():
+    jwt = pytest.importorskip('jose.jwt')
+    claims = {'sub': 'alice', 'exp': int(time.time()) + 60}
+    assert HMACBackend().decode(jwt.encode(claims, KEY, algorithm='HS256'), KEY, 'HS256') == claims
+    assert jwt.decode(HMACBackend().encode(claims, KEY, 'HS256'), KEY, algorithms=['HS256']) == claims
+
+
+@pytest.mark.parametrize('segment', [0, 1, 2])
+def test_tampered_token_is_rejected(segment):
+    backend = HMACBackend()
+    token = backend.encode({'sub': 'alice', 'exp': time.time() + 60}, KEY, 'HS256')
+    parts = token.split('.')
+    if segment == 0:
+        parts[0] = b64({'alg': 'HS256', 'typ': 'JWS'})
+    elif segment == 1:
+        parts[1] = b64({'sub': 'admin', 'exp': time.time() + 60})
+    else:
+        parts[2] = parts[2][::-1]
+    with pytest.raises(InvalidToken):
+        backend.decode('.'.join(parts), KEY, 'HS256')
+
+
+def test_wrong_key_is_rejected():
+    token = HMACBackend().encode({'sub': 'alice'}, KEY, 'HS256')
+    with pytest.raises(InvalidToken, match='Signature'):
+        HMACBackend().decode(token, 'other-key', 'HS256')
+
+
+@pytest.mark.parametrize('alg', ['none', 'None', 'HS512', 'RS256'])
+def test_unexpected_algorithm_is_rejected(alg):
+    token = f"{b64({'alg': alg, 'typ': 'JWT'})}.{b64({'sub': 'admin'})}."
+    with pytest.raises(InvalidToken, match='algorithm'):
+        HMACBackend().decode(token, KEY, 'HS256')
+
+
+@pytest.mark.parametrize('token', ['', 'abc', 'a.b', 'a.b.c.d', '!!.??.##'])
+def test_malformed_token_is_rejected(token):
+    with pytest.raises(InvalidToken):
+        HMACBackend().decode(token, KEY, 'HS256')
+
+
+def test_expired_and_not_yet_valid_tokens_are_rejected():
+    backend = HMACBackend()
+    expired = backend.encode({'sub': 'alice', 'exp': int(time.time()) - 1}, KEY, 'HS256')
+    with pytest.raises(InvalidToken, match='expired'):
+        backend.decode(expired, KEY, 'HS256')
+    early = backend.encode({'sub': 'alice', 'nbf': int(time.time()) + 60}, KEY, 'HS256')
+    with pytest.raises(InvalidToken, match='not yet valid'):
+        backend.decode(early, KEY, 'HS256')
+    bad_claim = backend.encode({'sub': 'alice', 'exp': 'tomorrow'}, KEY, 'HS256')
+    with pytest.raises(InvalidToken, match="'exp'"):
+        backend.decode(bad_claim, KEY, 'HS256')
+
+
+############### VERIFIED TOKEN CACHE ###############
+def test_cache_returns_a_copy_until_exp(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('app.tokens.time.time', lambda: now[0])
+    cache = VerifiedTokenCache(max_entries=10)
+    cache.set('token', {'sub': 'alice', 'exp': 1010})
+
+    claims = cache.get('token')
+    assert claims == {'sub': 'alice', 'exp': 1010}
+    claims['sub'] = 'admin'
+    assert cache.get('token')['sub'] == 'alice'
+
+    now[0] = 1010.0
+    assert cache.get('token') is None
+    assert len(cache._entries) == 0
+
+
+def test_cache_skips_tokens_without_exp_and_evicts_lru():
+    cache = VerifiedTokenCache(max_entries=2)
+    exp = time.time() + 60
+    cache.set('no-exp', {'sub': 'alice'})
+    assert cache.get('no-exp') is None
+
+    cache.set('a', {'sub': 'a', 'exp': exp})
+    cache.set('b', {'sub': 'b', 'exp': exp})
+    cache.get('a')
+    cache.set('c', {'sub': 'c', 'exp': exp})
+    assert cache.get('b') is None
+    assert cache.get('a')['sub'] == 'a' and cache.get('c')['sub'] == 'c'
+
+
+def test_disabled_cache_stores_nothing():
+    cache = VerifiedTokenCache(max_entries=0)
+    cache.set('a', {'sub': 'a', 'exp': time.time() + 60})
+    assert not cache.enabled and cache.get('a') is None
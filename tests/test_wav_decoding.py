@@ -0,0 +1,120 @@
+# file: tests/test_wav_decoding.py
+
+import io
+import struct
+
+import pytest
+import torch
+import torchaudio
+
+from app.ml_models.preprocessing import (
+    WavFormatError, WavStreamDecoder, decode_audio, decode_audio_prefix, open_audio_stream,
+)
+
+pytestmark = pytest.mark.filterwarnings('ignore:Saving audio with 24 bits per sample')
+
+FORMATS = [
+    ('PCM_U', 8),
+    ('PCM_S', 16),
+    ('PCM_S', 24),
+    ('PCM_S', 32),
+    ('PCM_F', 32),
+    ('PCM_F', 64),
+]
+
+
+def make_wav(tmp_path, num_channels=1, sample_rate=16000, encoding='PCM_S', bits_per_sample=16, frames=4000) -> bytes:
+    generator = torch.Generator().manual_seed(num_channels * 1000 + bits_per_sample)
+    waveform = torch.rand(num_channels, frames, generator=generator) * 1.8 - 0.9
+    path = tmp_path / f'{encoding}-{bits_per_sample}-{num_channels}.wav'
+    torchaudio.save(str(path), waveform, sample_rate, encoding=encoding, bits_per_sample=bits_per_sample)
+    return path.read_bytes()
+
+
+def stream_decode(data: bytes, chunk_bytes: int) -> torch.Tensor:
+    decoder = WavStreamDecoder()
+    chunks = []
+    for start in range(0, len(data), chunk_bytes):
+        chunks += decoder.feed(data[start:start + chunk_bytes])
+    assert decoder.finished
+    return torch.cat(chunks, dim=-1)
+
+
+############### AGAINST TORCHAUDIO ###############
+@pytest.mark.parametrize('encoding, bits_per_sample', FORMATS)
+@pytest.mark.parametrize('num_channels', [1, 2, 3])
+@pytest.mark.parametrize('chunk_bytes', [1, 7, 4096, 1 << 20])
+def test_matches_torchaudio(tmp_path, encoding, bits_per_sample, num_channels, chunk_bytes):
+    data = make_wav(tmp_path, num_channels, encoding=encoding, bits_per_sample=bits_per_sample, frames=1000)
+    expected, _ = decode_audio(data)
+    decoded = stream_decode(data, chunk_bytes)
+    assert decoded.dtype == torch.float32
+    assert decoded.shape == expected.shape == (1, 1000)
+    torch.testing.assert_close(decoded, expected, rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize('encoding, bits_per_sample', FORMATS)
+def test_reads_the_fmt_chunk(tmp_path, encoding, bits_per_sample):
+    decoder = WavStreamDecoder()
+    decoder.feed(make_wav(tmp_path, 2, 22050, encoding, bits_per_sample)[:200])
+    assert (decoder.sample_rate, decoder.num_channels) == (22050, 2)
+    assert decoder.sample_width == bits_per_sample // 8
+    assert decoder.is_float == (encoding == 'PCM_F')
+
+
+############### CONTAINER EDGE CASES ###############
+def insert_chunk_before_data(data: bytes, chunk_id: bytes, payload: bytes) -> bytes:
+    offset = data.index(b'data')
+    chunk = chunk_id + struct.pack('<I', len(payload)) + payload + b'\0' * (len(payload) & 1)
+    return data[:offset] + chunk + data[offset:]
+
+
+def test_skips_unknown_chunks_with_odd_sizes(tmp_path):
+    data = make_wav(tmp_path)
+    with_list = insert_chunk_before_data(data, b'LIST', b'INFOabc')
+    torch.testing.assert_close(stream_decode(with_list, 5), decode_audio(data)[0], rtol=0, atol=1e-6)
+
+
+def test_ignores_bytes_after_the_data_chunk(tmp_path):
+    data = make_wav(tmp_path)
+    decoded = stream_decode(data + b'id3 \x04\x00\x00\x00abcd', 1024)
+    assert decoded.shape == (1, 4000)
+
+
+def test_unknown_data_size_streams_until_eof(tmp_path):
+    data = bytearray(make_wav(tmp_path))
+    offset = data.index(b'data') + 4
+    data[offset:offset + 4] = b'\xff\xff\xff\xff'
+    decoder = WavStreamDecoder()
+    decoded = torch.cat(decoder.feed(bytes(data)), dim=-1)
+    assert not decoder.finished
+    torch.testing.assert_close(decoded, decode_audio(make_wav(tmp_path))[0], rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize('data', [
+    b'RIFX\x00\x00\x00\x00WAVE',
+    b'RIFF\x00\x00\x00\x00WAVEdata\x00\x00\x00\x00',
+    b'RIFF\x00\x00\x00\x00WAVEfmt \x10\x00\x00\x00' + struct.pack('<HHIIHH', 0x0055, 1, 16000, 32000, 2, 16),
+    b'RIFF\x00\x00\x00\x00WAVEfmt \x10\x00\x00\x00' + struct.pack('<HHIIHH', 0x0003, 1, 16000, 32000, 2, 16),
+])
+def test_rejects_unsupported_streams(data):
+    with pytest.raises(WavFormatError):
+        WavStreamDecoder().feed(data)
+
+
+############### ENTRY POINTS ###############
+def test_non_wav_falls_back_to_torchaudio(tmp_path):
+    path = tmp_path / 'clip.flac'
+    torchaudio.save(str(path), torch.rand(1, 3000) - 0.5, 16000)
+    sample_rate, chunks = open_audio_stream(io.BytesIO(path.read_bytes()))
+    assert sample_rate == 16000
+    assert torch.cat(list(chunks), dim=-1).shape == (1, 3000)
+
+
+def test_prefix_stops_after_five_seconds(tmp_path):
+    data = make_wav(tmp_path, sample_rate=8000, frames=8000 * 30)
+    audio_file = io.BytesIO(data)
+    waveform, sample_rate = decode_audio_prefix(audio_file, chunk_bytes=4096)
+    assert (sample_rate, waveform.shape) == (8000, (1, 8000 * 5))
+    assert audio_file.tell() < len(data) // 2
+    torch.testing.assert_close(waveform, decode_audio(data)[0][:, :8000 * 5], rtol=0, atol=1e-6)